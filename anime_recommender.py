@@ -3,80 +3,262 @@
 動漫推薦系統主程式 - 整合所有模組提供完整的推薦功能
 """
 
+import json
+import os
+import time
 import pandas as pd
-from typing import List, Dict, Any, Optional
-from data_processor import AnimeDataProcessor
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Sequence
+from data_processor import AnimeDataProcessor, FILTER_COLUMNS
+from catalog_store import CatalogStore
 from embedding_generator import EmbeddingGenerator
-from qdrant_manager import QdrantManager
-from config import COLLECTION_NAME, DEFAULT_SEARCH_LIMIT
+from embedding_store import EmbeddingStore, atomic_write_json
+from cache import RecommendationCache
+from neighbor_table import NeighborTable
+from query_encoder import QueryEncoder
+from search_backend import create_search_backend
+from search_filter import SearchFilter, PayloadColumns
+from keyword_index import KeywordIndex, reciprocal_rank_fusion
+from diversity import mmr_rerank
+from instrumentation import metrics, profile
+from config import (
+    DEFAULT_SEARCH_LIMIT, SEARCH_BATCH_SIZE, SEARCH_BACKEND,
+    RESULT_CACHE_SIZE, RESULT_CACHE_FETCH_K, RESULT_CACHE_WARM_TOP_N,
+    REQUEST_COUNTS_PATH, NEIGHBOR_TABLE_ENABLED,
+    EMBEDDINGS_PATH, CATALOG_SNAPSHOT_PATH, SERVING_MANIFEST_PATH,
+    KEYWORD_INDEX_ENABLED, HYBRID_CANDIDATES, MMR_LAMBDA, MMR_CANDIDATES
+)
 
 
 class AnimeRecommender:
     """動漫推薦系統"""
     
-    def __init__(self):
-        """初始化推薦系統"""
+    def __init__(self, search_backend: str = SEARCH_BACKEND):
+        """
+        初始化推薦系統
+        
+        Args:
+            search_backend: 搜尋後端名稱 ("qdrant"、"local" 或 "ivf")
+        """
         self.data_processor = AnimeDataProcessor()
         self.embedding_generator = EmbeddingGenerator()
-        self.qdrant_manager = QdrantManager()
+        self.backend_name = search_backend
+        self.search_backend = create_search_backend(search_backend)
+        self.query_encoder = QueryEncoder(self.embedding_generator)
+        self.result_cache = RecommendationCache(RESULT_CACHE_SIZE)
+        self.neighbor_table = NeighborTable()
+        self.names = {}
         self.data = None
+        self.catalog = None
+        self.keyword_index = None
+        self.manifest = None
+        self.timings = {}
+        self._created_at = time.perf_counter()
+        self._keyword_payloads = None
+        self._keyword_pool = None
+        self._request_counts_loaded = False
         self.is_setup = False
     
-    def setup_system(self, force_rebuild: bool = False) -> None:
+    @metrics.timed("recommender.setup")
+    def setup_system(self, force_rebuild: bool = False,
+                     warm_top_n: int = RESULT_CACHE_WARM_TOP_N,
+                     serving_only: bool = False) -> None:
         """
         設定推薦系統
         
         Args:
             force_rebuild: 是否強制重建資料庫
+            warm_top_n: 啟動時預先計算推薦結果的熱門 MAL_ID 數量 (0 表示不預熱)
+            serving_only: 服務模式：依上次完整設定寫入的清單直接載入資料快照，
+                不重新處理 CSV、不檢查集合；清單或快照無法使用時改為完整設定
         """
+        start = time.perf_counter()
+        
+        if serving_only and not force_rebuild:
+            try:
+                self._setup_from_manifest(warm_top_n)
+                self.timings['setup_seconds'] = time.perf_counter() - start
+                print(f"\n=== 服務模式啟動完成 ({self.timings['setup_seconds']:.2f} 秒) ===")
+                return
+            except (FileNotFoundError, ValueError, KeyError) as e:
+                print(f"無法以服務模式啟動 ({e})，改為完整設定")
+        
         print("=== 動漫推薦系統設定 ===")
         
         # 1. 處理資料
         print("\n1. 處理動漫資料...")
-        self.data = self.data_processor.get_processed_data()
+        with metrics.span("recommender.setup.process_data"):
+            self.data = self.data_processor.get_processed_data()
         
         # 2. 生成向量
         print("\n2. 生成文本向量...")
-        try:
-            if force_rebuild:
-                raise FileNotFoundError("強制重建")
-            
-            # 嘗試載入既有向量
-            embeddings = self.embedding_generator.load_embeddings()
-        except FileNotFoundError:
-            # 重新生成向量
+        with metrics.span("recommender.setup.embeddings"):
+            # 每次都以簡介雜湊比對既有向量：新增、移除或簡介變更的列會被增量更新，
+            # 內容未變更時直接沿用既有儲存 (MAL_ID 不變但簡介變更也不會沿用舊向量)
             texts = self.data_processor.get_synopsis_list()
-            embeddings = self.embedding_generator.process_texts_to_embeddings(texts)
-        
-        # 3. 設定 Qdrant
-        print("\n3. 設定向量資料庫...")
-        self.qdrant_manager.connect()
-        
-        # 檢查集合是否存在
-        collections = self.qdrant_manager.get_collections()
-        if COLLECTION_NAME not in collections or force_rebuild:
-            print("建立新的向量集合...")
-            self.qdrant_manager.create_collection()
-            
-            # 上傳資料
+            embeddings = self.embedding_generator.update_embeddings(
+                texts, self.data.MAL_ID.tolist()
+            )
+            self.embedding_generator.close()
+        
+        # 3. 設定搜尋後端 (向量變更時由後端依內容雜湊同步，不需強制重建)
+        print("\n3. 設定向量搜尋後端...")
+        with metrics.span("recommender.setup.build_index"):
             metadata = self.data_processor.get_metadata()
-            self.qdrant_manager.batch_upsert(embeddings, metadata)
-        else:
-            print(f"使用既有集合: {COLLECTION_NAME}")
+            self.search_backend.build_index(embeddings, metadata, force_rebuild=force_rebuild)
+        
+        # 記錄資料快照與清單，下次可用服務模式快速啟動
+        content_hash = self.embedding_generator.store_header['content_hash']
+        self.data_processor.save_snapshot()
+        self._write_manifest(content_hash)
+        self._finish_setup(content_hash, warm_top_n, CATALOG_SNAPSHOT_PATH)
+        
+        self.timings['setup_seconds'] = time.perf_counter() - start
+        print(f"\n=== 系統設定完成 ({self.timings['setup_seconds']:.2f} 秒) ===")
+    
+    @metrics.timed("recommender.setup.serving")
+    def _setup_from_manifest(self, warm_top_n: int,
+                             manifest_path: str = SERVING_MANIFEST_PATH) -> None:
+        """
+        依服務清單載入資料快照並設定搜尋後端
+        
+        Qdrant 後端信任清單中的集合內容，不呼叫任何 Qdrant API (第一次搜尋時才連線)；
+        本地後端以記憶體映射載入向量並確認內容雜湊與清單一致。
+        
+        Args:
+            warm_top_n: 預熱的熱門 MAL_ID 數量
+            manifest_path: 服務清單路徑
+        """
+        if not os.path.exists(manifest_path):
+            raise FileNotFoundError(f"找不到服務清單: {manifest_path}")
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        
+        if manifest['backend'] != self.backend_name:
+            raise ValueError(f"服務清單的搜尋後端為 {manifest['backend']}")
+        
+        print(f"=== 服務模式啟動 (清單: {manifest_path}) ===")
+        # 只載入建立索引所需的欄位，簡介等其他欄位由 self.catalog 按需讀取
+        self.data = self.data_processor.load_snapshot(
+            manifest['catalog_snapshot'], columns=['Name'] + FILTER_COLUMNS
+        )
+        if len(self.data) != manifest['count']:
+            raise ValueError("資料快照與服務清單筆數不一致")
+        
+        content_hash = manifest['content_hash']
+        if self.backend_name != "qdrant":
+            embeddings = self.embedding_generator.load_embeddings(manifest['embeddings_path'])
+            if self.embedding_generator.store_header['content_hash'] != content_hash:
+                raise ValueError("向量儲存已變更")
+            EmbeddingStore.check_alignment(
+                self.embedding_generator.mal_ids, self.data.MAL_ID.to_numpy()
+            )
+            self.search_backend.build_index(embeddings, self.data_processor.get_metadata())
+        
+        self.manifest = manifest
+        self._finish_setup(content_hash, warm_top_n, manifest['catalog_snapshot'])
+    
+    @metrics.timed("recommender.setup.finish")
+    def _finish_setup(self, content_hash: str, warm_top_n: int, catalog_path: str) -> None:
+        """
+        開啟目錄儲存，設定快取版本、名稱對照與近鄰表，並視需要預熱結果快取
+        
+        Args:
+            content_hash: 向量內容雜湊
+            warm_top_n: 預熱的熱門 MAL_ID 數量
+            catalog_path: 目錄儲存路徑
+        """
+        self.catalog = CatalogStore(catalog_path).load()
         
+        # 集合內容可能已變更，舊的推薦結果快取一律失效
+        self.result_cache.set_version(content_hash)
+        self.names = dict(zip(self.data.MAL_ID.tolist(), self.data.Name.tolist()))
+        
+        # 載入預先計算的近鄰表 (需與目前向量內容一致)
+        self.neighbor_table = NeighborTable()
+        if NEIGHBOR_TABLE_ENABLED:
+            try:
+                self.neighbor_table.load(source_hash=content_hash)
+            except FileNotFoundError:
+                print("未找到近鄰表，推薦將使用即時搜尋")
+            except ValueError as e:
+                print(f"近鄰表無法使用 ({e})，推薦將使用即時搜尋")
+                self.neighbor_table = NeighborTable()
+        if KEYWORD_INDEX_ENABLED:
+            self._load_keyword_index()
+            # 在設定階段建立 (單執行緒)，避免並行的混合搜尋各自建立執行緒池
+            if self._keyword_pool is None:
+                self._keyword_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="keyword")
         self.is_setup = True
-        print("\n=== 系統設定完成 ===")
+        
+        # 不論是否預熱都載入歷史次數，關閉時儲存的次數才會跨次啟動累積
+        if not self._request_counts_loaded:
+            self.result_cache.load_request_counts(REQUEST_COUNTS_PATH)
+            self._request_counts_loaded = True
+        if warm_top_n > 0:
+            self.warm_result_cache(self.result_cache.most_requested(warm_top_n))
+    
+    def _load_keyword_index(self) -> None:
+        """載入關鍵字索引，索引不存在或與目錄儲存不一致時由目錄中的名稱與簡介重建"""
+        source_hash = self.catalog.fingerprint()
+        self.keyword_index = KeywordIndex()
+        self._keyword_payloads = None
+        try:
+            self.keyword_index.load(source_hash=source_hash)
+        except (FileNotFoundError, ValueError) as e:
+            print(f"重新建立關鍵字索引 ({e})")
+            texts = self.catalog.to_dataframe(['Name', 'sypnopsis'])
+            self.keyword_index.build(
+                texts.MAL_ID.tolist(), texts.Name.tolist(), texts.sypnopsis.tolist(),
+                source_hash=source_hash
+            )
+        EmbeddingStore.check_alignment(self.keyword_index.ids, self.data.MAL_ID.to_numpy())
     
+    def _write_manifest(self, content_hash: str,
+                        manifest_path: str = SERVING_MANIFEST_PATH) -> None:
+        """
+        寫入服務清單，記錄服務模式啟動所需的檔案與內容雜湊
+        
+        Args:
+            content_hash: 向量內容雜湊
+            manifest_path: 服務清單路徑
+        """
+        manifest = {
+            'format_version': 1,
+            'backend': self.backend_name,
+            'content_hash': content_hash,
+            'count': len(self.data),
+            'model_name': self.embedding_generator.model_name,
+            'embeddings_path': EMBEDDINGS_PATH,
+            'catalog_snapshot': CATALOG_SNAPSHOT_PATH,
+            'created_at': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        atomic_write_json(manifest_path, manifest)
+        self.manifest = manifest
+    
+    def _record_first_recommendation(self) -> None:
+        """記錄建立物件到第一次回傳推薦結果的時間"""
+        if 'time_to_first_recommendation' not in self.timings:
+            elapsed = time.perf_counter() - self._created_at
+            self.timings['time_to_first_recommendation'] = elapsed
+            print(f"第一次推薦完成，距啟動 {elapsed:.2f} 秒")
+    
+    @metrics.timed("recommender.recommend_by_mal_id")
     def recommend_by_mal_id(self, 
                            mal_id: int, 
-                           limit: int = DEFAULT_SEARCH_LIMIT) -> List[Dict[str, Any]]:
+                           limit: int = DEFAULT_SEARCH_LIMIT,
+                           search_filter: Optional[SearchFilter] = None,
+                           mmr_lambda: Optional[float] = None) -> List[Dict[str, Any]]:
         """
         根據 MAL_ID 取得推薦動漫
         
         Args:
             mal_id: 目標動漫的 MAL_ID
             limit: 推薦數量
-            
+            search_filter: 篩選條件 (類型、評分、播出形式等)，由搜尋後端在搜尋時套用
+            mmr_lambda: 若指定，取 MMR_CANDIDATES 個候選後以 MMR 重新排序 (見 diversify)，
+                結果不包含目標動漫本身
+        
         Returns:
             推薦動漫列表
         """
@@ -84,20 +266,442 @@ class AnimeRecommender:
             raise ValueError("請先設定系統")
         
         # 確保 mal_id 是標準 Python int 類型
-        mal_id = int(mal_id)
+        if mmr_lambda is None:
+            results = self._recommend_one(int(mal_id), limit, search_filter)
+        else:
+            # 目標動漫本身的相似度為 1，留在候選中會先被選出並壓低所有候選的 MMR 分數
+            candidates = self._recommend_one(int(mal_id), max(limit, MMR_CANDIDATES) + 1, search_filter)
+            results = self.diversify(candidates, limit, mmr_lambda, exclude_ids=[int(mal_id)])
+        self._record_first_recommendation()
+        return results
+    
+    def _recommend_one(self, mal_id: int, limit: int,
+                       search_filter: Optional[SearchFilter]) -> List[Dict[str, Any]]:
+        """
+        依序查詢近鄰表、結果快取與搜尋後端取得推薦
+        
+        Args:
+            mal_id: 目標動漫的 MAL_ID
+            limit: 推薦數量
+            search_filter: 篩選條件
+        
+        Returns:
+            推薦動漫列表
+        """
+        # 近鄰表與結果快取只保存未篩選的結果，有篩選條件時直接交給搜尋後端
+        if search_filter is not None:
+            metrics.increment("recommender.filtered_searches")
+            with metrics.span("recommender.search"):
+                return self.search_backend.search_similar(
+                    mal_id, limit=limit, search_filter=search_filter
+                )
+        
+        # 優先查詢預先計算的近鄰表，不在表中的 MAL_ID 才使用即時搜尋
+        from_table = self._lookup_neighbor_table(mal_id, limit)
+        if from_table is not None:
+            metrics.increment("recommender.neighbor_table_hits")
+            return from_table
+        
+        cached = self.result_cache.get(mal_id, limit)
+        if cached is not None:
+            metrics.increment("recommender.result_cache_hits")
+            return cached
+        metrics.increment("recommender.result_cache_misses")
+        
+        # 多取一些結果，之後較小的 limit 可直接由快取回傳
+        fetch_k = max(limit, RESULT_CACHE_FETCH_K)
+        with metrics.span("recommender.search"):
+            results = self.search_backend.search_similar(mal_id, limit=fetch_k)
+        self.result_cache.put(mal_id, fetch_k, results)
+        return results[:limit]
+    
+    def warm_result_cache(self, mal_ids: List[int]) -> None:
+        """
+        以批次搜尋預先計算指定 MAL_ID 的推薦結果
+        
+        Args:
+            mal_ids: 要預熱的 MAL_ID 列表
+        """
+        if not self.is_setup:
+            raise ValueError("請先設定系統")
+        
+        if not mal_ids:
+            return
+        
+        print(f"預熱推薦結果快取: {len(mal_ids)} 個 MAL_ID")
+        all_results = self.search_backend.recommend_by_mal_ids(mal_ids, limit=RESULT_CACHE_FETCH_K)
+        for mal_id, results in all_results.items():
+            self.result_cache.put(mal_id, RESULT_CACHE_FETCH_K, results)
+    
+    def save_request_counts(self, file_path: str = REQUEST_COUNTS_PATH,
+                            only_if_changed: bool = False) -> None:
+        """
+        儲存各 MAL_ID 的請求次數，供下次啟動時預熱熱門項目
+        
+        Args:
+            file_path: 儲存路徑
+            only_if_changed: 上次儲存後沒有新的請求時不寫入
+        """
+        if only_if_changed and self.result_cache.unsaved_requests() == 0:
+            return
+        self.result_cache.save_request_counts(file_path)
+    
+    def close(self) -> None:
+        """儲存請求次數並關閉關鍵字搜尋的執行緒池"""
+        self.save_request_counts(only_if_changed=True)
+        if self._keyword_pool is not None:
+            self._keyword_pool.shutdown(wait=False)
+            self._keyword_pool = None
+    
+    @metrics.timed("recommender.recommend_by_mal_ids")
+    def recommend_by_mal_ids(self,
+                             mal_ids: List[int],
+                             limit: int = DEFAULT_SEARCH_LIMIT,
+                             chunk_size: int = SEARCH_BATCH_SIZE,
+                             exclude_self: bool = False,
+                             search_filter: Optional[SearchFilter] = None) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        批次取得多個 MAL_ID 的推薦動漫
+        
+        Args:
+            mal_ids: 目標動漫的 MAL_ID 列表
+            limit: 每個 MAL_ID 的推薦數量
+            chunk_size: 每次批次搜尋包含的查詢數量
+            exclude_self: 是否從結果中排除查詢動漫本身
+            search_filter: 篩選條件，由搜尋後端在搜尋時套用
+        
+        Returns:
+            以 MAL_ID 為鍵的推薦動漫列表字典
+        """
+        if not self.is_setup:
+            raise ValueError("請先設定系統")
+        
+        mal_ids = list(dict.fromkeys(int(mal_id) for mal_id in mal_ids))
+        lookup_limit = limit + 1 if exclude_self else limit
+        
+        results = {}
+        # 近鄰表只保存未篩選的結果，有篩選條件時全部交給搜尋後端
+        if search_filter is None:
+            for mal_id in mal_ids:
+                from_table = self._lookup_neighbor_table(mal_id, lookup_limit)
+                if from_table is not None:
+                    if exclude_self:
+                        from_table = [r for r in from_table if r['MAL_ID'] != mal_id]
+                    results[mal_id] = from_table[:limit]
+        
+        remaining = [mal_id for mal_id in mal_ids if mal_id not in results]
+        if remaining:
+            results.update(self.search_backend.recommend_by_mal_ids(
+                remaining,
+                limit=limit,
+                chunk_size=chunk_size,
+                exclude_self=exclude_self,
+                search_filter=search_filter
+            ))
+        
+        self._record_first_recommendation()
+        return {mal_id: results[mal_id] for mal_id in mal_ids if mal_id in results}
+    
+    @metrics.timed("recommender.recommend_by_profile")
+    def recommend_by_profile(self,
+                             liked_ids: List[int],
+                             disliked_ids: Optional[List[int]] = None,
+                             limit: int = DEFAULT_SEARCH_LIMIT,
+                             search_filter: Optional[SearchFilter] = None,
+                             mmr_lambda: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        根據觀看清單 (喜歡與不喜歡的動漫) 取得推薦，不論清單長短都只需一次後端搜尋
+        
+        Args:
+            liked_ids: 喜歡的動漫 MAL_ID 列表
+            disliked_ids: 不喜歡的動漫 MAL_ID 列表
+            limit: 推薦數量
+            search_filter: 篩選條件，由搜尋後端在搜尋時套用
+            mmr_lambda: 若指定，取 MMR_CANDIDATES 個候選後以 MMR 重新排序
+        
+        Returns:
+            推薦動漫列表 (不包含清單中的動漫)
+        """
+        if not self.is_setup:
+            raise ValueError("請先設定系統")
+        
+        liked_ids, disliked_ids, _ = self._profile_seeds(liked_ids, disliked_ids)
+        depth = limit if mmr_lambda is None else max(limit, MMR_CANDIDATES)
+        with metrics.span("recommender.search"):
+            results = self.search_backend.recommend_by_profile(
+                liked_ids, disliked_ids, limit=depth, search_filter=search_filter
+            )
+        if mmr_lambda is not None:
+            results = self.diversify(results, limit, mmr_lambda)
+        self._record_first_recommendation()
+        return results
+    
+    def _profile_seeds(self, liked_ids: List[int],
+                       disliked_ids: Optional[List[int]]) -> tuple:
+        """
+        整理觀看清單：去除重複、略過目錄中沒有的 MAL_ID (同時出現在兩邊的視為喜歡)
+        
+        Args:
+            liked_ids: 喜歡的動漫 MAL_ID 列表
+            disliked_ids: 不喜歡的動漫 MAL_ID 列表
+        
+        Returns:
+            (喜歡的 MAL_ID, 不喜歡的 MAL_ID, 目錄中沒有的 MAL_ID)
+        """
+        liked_ids = list(dict.fromkeys(int(mal_id) for mal_id in liked_ids))
+        disliked_ids = [mal_id for mal_id in dict.fromkeys(int(mal_id) for mal_id in disliked_ids or [])
+                        if mal_id not in liked_ids]
+        
+        known = self.catalog.id_to_row
+        missing = [mal_id for mal_id in liked_ids + disliked_ids if mal_id not in known]
+        if missing:
+            print(f"以下 MAL_ID 不在資料中，已略過: {missing}")
+        liked_ids = [mal_id for mal_id in liked_ids if mal_id in known]
+        disliked_ids = [mal_id for mal_id in disliked_ids if mal_id in known]
+        if not liked_ids:
+            raise ValueError("喜歡的動漫皆不在資料中")
+        return liked_ids, disliked_ids, missing
+    
+    @metrics.timed("recommender.diversify")
+    def diversify(self, results: List[Dict[str, Any]], limit: int,
+                  mmr_lambda: float = MMR_LAMBDA,
+                  exclude_ids: Optional[Sequence[int]] = None) -> List[Dict[str, Any]]:
+        """
+        以最大邊際相關性 (MMR) 重新排序候選，避免同一系列的續作與劇場版佔滿推薦
+        
+        Args:
+            results: 依相似度排序的候選 (通常多於 limit)
+            limit: 回傳數量
+            mmr_lambda: 相關性權重 (0 到 1)，1 表示維持原本排序，越小越重視多樣性
+            exclude_ids: 重新排序前移除的 MAL_ID (例如查詢動漫本身)
+        
+        Returns:
+            重新排序後的推薦動漫列表
+        """
+        if exclude_ids:
+            excluded = set(exclude_ids)
+            results = [result for result in results if result['MAL_ID'] not in excluded]
+        if len(results) <= 1:
+            return results[:limit]
+        vectors = self.search_backend.get_vectors([result['MAL_ID'] for result in results])
+        return mmr_rerank(results, vectors, limit, mmr_lambda)
+    
+    def _lookup_neighbor_table(self, mal_id: int,
+                               limit: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        由近鄰表取得推薦結果
+        
+        Args:
+            mal_id: MAL_ID
+            limit: 推薦數量
+        
+        Returns:
+            推薦動漫列表，近鄰表中沒有該 MAL_ID 時回傳 None
+        """
+        neighbors = self.neighbor_table.lookup(mal_id, limit)
+        if neighbors is None:
+            return None
+        
+        return [
+            {'MAL_ID': neighbor_id, 'Name': self.names.get(neighbor_id, ""), 'Score': score}
+            for neighbor_id, score in neighbors
+        ]
+    
+    @metrics.timed("recommender.recommend_by_text")
+    def recommend_by_text(self,
+                          query: str,
+                          limit: int = DEFAULT_SEARCH_LIMIT,
+                          search_filter: Optional[SearchFilter] = None,
+                          mmr_lambda: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        根據自由文字描述取得推薦動漫
+        
+        Args:
+            query: 查詢文字，例如 "space bounty hunter with jazz soundtrack"
+            limit: 推薦數量
+            search_filter: 篩選條件，由搜尋後端在搜尋時套用
+            mmr_lambda: 若指定，取 MMR_CANDIDATES 個候選後以 MMR 重新排序
+        
+        Returns:
+            推薦動漫列表
+        """
+        if not self.is_setup:
+            raise ValueError("請先設定系統")
         
-        return self.qdrant_manager.search_similar(mal_id, limit=limit)
+        depth = limit if mmr_lambda is None else max(limit, MMR_CANDIDATES)
+        with metrics.span("recommender.encode_query"):
+            query_vector = self.query_encoder.encode(query)
+        with metrics.span("recommender.search"):
+            results = self.search_backend.search_by_vector(
+                query_vector, limit=depth, search_filter=search_filter
+            )
+        if mmr_lambda is not None:
+            results = self.diversify(results, limit, mmr_lambda)
+        self._record_first_recommendation()
+        return results
     
-    def display_recommendations(self, recommendations: List[Dict[str, Any]]) -> None:
+    @metrics.timed("recommender.recommend_by_keywords")
+    def recommend_by_keywords(self,
+                              query: str,
+                              limit: int = DEFAULT_SEARCH_LIMIT,
+                              search_filter: Optional[SearchFilter] = None) -> List[Dict[str, Any]]:
+        """
+        以 BM25 關鍵字搜尋名稱與簡介 (適合角色名稱、製作公司等專有名詞)
+        
+        Args:
+            query: 查詢文字
+            limit: 推薦數量
+            search_filter: 篩選條件
+        
+        Returns:
+            推薦動漫列表 (Score 為 BM25 分數)
+        """
+        if not self.is_setup:
+            raise ValueError("請先設定系統")
+        
+        results = self._format_ranked(self._keyword_search(query, limit, search_filter))
+        self._record_first_recommendation()
+        return results
+    
+    @metrics.timed("recommender.recommend_by_hybrid")
+    def recommend_by_hybrid(self,
+                            query: str,
+                            limit: int = DEFAULT_SEARCH_LIMIT,
+                            search_filter: Optional[SearchFilter] = None,
+                            candidates: int = HYBRID_CANDIDATES) -> List[Dict[str, Any]]:
+        """
+        混合搜尋：關鍵字與向量搜尋同時進行，再以倒數排名融合合併
+        
+        Args:
+            query: 查詢文字
+            limit: 推薦數量
+            search_filter: 篩選條件 (兩種搜尋都會套用)
+            candidates: 每種搜尋取出的候選數量
+        
+        Returns:
+            推薦動漫列表 (Score 為融合分數)
+        """
+        if not self.is_setup:
+            raise ValueError("請先設定系統")
+        
+        self._check_keyword_index()
+        if self._keyword_pool is None:
+            raise ValueError("推薦系統已關閉")
+        depth = max(limit, candidates)
+        keyword_future = self._keyword_pool.submit(self._keyword_search, query, depth, search_filter)
+        
+        with metrics.span("recommender.encode_query"):
+            query_vector = self.query_encoder.encode(query)
+        with metrics.span("recommender.search"):
+            dense = self.search_backend.search_by_vector(
+                query_vector, limit=depth, search_filter=search_filter
+            )
+        results = self._fuse(dense, keyword_future.result(), limit)
+        self._record_first_recommendation()
+        return results
+    
+    def _check_keyword_index(self) -> None:
+        """
+        確認關鍵字索引已啟用
+        
+        Raises:
+            ValueError: 關鍵字索引未啟用
+        """
+        if self.keyword_index is None:
+            raise ValueError("關鍵字索引未啟用 (KEYWORD_INDEX_ENABLED)")
+    
+    @metrics.timed("recommender.keyword_search")
+    def _keyword_search(self, query: str, limit: int,
+                        search_filter: Optional[SearchFilter]) -> List[tuple]:
+        """
+        執行關鍵字搜尋
+        
+        Args:
+            query: 查詢文字
+            limit: 回傳數量
+            search_filter: 篩選條件
+        
+        Returns:
+            (MAL_ID, BM25 分數) 列表
+        """
+        self._check_keyword_index()
+        mask = None
+        if search_filter is not None:
+            # 關鍵字索引與 self.data 逐列對齊，篩選欄位只在第一次篩選時建立
+            if self._keyword_payloads is None:
+                self._keyword_payloads = PayloadColumns(self.data_processor.build_metadata(self.data))
+            mask = search_filter.mask(self._keyword_payloads)
+        return self.keyword_index.search(query, limit, mask=mask)
+    
+    def _fuse(self, dense: List[Dict[str, Any]], keyword: List[tuple],
+              limit: int) -> List[Dict[str, Any]]:
+        """
+        以倒數排名融合合併向量與關鍵字搜尋結果
+        
+        Args:
+            dense: 向量搜尋結果
+            keyword: 關鍵字搜尋結果 ((MAL_ID, 分數) 列表)
+            limit: 回傳數量
+        
+        Returns:
+            推薦動漫列表
+        """
+        fused = reciprocal_rank_fusion(
+            [[r['MAL_ID'] for r in dense], [mal_id for mal_id, _ in keyword]], limit
+        )
+        return self._format_ranked(fused)
+    
+    def _format_ranked(self, ranked: List[tuple]) -> List[Dict[str, Any]]:
+        """
+        將 (MAL_ID, 分數) 列表轉為推薦結果格式
+        
+        Args:
+            ranked: (MAL_ID, 分數) 列表
+        
+        Returns:
+            推薦動漫列表
+        """
+        return [
+            {'MAL_ID': mal_id, 'Name': self.names.get(mal_id, ""), 'Score': score}
+            for mal_id, score in ranked
+        ]
+    
+    def profile_request(self, method: str, *args, mode: str = "cprofile",
+                        output: Optional[str] = None, **kwargs) -> tuple:
+        """
+        剖析單一請求，例如 profile_request("recommend_by_mal_id", 1, limit=10)
+        
+        Args:
+            method: 要呼叫的方法名稱
+            *args: 方法的位置參數
+            mode: "cprofile" 或 "sampling"
+            output: 剖析結果輸出檔 (.prof 或 folded stacks)
+            **kwargs: 方法的關鍵字參數
+        
+        Returns:
+            (方法回傳值, 剖析報告文字)
+        """
+        with profile(mode, output=output) as report:
+            result = getattr(self, method)(*args, **kwargs)
+        return result, report['report']
+    
+    def display_recommendations(self, recommendations: List[Dict[str, Any]],
+                                info_columns: Optional[Sequence[str]] = None) -> None:
         """
         顯示推薦結果
         
         Args:
             recommendations: 推薦動漫列表
+            info_columns: 一併顯示的目錄欄位 (例如 ["Score", "Genres"])
         """
+        if info_columns:
+            recommendations = self.enrich_results(recommendations, info_columns)
+        
         print(f"\n=== 推薦結果 (共 {len(recommendations)} 部) ===")
         for i, anime in enumerate(recommendations, 1):
             print(f"{i:2d}. {anime['Name']} (MAL_ID: {anime['MAL_ID']}) - 相似度: {anime['Score']:.4f}")
+            if info_columns and anime.get('info'):
+                print("    " + ", ".join(f"{name}: {anime['info'][name]}" for name in info_columns))
     
     def get_anime_info(self, mal_id: int) -> Optional[Dict[str, Any]]:
         """
@@ -105,18 +709,46 @@ class AnimeRecommender:
         
         Args:
             mal_id: MAL_ID
-            
+        
         Returns:
             動漫資訊字典
         """
-        if self.data is None:
+        if self.catalog is None:
             raise ValueError("請先設定系統")
         
-        anime_info = self.data[self.data.MAL_ID == mal_id]
-        if anime_info.empty:
-            return None
+        return self.catalog.get_anime_info(int(mal_id))
+    
+    def get_anime_infos(self, mal_ids: Sequence[int],
+                        columns: Optional[Sequence[str]] = None) -> List[Optional[Dict[str, Any]]]:
+        """
+        批次取得多部動漫的詳細資訊
         
-        return anime_info.iloc[0].to_dict()
+        Args:
+            mal_ids: MAL_ID 列表
+            columns: 要取出的欄位，None 表示全部
+        
+        Returns:
+            與 mal_ids 順序對應的動漫資訊字典列表 (不存在的 MAL_ID 為 None)
+        """
+        if self.catalog is None:
+            raise ValueError("請先設定系統")
+        
+        return self.catalog.get_anime_infos(mal_ids, columns)
+    
+    def enrich_results(self, results: List[Dict[str, Any]],
+                       columns: Sequence[str]) -> List[Dict[str, Any]]:
+        """
+        為推薦結果加上目錄欄位 (放在 'info' 鍵下，避免與相似度 'Score' 混淆)
+        
+        Args:
+            results: 推薦動漫列表
+            columns: 要加入的目錄欄位
+        
+        Returns:
+            加上 'info' 的推薦動漫列表 (新的字典，不修改快取中的結果)
+        """
+        infos = self.get_anime_infos([r['MAL_ID'] for r in results], columns)
+        return [dict(r, info=info) for r, info in zip(results, infos)]
 
 
 def main():
@@ -135,6 +767,8 @@ def main():
         recommender.display_recommendations(recommendations)
     except ValueError as e:
         print(f"錯誤: {e}")
+    finally:
+        recommender.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,308 @@
+# async_qdrant_manager.py
+"""
+非同步 Qdrant 管理模組 - 以共用的 AsyncQdrantClient 連線池提供非阻塞搜尋
+"""
+
+import asyncio
+import numpy as np
+from typing import List, Dict, Any, Optional
+import grpc
+import httpx
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.http.exceptions import UnexpectedResponse, ResponseHandlingException
+from qdrant_client.http.models import SearchRequest
+from qdrant_manager import QdrantManager, search_params
+from search_filter import SearchFilter
+from config import (
+    QDRANT_HOST, QDRANT_PORT, QDRANT_GRPC_PORT, QDRANT_PREFER_GRPC,
+    QDRANT_QUANTIZATION, COLLECTION_NAME, DEFAULT_SEARCH_LIMIT, SEARCH_BATCH_SIZE,
+    ASYNC_MAX_CONCURRENCY, ASYNC_POOL_SIZE
+)
+
+
+class AsyncQdrantManager:
+    """
+    非同步 Qdrant 搜尋管理器
+    
+    所有請求共用同一個 AsyncQdrantClient (HTTP 連線池或單一 gRPC 通道)，
+    並以信號量限制同時送往 Qdrant 的請求數量；超過上限的請求會在本地等待，
+    而不是全部湧入伺服器拉長尾端延遲。
+    集合的建立與資料寫入仍由同步的 QdrantManager 負責。
+    """
+    
+    def __init__(self, host: str = QDRANT_HOST, port: int = QDRANT_PORT,
+                 prefer_grpc: bool = QDRANT_PREFER_GRPC,
+                 grpc_port: int = QDRANT_GRPC_PORT,
+                 quantization: Optional[str] = QDRANT_QUANTIZATION,
+                 max_concurrency: int = ASYNC_MAX_CONCURRENCY,
+                 pool_size: int = ASYNC_POOL_SIZE):
+        """
+        初始化非同步 Qdrant 管理器
+        
+        Args:
+            host: Qdrant 主機位址
+            port: Qdrant 端口
+            prefer_grpc: 是否優先使用 gRPC 連線
+            grpc_port: Qdrant gRPC 端口
+            quantization: 集合使用的量化方式 (決定搜尋時是否重新計分)
+            max_concurrency: 同時進行的 Qdrant 請求數量上限
+            pool_size: HTTP 連線池大小
+        """
+        if max_concurrency <= 0:
+            raise ValueError("max_concurrency 必須大於 0")
+        
+        self.host = host
+        self.port = port
+        self.prefer_grpc = prefer_grpc
+        self.grpc_port = grpc_port
+        self.quantization = quantization
+        self.max_concurrency = max_concurrency
+        self.pool_size = pool_size
+        self.client = None
+        self._semaphore = None
+    
+    @classmethod
+    def from_manager(cls, manager: QdrantManager, **kwargs) -> "AsyncQdrantManager":
+        """
+        以同步管理器的連線設定建立非同步管理器
+        
+        Args:
+            manager: 同步 Qdrant 管理器
+            **kwargs: 其他建構參數 (max_concurrency、pool_size)
+        
+        Returns:
+            非同步 Qdrant 管理器
+        """
+        return cls(
+            host=manager.host,
+            port=manager.port,
+            prefer_grpc=manager.prefer_grpc,
+            grpc_port=manager.grpc_port,
+            quantization=manager.quantization,
+            **kwargs
+        )
+    
+    async def connect(self) -> None:
+        """建立共用的非同步連線"""
+        protocol = "gRPC" if self.prefer_grpc else "HTTP"
+        print(f"建立非同步 Qdrant 連線: {self.host}:{self.port} ({protocol})，"
+              f"同時請求上限 {self.max_concurrency}")
+        self.client = AsyncQdrantClient(
+            host=self.host,
+            port=self.port,
+            grpc_port=self.grpc_port,
+            prefer_grpc=self.prefer_grpc,
+            limits=httpx.Limits(
+                max_connections=self.pool_size,
+                max_keepalive_connections=self.pool_size
+            )
+        )
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+    
+    async def close(self) -> None:
+        """關閉連線"""
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+    
+    async def _ensure_connected(self) -> None:
+        """尚未連線時建立連線"""
+        if self.client is None:
+            await self.connect()
+    
+    async def count_points(self, collection_name: str = COLLECTION_NAME) -> Optional[int]:
+        """
+        取得集合中的資料點數量
+        
+        Args:
+            collection_name: 集合名稱 (或別名)
+        
+        Returns:
+            資料點數量，集合不存在或無法連線時回傳 None
+        
+        Raises:
+            UnexpectedResponse: Qdrant 回報集合不存在以外的錯誤
+        """
+        await self._ensure_connected()
+        try:
+            result = await self.client.count(collection_name=collection_name, exact=False)
+        except UnexpectedResponse as e:
+            if e.status_code == 404:
+                return None
+            raise
+        except (ResponseHandlingException, httpx.TransportError, ConnectionError, TimeoutError):
+            return None
+        except grpc.RpcError as e:
+            if e.code() in (grpc.StatusCode.NOT_FOUND, grpc.StatusCode.UNAVAILABLE,
+                            grpc.StatusCode.DEADLINE_EXCEEDED):
+                return None
+            raise
+        return result.count
+    
+    async def search_similar(self,
+                             mal_id: int,
+                             collection_name: str = COLLECTION_NAME,
+                             limit: int = DEFAULT_SEARCH_LIMIT,
+                             search_filter: Optional[SearchFilter] = None) -> List[Dict[str, Any]]:
+        """
+        搜尋相似動漫
+        
+        Args:
+            mal_id: 目標動漫的 MAL_ID
+            collection_name: 集合名稱
+            limit: 回傳結果數量
+            search_filter: 篩選條件
+        
+        Returns:
+            相似動漫列表
+        """
+        results = await self.recommend_by_mal_ids(
+            [mal_id], collection_name=collection_name, limit=limit,
+            search_filter=search_filter
+        )
+        if int(mal_id) not in results:
+            raise ValueError(f"MAL_ID {mal_id} 在集合中不存在")
+        return results[int(mal_id)]
+    
+    async def recommend_by_mal_ids(self,
+                                   mal_ids: List[int],
+                                   collection_name: str = COLLECTION_NAME,
+                                   limit: int = DEFAULT_SEARCH_LIMIT,
+                                   chunk_size: int = SEARCH_BATCH_SIZE,
+                                   exclude_self: bool = False,
+                                   search_filter: Optional[SearchFilter] = None) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        批次搜尋多個動漫的相似動漫 (一次 retrieve 加上分段的批次搜尋)
+        
+        Args:
+            mal_ids: 目標動漫的 MAL_ID 列表
+            collection_name: 集合名稱
+            limit: 每個 MAL_ID 回傳結果數量
+            chunk_size: 每次批次搜尋包含的查詢數量
+            exclude_self: 是否從結果中排除查詢動漫本身
+            search_filter: 篩選條件
+        
+        Returns:
+            以 MAL_ID 為鍵的相似動漫列表字典 (不存在於集合中的 MAL_ID 不會出現)
+        """
+        await self._ensure_connected()
+        
+        if chunk_size <= 0:
+            raise ValueError("chunk_size 必須大於 0")
+        
+        mal_ids = list(dict.fromkeys(int(mal_id) for mal_id in mal_ids))
+        if not mal_ids:
+            return {}
+        
+        async with self._semaphore:
+            records = await self.client.retrieve(
+                collection_name=collection_name,
+                ids=mal_ids,
+                with_payload=False,
+                with_vectors=True
+            )
+        vectors = {int(record.id): record.vector for record in records}
+        
+        found_ids = [mal_id for mal_id in mal_ids if mal_id in vectors]
+        search_limit = limit + 1 if exclude_self else limit
+        query_filter = QdrantManager._query_filter(search_filter)
+        params = search_params(self.quantization)
+        
+        async def search_chunk(chunk_ids):
+            requests = [
+                SearchRequest(
+                    vector=vectors[mal_id],
+                    filter=query_filter,
+                    limit=search_limit,
+                    with_payload=True,
+                    params=params
+                )
+                for mal_id in chunk_ids
+            ]
+            async with self._semaphore:
+                return await self.client.search_batch(
+                    collection_name=collection_name,
+                    requests=requests
+                )
+        
+        chunks = [found_ids[start:start + chunk_size] for start in range(0, len(found_ids), chunk_size)]
+        batch_results = await asyncio.gather(*(search_chunk(chunk) for chunk in chunks))
+        
+        results = {}
+        for chunk_ids, chunk_results in zip(chunks, batch_results):
+            for mal_id, similar_results in zip(chunk_ids, chunk_results):
+                formatted = QdrantManager._format_results(similar_results)
+                if exclude_self:
+                    formatted = [r for r in formatted if r['MAL_ID'] != mal_id]
+                results[mal_id] = formatted[:limit]
+        
+        return results
+    
+    async def search_by_vector(self,
+                               vector: np.ndarray,
+                               limit: int = DEFAULT_SEARCH_LIMIT,
+                               collection_name: str = COLLECTION_NAME,
+                               search_filter: Optional[SearchFilter] = None) -> List[Dict[str, Any]]:
+        """
+        以查詢向量搜尋相似動漫
+        
+        Args:
+            vector: 查詢向量
+            limit: 回傳結果數量
+            collection_name: 集合名稱
+            search_filter: 篩選條件
+        
+        Returns:
+            相似動漫列表
+        """
+        await self._ensure_connected()
+        
+        async with self._semaphore:
+            similar_results = await self.client.search(
+                collection_name=collection_name,
+                query_vector=np.asarray(vector, dtype=np.float32).tolist(),
+                query_filter=QdrantManager._query_filter(search_filter),
+                limit=limit,
+                with_payload=True,
+                search_params=search_params(self.quantization)
+            )
+        
+        return QdrantManager._format_results(similar_results)
+    
+    async def recommend_by_profile(self,
+                                   liked_ids: List[int],
+                                   disliked_ids: Optional[List[int]] = None,
+                                   limit: int = DEFAULT_SEARCH_LIMIT,
+                                   collection_name: str = COLLECTION_NAME,
+                                   search_filter: Optional[SearchFilter] = None) -> List[Dict[str, Any]]:
+        """
+        以 Qdrant recommend API 一次請求取得多個範例動漫的推薦
+        
+        Args:
+            liked_ids: 喜歡的動漫 MAL_ID 列表
+            disliked_ids: 不喜歡的動漫 MAL_ID 列表
+            limit: 回傳結果數量
+            collection_name: 集合名稱
+            search_filter: 篩選條件
+        
+        Returns:
+            相似動漫列表 (不包含作為範例的動漫)
+        """
+        await self._ensure_connected()
+        
+        positive, negative = QdrantManager._profile_examples(liked_ids, disliked_ids)
+        try:
+            async with self._semaphore:
+                similar_results = await self.client.recommend(
+                    collection_name=collection_name,
+                    positive=positive,
+                    negative=negative,
+                    query_filter=QdrantManager._query_filter(search_filter),
+                    limit=limit,
+                    with_payload=True,
+                    search_params=search_params(self.quantization)
+                )
+        except UnexpectedResponse as e:
+            raise ValueError(f"範例動漫在集合中不存在: {e}") from e
+        
+        return QdrantManager._format_results(similar_results)
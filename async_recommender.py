@@ -0,0 +1,652 @@
+# async_recommender.py
+"""
+非同步推薦服務模組 - 以 asyncio 提供推薦功能，合併相同的進行中請求並限制後端並行數量
+"""
+
+import asyncio
+import functools
+from typing import List, Dict, Any, Optional, Sequence, Set, Callable, Awaitable, Hashable
+from anime_recommender import AnimeRecommender
+from query_encoder import QueryEncoder
+from search_filter import SearchFilter
+from config import (
+    DEFAULT_SEARCH_LIMIT, SEARCH_BATCH_SIZE, SEARCH_BACKEND,
+    RESULT_CACHE_FETCH_K, RESULT_CACHE_WARM_TOP_N, ASYNC_MAX_CONCURRENCY,
+    ASYNC_BATCH_WINDOW, ASYNC_MAX_BATCH_SIZE, HYBRID_CANDIDATES, MMR_CANDIDATES
+)
+
+
+class SearchBatcher:
+    """
+    相似搜尋的微批次處理器
+    
+    在 batch_window 秒內到達的單筆 MAL_ID 搜尋會合併為一次
+    recommend_by_mal_ids 呼叫；累積到 max_batch_size 筆時立即送出。
+    """
+    
+    def __init__(self, search_many: Callable[[List[int], int], Awaitable[Dict[int, List[Dict[str, Any]]]]],
+                 batch_window: float = ASYNC_BATCH_WINDOW,
+                 max_batch_size: int = ASYNC_MAX_BATCH_SIZE):
+        """
+        初始化批次處理器
+        
+        Args:
+            search_many: 批次搜尋協程函式，參數為 (MAL_ID 列表, 每筆結果數量)
+            batch_window: 收集請求的時間窗口 (秒)
+            max_batch_size: 單一批次的請求數量上限
+        """
+        self.search_many = search_many
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.batches = 0
+        self.batched_requests = 0
+        self._pending: Dict[tuple, asyncio.Future] = {}
+        self._timer = None
+        # 保留執行中批次的參照，避免任務在完成前被垃圾回收
+        self._tasks: Set[asyncio.Task] = set()
+    
+    async def submit(self, mal_id: int, limit: int) -> List[Dict[str, Any]]:
+        """
+        加入一筆相似搜尋並等待批次結果
+        
+        Args:
+            mal_id: 目標動漫的 MAL_ID
+            limit: 回傳結果數量
+        
+        Returns:
+            相似動漫列表
+        """
+        loop = asyncio.get_running_loop()
+        key = (mal_id, limit)
+        future = self._pending.get(key)
+        if future is None:
+            future = loop.create_future()
+            self._pending[key] = future
+        
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.batch_window, self._flush)
+        
+        return await asyncio.shield(future)
+    
+    def stats(self) -> Dict[str, float]:
+        """
+        取得批次統計
+        
+        Returns:
+            批次數量、批次處理的請求數量與平均批次大小
+        """
+        return {
+            'batches': self.batches,
+            'batched_requests': self.batched_requests,
+            'avg_batch_size': self.batched_requests / self.batches if self.batches else 0.0,
+        }
+    
+    def _flush(self) -> None:
+        """送出目前收集到的請求 (依結果數量分組，每組一次批次搜尋)"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        
+        pending, self._pending = self._pending, {}
+        groups: Dict[int, Dict[int, asyncio.Future]] = {}
+        for (mal_id, limit), future in pending.items():
+            groups.setdefault(limit, {})[mal_id] = future
+        for limit, futures in groups.items():
+            task = asyncio.ensure_future(self._run(futures, limit))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+    
+    async def _run(self, futures: Dict[int, asyncio.Future], limit: int) -> None:
+        """
+        執行一次批次搜尋並分派結果
+        
+        Args:
+            futures: 以 MAL_ID 為鍵的等待中結果
+            limit: 每筆結果數量
+        """
+        self.batches += 1
+        self.batched_requests += len(futures)
+        try:
+            results = await self.search_many(list(futures), limit)
+        except Exception as e:
+            for future in futures.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for mal_id, future in futures.items():
+            if future.done():
+                continue
+            if mal_id in results:
+                future.set_result(results[mal_id])
+            else:
+                future.set_exception(ValueError(f"MAL_ID {mal_id} 在集合中不存在"))
+
+
+class AsyncAnimeRecommender:
+    """
+    非同步動漫推薦服務
+    
+    系統設定 (資料處理、向量與索引建立) 沿用同步的 AnimeRecommender；
+    搜尋時 Qdrant 後端使用共用連線的 AsyncQdrantManager，本地後端則在執行緒池中計算。
+    同一個 MAL_ID (或同一段查詢文字) 同時有多個請求時只執行一次搜尋，
+    其餘請求等待同一個結果。
+    """
+    
+    def __init__(self, recommender: Optional[AnimeRecommender] = None,
+                 search_backend: str = SEARCH_BACKEND,
+                 max_concurrency: int = ASYNC_MAX_CONCURRENCY,
+                 batch_window: float = ASYNC_BATCH_WINDOW,
+                 max_batch_size: int = ASYNC_MAX_BATCH_SIZE):
+        """
+        初始化非同步推薦服務
+        
+        Args:
+            recommender: 已建立的同步推薦系統，None 表示以 search_backend 建立新的
+            search_backend: 搜尋後端名稱 ("qdrant"、"local" 或 "ivf")
+            max_concurrency: 同時進行的後端搜尋數量上限
+            batch_window: 合併單筆 MAL_ID 搜尋的時間窗口 (秒)，0 表示不合併
+            max_batch_size: 單一批次的搜尋數量上限
+        """
+        if max_concurrency <= 0:
+            raise ValueError("max_concurrency 必須大於 0")
+        
+        self.recommender = recommender or AnimeRecommender(search_backend)
+        self.max_concurrency = max_concurrency
+        self.async_backend = None
+        self.coalesced_requests = 0
+        self._semaphore = None
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.batcher = None
+        if batch_window > 0:
+            self.batcher = SearchBatcher(self._search_many, batch_window, max_batch_size)
+    
+    @property
+    def is_setup(self) -> bool:
+        """系統是否已設定完成"""
+        return self.recommender.is_setup and self._semaphore is not None
+    
+    async def setup(self, force_rebuild: bool = False,
+                    warm_top_n: int = RESULT_CACHE_WARM_TOP_N,
+                    serving_only: bool = True) -> None:
+        """
+        設定推薦系統 (在執行緒池中執行同步設定，不阻塞事件迴圈)
+        
+        Args:
+            force_rebuild: 是否強制重建資料庫
+            warm_top_n: 啟動時預先計算推薦結果的熱門 MAL_ID 數量
+            serving_only: 是否優先以服務清單快速啟動 (見 AnimeRecommender.setup_system)
+        """
+        if not self.recommender.is_setup:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, functools.partial(
+                self.recommender.setup_system, force_rebuild=force_rebuild,
+                warm_top_n=warm_top_n, serving_only=serving_only
+            ))
+        
+        if self.recommender.backend_name == "qdrant":
+            # 延遲匯入，使用本地後端時不需要 qdrant-client
+            from async_qdrant_manager import AsyncQdrantManager
+            self.async_backend = AsyncQdrantManager.from_manager(
+                self.recommender.search_backend, max_concurrency=self.max_concurrency
+            )
+            await self.async_backend.connect()
+        
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+    
+    async def close(self) -> None:
+        """關閉非同步連線，並儲存請求次數供下次啟動時預熱"""
+        if self.async_backend is not None:
+            await self.async_backend.close()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.recommender.close)
+    
+    async def save_request_counts(self) -> None:
+        """在執行緒池中儲存請求次數 (上次儲存後沒有新的請求時不寫入)"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, functools.partial(
+            self.recommender.save_request_counts, only_if_changed=True
+        ))
+    
+    async def recommend_by_mal_id(self,
+                                  mal_id: int,
+                                  limit: int = DEFAULT_SEARCH_LIMIT,
+                                  search_filter: Optional[SearchFilter] = None,
+                                  mmr_lambda: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        根據 MAL_ID 取得推薦動漫
+        
+        Args:
+            mal_id: 目標動漫的 MAL_ID
+            limit: 推薦數量
+            search_filter: 篩選條件
+            mmr_lambda: 若指定，取 MMR_CANDIDATES 個候選後以 MMR 重新排序，結果不包含目標動漫本身
+        
+        Returns:
+            推薦動漫列表
+        """
+        self._check_setup()
+        if mmr_lambda is None:
+            results = await self._recommend_one(int(mal_id), limit, search_filter)
+        else:
+            candidates = await self._recommend_one(int(mal_id), max(limit, MMR_CANDIDATES) + 1, search_filter)
+            results = await self._diversify(candidates, limit, mmr_lambda, exclude_ids=[int(mal_id)])
+        self.recommender._record_first_recommendation()
+        return results
+    
+    async def _recommend_one(self, mal_id: int, limit: int,
+                             search_filter: Optional[SearchFilter]) -> List[Dict[str, Any]]:
+        """
+        依序查詢近鄰表、結果快取，最後以合併後的批次搜尋取得推薦
+        
+        Args:
+            mal_id: 目標動漫的 MAL_ID
+            limit: 推薦數量
+            search_filter: 篩選條件
+        
+        Returns:
+            推薦動漫列表
+        """
+        if search_filter is not None:
+            key = ('similar', mal_id, limit, search_filter.cache_key())
+            return await self._coalesce(key, lambda: self._search_similar(mal_id, limit, search_filter))
+        
+        from_table = self.recommender._lookup_neighbor_table(mal_id, limit)
+        if from_table is not None:
+            return from_table
+        
+        result_cache = self.recommender.result_cache
+        cached = result_cache.get(mal_id, limit)
+        if cached is not None:
+            return cached
+        
+        # 與同步版本相同，多取一些結果放入快取
+        fetch_k = max(limit, RESULT_CACHE_FETCH_K)
+        
+        async def fetch():
+            if self.batcher is not None:
+                results = await self.batcher.submit(mal_id, fetch_k)
+            else:
+                results = await self._search_similar(mal_id, fetch_k)
+            result_cache.put(mal_id, fetch_k, results)
+            return results
+        
+        results = await self._coalesce(('similar', mal_id, fetch_k, None), fetch)
+        return results[:limit]
+    
+    async def recommend_by_mal_ids(self,
+                                   mal_ids: List[int],
+                                   limit: int = DEFAULT_SEARCH_LIMIT,
+                                   chunk_size: int = SEARCH_BATCH_SIZE,
+                                   exclude_self: bool = False,
+                                   search_filter: Optional[SearchFilter] = None) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        批次取得多個 MAL_ID 的推薦動漫
+        
+        Args:
+            mal_ids: 目標動漫的 MAL_ID 列表
+            limit: 每個 MAL_ID 的推薦數量
+            chunk_size: 每次批次搜尋包含的查詢數量
+            exclude_self: 是否從結果中排除查詢動漫本身
+            search_filter: 篩選條件
+        
+        Returns:
+            以 MAL_ID 為鍵的推薦動漫列表字典
+        """
+        self._check_setup()
+        
+        mal_ids = list(dict.fromkeys(int(mal_id) for mal_id in mal_ids))
+        lookup_limit = limit + 1 if exclude_self else limit
+        
+        results = {}
+        if search_filter is None:
+            for mal_id in mal_ids:
+                from_table = self.recommender._lookup_neighbor_table(mal_id, lookup_limit)
+                if from_table is not None:
+                    if exclude_self:
+                        from_table = [r for r in from_table if r['MAL_ID'] != mal_id]
+                    results[mal_id] = from_table[:limit]
+        
+        remaining = [mal_id for mal_id in mal_ids if mal_id not in results]
+        if remaining:
+            kwargs = dict(limit=limit, chunk_size=chunk_size,
+                          exclude_self=exclude_self, search_filter=search_filter)
+            if self.async_backend is not None:
+                results.update(await self.async_backend.recommend_by_mal_ids(remaining, **kwargs))
+            else:
+                results.update(await self._run_blocking(
+                    self.recommender.search_backend.recommend_by_mal_ids, remaining, **kwargs
+                ))
+        
+        self.recommender._record_first_recommendation()
+        return {mal_id: results[mal_id] for mal_id in mal_ids if mal_id in results}
+    
+    async def recommend_by_profile(self,
+                                   liked_ids: List[int],
+                                   disliked_ids: Optional[List[int]] = None,
+                                   limit: int = DEFAULT_SEARCH_LIMIT,
+                                   search_filter: Optional[SearchFilter] = None,
+                                   mmr_lambda: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        根據觀看清單取得推薦 (一次後端搜尋)
+        
+        Args:
+            liked_ids: 喜歡的動漫 MAL_ID 列表
+            disliked_ids: 不喜歡的動漫 MAL_ID 列表
+            limit: 推薦數量
+            search_filter: 篩選條件
+            mmr_lambda: 若指定，取 MMR_CANDIDATES 個候選後以 MMR 重新排序
+        
+        Returns:
+            推薦動漫列表 (不包含清單中的動漫)
+        """
+        self._check_setup()
+        
+        liked_ids, disliked_ids, _ = self.recommender._profile_seeds(liked_ids, disliked_ids)
+        depth = limit if mmr_lambda is None else max(limit, MMR_CANDIDATES)
+        if self.async_backend is not None:
+            results = await self.async_backend.recommend_by_profile(
+                liked_ids, disliked_ids, limit=depth, search_filter=search_filter
+            )
+        else:
+            results = await self._run_blocking(
+                self.recommender.search_backend.recommend_by_profile,
+                liked_ids, disliked_ids, limit=depth, search_filter=search_filter
+            )
+        if mmr_lambda is not None:
+            results = await self._diversify(results, limit, mmr_lambda)
+        self.recommender._record_first_recommendation()
+        return results
+    
+    async def recommend_by_text(self,
+                                query: str,
+                                limit: int = DEFAULT_SEARCH_LIMIT,
+                                search_filter: Optional[SearchFilter] = None,
+                                mmr_lambda: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        根據自由文字描述取得推薦動漫
+        
+        Args:
+            query: 查詢文字
+            limit: 推薦數量
+            search_filter: 篩選條件
+            mmr_lambda: 若指定，取 MMR_CANDIDATES 個候選後以 MMR 重新排序
+        
+        Returns:
+            推薦動漫列表
+        """
+        self._check_setup()
+        
+        depth = limit if mmr_lambda is None else max(limit, MMR_CANDIDATES)
+        filter_key = search_filter.cache_key() if search_filter is not None else None
+        key = ('text', QueryEncoder.normalize(query), depth, filter_key)
+        
+        async def search():
+            # 編碼在執行緒池中進行，同時到達的查詢會由 QueryEncoder 合併為一個批次
+            loop = asyncio.get_running_loop()
+            vector = await loop.run_in_executor(None, self.recommender.query_encoder.encode, query)
+            return await self._search_by_vector(vector, depth, search_filter)
+        
+        results = await self._coalesce(key, search)
+        if mmr_lambda is not None:
+            results = await self._diversify(results, limit, mmr_lambda)
+        self.recommender._record_first_recommendation()
+        return results
+    
+    async def recommend_by_keywords(self,
+                                    query: str,
+                                    limit: int = DEFAULT_SEARCH_LIMIT,
+                                    search_filter: Optional[SearchFilter] = None) -> List[Dict[str, Any]]:
+        """
+        以 BM25 關鍵字搜尋名稱與簡介
+        
+        Args:
+            query: 查詢文字
+            limit: 推薦數量
+            search_filter: 篩選條件
+        
+        Returns:
+            推薦動漫列表
+        """
+        self._check_setup()
+        return await self._run_blocking(
+            self.recommender.recommend_by_keywords, query, limit=limit, search_filter=search_filter
+        )
+    
+    async def recommend_by_hybrid(self,
+                                  query: str,
+                                  limit: int = DEFAULT_SEARCH_LIMIT,
+                                  search_filter: Optional[SearchFilter] = None,
+                                  candidates: int = HYBRID_CANDIDATES) -> List[Dict[str, Any]]:
+        """
+        混合搜尋：關鍵字搜尋與查詢編碼、向量搜尋同時進行，再以倒數排名融合合併
+        
+        Args:
+            query: 查詢文字
+            limit: 推薦數量
+            search_filter: 篩選條件
+            candidates: 每種搜尋取出的候選數量
+        
+        Returns:
+            推薦動漫列表
+        """
+        self._check_setup()
+        # 關鍵字索引未啟用時不需要先編碼查詢
+        self.recommender._check_keyword_index()
+        
+        depth = max(limit, candidates)
+        filter_key = search_filter.cache_key() if search_filter is not None else None
+        key = ('hybrid', QueryEncoder.normalize(query), limit, depth, filter_key)
+        
+        async def dense():
+            loop = asyncio.get_running_loop()
+            vector = await loop.run_in_executor(None, self.recommender.query_encoder.encode, query)
+            return await self._search_by_vector(vector, depth, search_filter)
+        
+        async def search():
+            keyword, vector_results = await asyncio.gather(
+                self._run_blocking(self.recommender._keyword_search, query, depth, search_filter),
+                dense()
+            )
+            return self.recommender._fuse(vector_results, keyword, limit)
+        
+        results = await self._coalesce(key, search)
+        self.recommender._record_first_recommendation()
+        return results
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        取得服務統計
+        
+        Returns:
+            進行中的搜尋數量、被合併的請求數量與結果快取統計
+        """
+        return {
+            'inflight': len(self._inflight),
+            'coalesced_requests': self.coalesced_requests,
+            'batching': self.batcher.stats() if self.batcher is not None else None,
+            'timings': self.recommender.timings,
+            'result_cache': self.recommender.result_cache.stats(),
+        }
+    
+    async def status(self) -> Dict[str, Any]:
+        """
+        取得就緒狀態：向量、搜尋索引 (或 Qdrant 集合) 與近鄰表是否已載入
+        
+        Returns:
+            狀態字典，ready 為 True 表示可以處理推薦請求
+        """
+        recommender = self.recommender
+        embeddings = recommender.embedding_generator.embeddings
+        embedding_count = len(embeddings) if embeddings is not None else 0
+        if embeddings is None and recommender.manifest is not None and recommender.backend_name == "qdrant":
+            # 服務模式下 Qdrant 後端不在本地載入向量，以服務清單記錄的筆數為準
+            embedding_count = recommender.manifest['count']
+        status = {
+            'backend': recommender.backend_name,
+            'embeddings_loaded': embedding_count > 0,
+            'embedding_count': embedding_count,
+            'neighbor_table_loaded': recommender.neighbor_table.neighbors is not None,
+        }
+        
+        if self.async_backend is not None:
+            status['index_count'] = await self.async_backend.count_points()
+        elif getattr(recommender.search_backend, 'ids', None) is not None:
+            status['index_count'] = len(recommender.search_backend.ids)
+        else:
+            status['index_count'] = None
+        status['index_loaded'] = bool(status['index_count'])
+        status['ready'] = self.is_setup and status['embeddings_loaded'] and status['index_loaded']
+        return status
+    
+    async def _coalesce(self, key: Hashable,
+                        factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        合併相同鍵的進行中請求：第一個請求執行搜尋，其餘請求等待同一個結果
+        
+        Args:
+            key: 請求鍵
+            factory: 建立搜尋協程的函式
+        
+        Returns:
+            搜尋結果
+        """
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced_requests += 1
+        else:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        
+        # 個別請求被取消時不影響其他等待同一結果的請求
+        return await asyncio.shield(task)
+    
+    async def _search_many(self, mal_ids: List[int], limit: int) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        以一次後端批次搜尋取得多個 MAL_ID 的相似動漫 (供 SearchBatcher 使用)
+        
+        Args:
+            mal_ids: 目標動漫的 MAL_ID 列表
+            limit: 每個 MAL_ID 回傳結果數量
+        
+        Returns:
+            以 MAL_ID 為鍵的相似動漫列表字典
+        """
+        if self.async_backend is not None:
+            return await self.async_backend.recommend_by_mal_ids(mal_ids, limit=limit)
+        return await self._run_blocking(
+            self.recommender.search_backend.recommend_by_mal_ids, mal_ids, limit=limit
+        )
+    
+    async def _search_similar(self, mal_id: int, limit: int,
+                              search_filter: Optional[SearchFilter] = None) -> List[Dict[str, Any]]:
+        """
+        以非同步後端或執行緒池執行相似搜尋
+        
+        Args:
+            mal_id: 目標動漫的 MAL_ID
+            limit: 回傳結果數量
+            search_filter: 篩選條件
+        
+        Returns:
+            相似動漫列表
+        """
+        if self.async_backend is not None:
+            # AsyncQdrantManager 本身即以信號量限制並行數量
+            return await self.async_backend.search_similar(
+                mal_id, limit=limit, search_filter=search_filter
+            )
+        return await self._run_blocking(
+            self.recommender.search_backend.search_similar,
+            mal_id, limit=limit, search_filter=search_filter
+        )
+    
+    async def _search_by_vector(self, vector, limit: int,
+                                search_filter: Optional[SearchFilter] = None) -> List[Dict[str, Any]]:
+        """
+        以非同步後端或執行緒池執行向量搜尋
+        
+        Args:
+            vector: 查詢向量
+            limit: 回傳結果數量
+            search_filter: 篩選條件
+        
+        Returns:
+            相似動漫列表
+        """
+        if self.async_backend is not None:
+            # AsyncQdrantManager 本身即以信號量限制並行數量
+            return await self.async_backend.search_by_vector(
+                vector, limit=limit, search_filter=search_filter
+            )
+        return await self._run_blocking(
+            self.recommender.search_backend.search_by_vector,
+            vector, limit=limit, search_filter=search_filter
+        )
+    
+    async def _diversify(self, results: List[Dict[str, Any]], limit: int,
+                         mmr_lambda: float,
+                         exclude_ids: Optional[Sequence[int]] = None) -> List[Dict[str, Any]]:
+        """
+        在執行緒池中以 MMR 重新排序候選 (Qdrant 後端需一次 retrieve 取得候選向量)
+        
+        Args:
+            results: 候選列表
+            limit: 回傳數量
+            mmr_lambda: 相關性權重
+            exclude_ids: 重新排序前移除的 MAL_ID
+        
+        Returns:
+            重新排序後的推薦動漫列表
+        """
+        return await self._run_blocking(self.recommender.diversify, results, limit, mmr_lambda,
+                                        exclude_ids=exclude_ids)
+    
+    async def _run_blocking(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        在執行緒池中執行同步搜尋，並以信號量限制同時執行的數量
+        
+        Args:
+            func: 同步函式
+            *args: 位置參數
+            **kwargs: 關鍵字參數
+        
+        Returns:
+            函式回傳值
+        """
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+    
+    def _check_setup(self) -> None:
+        """確認系統已設定完成"""
+        if not self.is_setup:
+            raise ValueError("請先設定系統")
+
+
+async def main():
+    """非同步服務示範：同時送出多個請求"""
+    service = AsyncAnimeRecommender()
+    await service.setup()
+    
+    try:
+        mal_ids = [1, 5, 6, 1, 1, 5]
+        all_results = await asyncio.gather(
+            *(service.recommend_by_mal_id(mal_id, limit=5) for mal_id in mal_ids),
+            return_exceptions=True
+        )
+        for mal_id, results in zip(mal_ids, all_results):
+            if isinstance(results, Exception):
+                print(f"MAL_ID {mal_id}: {results}")
+            else:
+                print(f"MAL_ID {mal_id}: {[r['Name'] for r in results]}")
+        print(f"服務統計: {service.stats()}")
+    finally:
+        await service.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
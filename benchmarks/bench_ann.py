@@ -0,0 +1,105 @@
+"""
+IVF 近似搜尋基準測試 - 掃描 nprobe 產生 recall@10 / 延遲曲線
+
+執行方式 (於專案根目錄):
+    python -m benchmarks.bench_ann
+    python -m benchmarks.bench_ann --n 200000 --nlist 1024 --nprobe 1 2 4 8 16 32 64
+"""
+
+import argparse
+import json
+import time
+import numpy as np
+from local_search import LocalSearchBackend
+from ivf_index import IVFSearchBackend
+from embedding_store import EmbeddingStore
+from benchmarks.bench_quantization import clustered_vectors, recall_at_k
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IVF recall / 延遲曲線")
+    parser.add_argument("--embeddings", help="向量儲存路徑，未指定時使用合成資料")
+    parser.add_argument("--n", type=int, default=50000, help="合成資料筆數")
+    parser.add_argument("--dim", type=int, default=768, help="合成資料維度")
+    parser.add_argument("--queries", type=int, default=200, help="查詢數量")
+    parser.add_argument("--k", type=int, default=10, help="recall@k 的 k")
+    parser.add_argument("--nlist", type=int, default=None, help="群集數量 (預設約 4 × √N)")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--json", help="將結果寫入 JSON 檔")
+    args = parser.parse_args()
+    
+    if args.embeddings:
+        vectors, ids = EmbeddingStore(args.embeddings).load()
+    else:
+        vectors = clustered_vectors(args.n, args.dim)
+        ids = np.arange(len(vectors))
+    metadata = [{'MAL_ID': int(mal_id), 'Name': ""} for mal_id in ids]
+    
+    rng = np.random.default_rng(1)
+    query_rows = rng.choice(len(vectors), min(args.queries, len(vectors)), replace=False)
+    queries = np.asarray(vectors[query_rows], dtype=np.float32)
+    
+    exact_backend = LocalSearchBackend(quantization=None)
+    exact_backend.build_index(vectors, metadata)
+    exact, exact_latencies = _run_queries(exact_backend, queries, args.k)
+    
+    ivf = IVFSearchBackend(nlist=args.nlist, index_path=None)
+    start = time.perf_counter()
+    ivf.build_index(vectors, metadata)
+    build_seconds = time.perf_counter() - start
+    
+    results = [{
+        'nprobe': None,
+        f'recall@{args.k}': 1.0,
+        'p50_ms': float(np.percentile(exact_latencies, 50)),
+        'p95_ms': float(np.percentile(exact_latencies, 95)),
+    }]
+    for nprobe in args.nprobe:
+        ivf.nprobe = nprobe
+        found, latencies = _run_queries(ivf, queries, args.k)
+        results.append({
+            'nprobe': nprobe,
+            f'recall@{args.k}': recall_at_k(exact, found, args.k),
+            'p50_ms': float(np.percentile(latencies, 50)),
+            'p95_ms': float(np.percentile(latencies, 95)),
+        })
+    
+    print(f"\nN={len(vectors)}，nlist={len(ivf.lists)}，建立 {build_seconds:.1f} 秒")
+    print(f"{'nprobe':>8}{'recall@' + str(args.k):>12}{'p50(ms)':>12}{'p95(ms)':>12}")
+    for row in results:
+        label = "exact" if row['nprobe'] is None else str(row['nprobe'])
+        print(f"{label:>8}{row[f'recall@{args.k}']:>12.4f}{row['p50_ms']:>12.3f}{row['p95_ms']:>12.3f}")
+    
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                'n': len(vectors),
+                'dim': int(vectors.shape[1]),
+                'nlist': len(ivf.lists),
+                'build_seconds': build_seconds,
+                'results': results,
+            }, f, indent=2)
+
+
+def _run_queries(backend, queries: np.ndarray, k: int):
+    """
+    逐筆執行查詢並記錄延遲
+    
+    Args:
+        backend: 搜尋後端
+        queries: 查詢矩陣
+        k: 每個查詢回傳結果數量
+        
+    Returns:
+        (搜尋結果列表, 延遲毫秒陣列)
+    """
+    found, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        found.append(backend.search_by_vector(query, limit=k))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return found, np.array(latencies)
+
+
+if __name__ == "__main__":
+    main()
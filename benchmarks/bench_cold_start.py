@@ -0,0 +1,108 @@
+"""
+冷啟動基準測試 - 比較完整設定與服務模式從程序啟動到第一次推薦的時間
+
+每個情境在新的子程序中執行，分別量測匯入、設定、第一次推薦所需時間，
+並記錄是否載入了 sentence-transformers / torch。
+
+執行方式 (於專案根目錄):
+    python -m benchmarks.bench_cold_start
+    python -m benchmarks.bench_cold_start --n 20000 --backend ivf --json cold_start.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks.synthetic_data import write_synthetic_workspace
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from anime_recommender import AnimeRecommender
+imported = time.perf_counter()
+recommender = AnimeRecommender(search_backend=sys.argv[1])
+recommender.setup_system(serving_only=sys.argv[2] == "serving")
+ready = time.perf_counter()
+recommender.recommend_by_mal_id(int(recommender.data.MAL_ID.iloc[0]), limit=10)
+done = time.perf_counter()
+print("RESULT " + json.dumps({
+    'import_seconds': imported - start,
+    'setup_seconds': ready - imported,
+    'first_recommendation_seconds': done - ready,
+    'time_to_first_recommendation': done - start,
+    'model_imported': 'sentence_transformers' in sys.modules or 'torch' in sys.modules,
+}))
+"""
+
+SCENARIOS = [
+    ("full (first run)", "full"),
+    ("full (warm restart)", "full"),
+    ("serving", "serving"),
+]
+
+
+def run_scenario(workspace: str, backend: str, mode: str) -> dict:
+    """
+    在新的子程序中啟動推薦系統並取得第一次推薦
+    
+    Args:
+        workspace: 含合成資料的工作目錄
+        backend: 搜尋後端名稱
+        mode: "full" 或 "serving"
+    
+    Returns:
+        時間量測結果 (含子程序的整體執行時間)
+    """
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-c", CHILD_SCRIPT, backend, mode],
+        cwd=workspace, env=env, capture_output=True, text=True
+    )
+    wall_seconds = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(f"子程序執行失敗:\n{completed.stderr}")
+    
+    line = next(line for line in completed.stdout.splitlines() if line.startswith("RESULT "))
+    result = json.loads(line[len("RESULT "):])
+    result['process_seconds'] = wall_seconds
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="冷啟動 (time-to-first-recommendation) 基準測試")
+    parser.add_argument("--n", type=int, default=12000, help="合成資料筆數")
+    parser.add_argument("--dim", type=int, default=768, help="合成資料維度")
+    parser.add_argument("--backend", default="local", choices=["local", "ivf", "qdrant"],
+                        help="搜尋後端 (qdrant 需要可連線的 Qdrant 服務)")
+    parser.add_argument("--json", help="將結果寫入 JSON 檔")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as workspace:
+        print(f"產生合成資料: {args.n} 筆, {args.dim} 維")
+        write_synthetic_workspace(workspace, args.n, args.dim)
+        
+        results = []
+        for name, mode in SCENARIOS:
+            result = run_scenario(workspace, args.backend, mode)
+            result['scenario'] = name
+            results.append(result)
+    
+    print(f"\n{'情境':<22}{'匯入(秒)':>10}{'設定(秒)':>10}{'首次推薦(秒)':>14}{'程序總計(秒)':>14}{'載入模型':>10}")
+    for row in results:
+        print(f"{row['scenario']:<22}{row['import_seconds']:>10.2f}{row['setup_seconds']:>10.2f}"
+              f"{row['first_recommendation_seconds']:>14.3f}{row['process_seconds']:>14.2f}"
+              f"{'是' if row['model_imported'] else '否':>10}")
+    
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({'n': args.n, 'dim': args.dim, 'backend': args.backend, 'results': results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
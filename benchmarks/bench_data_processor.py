@@ -0,0 +1,144 @@
+"""
+資料處理基準測試 - 比較原本逐列 apply / 正規表示式的處理方式與向量化、欄位型別化後的 AnimeDataProcessor
+
+每個情境在新的子程序中執行，量測處理時間、峰值記憶體 (相對於匯入後的常駐記憶體) 與結果 DataFrame 大小，
+並確認各情境篩選出的 MAL_ID 完全相同。
+
+執行方式 (於專案根目錄):
+    python -m benchmarks.bench_data_processor
+    python -m benchmarks.bench_data_processor --n 500000 --chunk-size 50000 --json data_processor.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from benchmarks.synthetic_data import synthetic_catalog
+from config import MIN_SYNOPSIS_LENGTH, EXCLUDE_PATTERN
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD_SCRIPT = """
+import hashlib, json, resource, sys, time
+import pandas as pd
+from data_processor import AnimeDataProcessor
+
+path, scenario, chunk_size, min_length, exclude_pattern = sys.argv[1:6]
+
+def peak_rss_kb():
+    # ru_maxrss 在 Linux 上會沿用 exec 前父程序的峰值，優先使用本程序的 VmHWM
+    try:
+        with open("/proc/self/status") as f:
+            return int(next(line for line in f if line.startswith("VmHWM:")).split()[1])
+    except (OSError, StopIteration):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def legacy(path):
+    # 原本的處理流程: 讀取所有欄位、逐列 apply 計算長度、以正規表示式比對排除模式
+    data = pd.read_csv(path)
+    data['sypnopsis_length'] = data['sypnopsis'].apply(lambda x: len(str(x)))
+    length_filter = data.sypnopsis_length > int(min_length)
+    pattern_filter = ~data.sypnopsis.str.contains(exclude_pattern, na=False)
+    return data[length_filter & pattern_filter]
+
+baseline_kb = peak_rss_kb()
+start = time.perf_counter()
+if scenario == "legacy":
+    data = legacy(path)
+elif scenario == "chunked":
+    data = AnimeDataProcessor(path, csv_engine="c").get_processed_data(chunk_size=int(chunk_size))
+else:
+    data = AnimeDataProcessor(path, csv_engine=scenario).get_processed_data(chunk_size=None)
+seconds = time.perf_counter() - start
+peak_kb = peak_rss_kb()
+
+print("RESULT " + json.dumps({
+    'seconds': seconds,
+    'peak_mb': (peak_kb - baseline_kb) / 1024,
+    'frame_mb': data.memory_usage(deep=True).sum() / 2 ** 20,
+    'rows': len(data),
+    'ids_digest': hashlib.sha1(data.MAL_ID.to_numpy().tobytes()).hexdigest(),
+}))
+"""
+
+
+def pyarrow_available() -> bool:
+    """
+    確認是否安裝 pyarrow
+    
+    Returns:
+        是否可使用 pyarrow 引擎
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def run_scenario(csv_path: str, scenario: str, chunk_size: int) -> dict:
+    """
+    在新的子程序中執行一種處理方式
+    
+    Args:
+        csv_path: 合成 CSV 路徑
+        scenario: "legacy"、"c"、"pyarrow" 或 "chunked"
+        chunk_size: 分塊列數 (只用於 "chunked")
+    
+    Returns:
+        量測結果
+    """
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    completed = subprocess.run(
+        [sys.executable, "-c", CHILD_SCRIPT, csv_path, scenario, str(chunk_size),
+         str(MIN_SYNOPSIS_LENGTH), EXCLUDE_PATTERN],
+        env=env, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"子程序執行失敗:\n{completed.stderr}")
+    
+    line = next(line for line in completed.stdout.splitlines() if line.startswith("RESULT "))
+    return json.loads(line[len("RESULT "):])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="資料處理 (載入、計算長度、篩選) 基準測試")
+    parser.add_argument("--n", type=int, default=200000, help="合成資料筆數")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="分塊情境的分塊列數")
+    parser.add_argument("--json", help="將結果寫入 JSON 檔")
+    args = parser.parse_args()
+    
+    scenarios = [("legacy", "原本 (apply + regex)"), ("c", "向量化 (C 引擎)")]
+    if pyarrow_available():
+        scenarios.append(("pyarrow", "向量化 (pyarrow 引擎)"))
+    scenarios.append(("chunked", f"向量化 (分塊 {args.chunk_size})"))
+    
+    with tempfile.TemporaryDirectory() as workspace:
+        csv_path = os.path.join(workspace, "anime_with_synopsis.csv")
+        print(f"產生合成 CSV: {args.n} 筆")
+        synthetic_catalog(args.n).to_csv(csv_path, index=False)
+        size_mb = os.path.getsize(csv_path) / 2 ** 20
+        
+        results = []
+        for scenario, name in scenarios:
+            result = run_scenario(csv_path, scenario, args.chunk_size)
+            result['scenario'] = name
+            results.append(result)
+    
+    if len({row['ids_digest'] for row in results}) != 1:
+        raise RuntimeError("各情境篩選出的資料不一致")
+    
+    print(f"\nCSV 大小: {size_mb:.1f} MB，篩選後 {results[0]['rows']} 筆")
+    print(f"{'情境':<26}{'時間(秒)':>10}{'峰值記憶體(MB)':>16}{'結果大小(MB)':>14}")
+    for row in results:
+        print(f"{row['scenario']:<26}{row['seconds']:>10.2f}{row['peak_mb']:>16.1f}{row['frame_mb']:>14.1f}")
+    
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({'n': args.n, 'csv_mb': size_mb, 'results': results}, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
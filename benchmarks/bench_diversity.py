@@ -0,0 +1,107 @@
+"""
+多樣性重新排序基準測試 - 量測 MMR 重新排序的延遲，以及同系列作品佔推薦結果的比例與結果間的相似度
+
+合成資料在群聚向量之外加入多個「系列」：每個系列有數部向量幾乎相同的作品 (續作、劇場版)，
+查詢為系列中的作品，候選為精確搜尋的前 --candidates 名。
+
+執行方式 (於專案根目錄):
+    python -m benchmarks.bench_diversity
+    python -m benchmarks.bench_diversity --candidates 200 --dim 768 --lambdas 1.0 0.5 --json diversity.json
+"""
+
+import argparse
+import json
+import time
+import numpy as np
+from diversity import mmr_select
+from local_search import LocalSearchBackend
+from benchmarks.bench_quantization import clustered_vectors
+
+
+def franchise_vectors(n: int, dim: int, franchises: int, size: int, seed: int = 0):
+    """
+    產生含系列作品的向量：前 franchises * size 個向量每 size 個為一個系列
+    
+    Args:
+        n: 向量總數
+        dim: 向量維度
+        franchises: 系列數量
+        size: 每個系列的作品數量
+        seed: 隨機種子
+    
+    Returns:
+        (已正規化的向量矩陣, 每個向量所屬的系列編號 (-1 表示不屬於任何系列))
+    """
+    rng = np.random.default_rng(seed)
+    vectors = clustered_vectors(n, dim, seed=seed)
+    labels = np.full(n, -1, dtype=np.int64)
+    for franchise in range(franchises):
+        rows = np.arange(franchise * size, (franchise + 1) * size)
+        vectors[rows] = vectors[rows[0]] + (0.3 / np.sqrt(dim)) * rng.standard_normal((size, dim)).astype(np.float32)
+        labels[rows] = franchise
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True), labels
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MMR 多樣性重新排序基準測試")
+    parser.add_argument("--n", type=int, default=20000, help="合成資料筆數")
+    parser.add_argument("--dim", type=int, default=768, help="向量維度")
+    parser.add_argument("--franchises", type=int, default=100, help="系列數量 (同時也是查詢數量)")
+    parser.add_argument("--size", type=int, default=15, help="每個系列的作品數量")
+    parser.add_argument("--candidates", type=int, default=200, help="重新排序的候選數量")
+    parser.add_argument("--k", type=int, default=10, help="回傳數量")
+    parser.add_argument("--lambdas", type=float, nargs="+", default=[1.0, 0.7, 0.5, 0.3], help="要比較的 MMR lambda")
+    parser.add_argument("--json", help="將結果寫入 JSON 檔")
+    args = parser.parse_args()
+    
+    vectors, labels = franchise_vectors(args.n, args.dim, args.franchises, args.size)
+    backend = LocalSearchBackend(quantization=None)
+    backend.build_index(vectors, [{'MAL_ID': i, 'Name': f"Anime {i}"} for i in range(args.n)])
+    
+    # 每個系列以第一部作品查詢，並排除查詢本身
+    queries = [franchise * args.size for franchise in range(args.franchises)]
+    candidate_sets = []
+    for mal_id in queries:
+        results = [r for r in backend.search_similar(mal_id, limit=args.candidates + 1) if r['MAL_ID'] != mal_id]
+        candidate_sets.append((
+            mal_id,
+            np.array([r['MAL_ID'] for r in results[:args.candidates]]),
+            np.array([r['Score'] for r in results[:args.candidates]], dtype=np.float32),
+        ))
+    
+    results = {}
+    for lambda_ in args.lambdas:
+        latencies, franchise_share, intra_similarity, relevance = [], [], [], []
+        for mal_id, ids, scores in candidate_sets:
+            candidate_vectors = backend.get_vectors(ids.tolist())
+            start = time.perf_counter()
+            selected = mmr_select(scores, candidate_vectors, args.k, lambda_)
+            latencies.append((time.perf_counter() - start) * 1000)
+            
+            chosen = candidate_vectors[selected]
+            pairwise = chosen @ chosen.T
+            franchise_share.append(float(np.mean(labels[ids[selected]] == labels[mal_id])))
+            intra_similarity.append(float(pairwise[np.triu_indices(len(selected), 1)].mean()))
+            relevance.append(float(scores[selected].mean()))
+        results[str(lambda_)] = {
+            'p50_ms': float(np.percentile(latencies, 50)),
+            'p99_ms': float(np.percentile(latencies, 99)),
+            'franchise_share': float(np.mean(franchise_share)),
+            'intra_list_similarity': float(np.mean(intra_similarity)),
+            'mean_relevance': float(np.mean(relevance)),
+        }
+    
+    print(f"\n候選={args.candidates}，維度={args.dim}，k={args.k}，"
+          f"查詢={len(queries)} (每個系列 {args.size} 部作品)")
+    print(f"{'lambda':<8}{'p50(ms)':>10}{'p99(ms)':>10}{'同系列比例':>12}{'結果間相似度':>14}{'平均相關性':>12}")
+    for lambda_, row in results.items():
+        print(f"{lambda_:<8}{row['p50_ms']:>10.3f}{row['p99_ms']:>10.3f}{row['franchise_share']:>12.2f}"
+              f"{row['intra_list_similarity']:>14.3f}{row['mean_relevance']:>12.3f}")
+    
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({'config': vars(args), 'results': results}, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+推論後端基準測試 - 比較 torch (sentence-transformers)、ONNX Runtime fp32 與 int8 的載入時間、記憶體、
+批次編碼吞吐量、單筆查詢延遲，以及與 torch 向量的餘弦相似度
+
+每個後端在新的子程序中執行，記憶體為相對於匯入前的常駐記憶體增量。
+ONNX 模型不存在時先匯出一次 (不計入量測)。
+
+執行方式 (於專案根目錄):
+    python -m benchmarks.bench_embedding_backends
+    python -m benchmarks.bench_embedding_backends --n 2000 --backends torch onnx-int8 --json backends.json
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import numpy as np
+from onnx_encoder import ONNXSentenceEncoder, parity_report
+from config import EMBEDDING_MODEL, ONNX_MODEL_DIR, ONNX_PARITY_THRESHOLD
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD_SCRIPT = """
+import json, sys, time
+import numpy as np
+from benchmarks.synthetic_data import synthetic_catalog
+
+backend, model_name, onnx_dir, n, queries, output = sys.argv[1:7]
+
+def status_mb(field):
+    try:
+        with open("/proc/self/status") as f:
+            return int(next(line for line in f if line.startswith(field + ":")).split()[1]) / 1024
+    except (OSError, StopIteration):
+        return float("nan")
+
+texts = synthetic_catalog(int(n)).sypnopsis.tolist()
+baseline_mb = status_mb("VmRSS")
+
+start = time.perf_counter()
+from embedding_generator import EmbeddingGenerator
+generator = EmbeddingGenerator(model_name=model_name, backend=backend, onnx_model_dir=onnx_dir)
+generator.load_model()
+load_seconds = time.perf_counter() - start
+model_mb = status_mb("VmRSS") - baseline_mb
+
+start = time.perf_counter()
+embeddings = generator.generate_embeddings(texts)
+encode_seconds = time.perf_counter() - start
+np.save(output, embeddings)
+
+latencies = []
+for text in texts[:int(queries)]:
+    query = " ".join(text.split()[:8])
+    start = time.perf_counter()
+    generator.encode_queries([query])
+    latencies.append((time.perf_counter() - start) * 1000)
+
+print("RESULT " + json.dumps({
+    'load_seconds': load_seconds,
+    'model_rss_mb': model_mb,
+    'peak_mb': status_mb("VmHWM") - baseline_mb,
+    'texts_per_second': len(texts) / encode_seconds,
+    'query_p50_ms': float(np.percentile(latencies, 50)),
+    'query_p99_ms': float(np.percentile(latencies, 99)),
+}))
+"""
+
+EXPORT_SCRIPT = """
+import sys
+from onnx_encoder import export_onnx
+export_onnx(sys.argv[1], sys.argv[2], quantize=True)
+"""
+
+
+def available(backend: str) -> bool:
+    """
+    確認後端所需的套件是否已安裝
+    
+    Args:
+        backend: "torch"、"onnx" 或 "onnx-int8"
+    
+    Returns:
+        是否可執行
+    """
+    modules = ["sentence_transformers"] if backend == "torch" else ["onnxruntime", "tokenizers"]
+    return all(importlib.util.find_spec(module) is not None for module in modules)
+
+
+def run_child(script: str, *args: str) -> str:
+    """
+    在新的子程序中執行腳本
+    
+    Args:
+        script: Python 程式碼
+        *args: 命令列參數
+    
+    Returns:
+        標準輸出
+    """
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    completed = subprocess.run([sys.executable, "-c", script, *args],
+                               env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"子程序執行失敗:\n{completed.stderr}")
+    return completed.stdout
+
+
+def main():
+    parser = argparse.ArgumentParser(description="嵌入模型推論後端基準測試")
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"],
+                        choices=["torch", "onnx", "onnx-int8"], help="要量測的推論後端")
+    parser.add_argument("--model", default=EMBEDDING_MODEL, help="sentence-transformers 模型名稱或路徑")
+    parser.add_argument("--onnx-dir", default=ONNX_MODEL_DIR, help="ONNX 模型目錄")
+    parser.add_argument("--n", type=int, default=1000, help="批次編碼的合成簡介數量")
+    parser.add_argument("--queries", type=int, default=100, help="單筆查詢數量")
+    parser.add_argument("--json", help="將結果寫入 JSON 檔")
+    args = parser.parse_args()
+    
+    backends = [backend for backend in args.backends if available(backend)]
+    skipped = sorted(set(args.backends) - set(backends))
+    if skipped:
+        print(f"略過未安裝所需套件的後端: {skipped}")
+    
+    onnx_backends = [backend for backend in backends if backend != "torch"]
+    if onnx_backends and not all(ONNXSentenceEncoder.exists(args.onnx_dir, backend == "onnx-int8")
+                                 for backend in onnx_backends):
+        print(f"匯出 ONNX 模型到 {args.onnx_dir}")
+        run_child(EXPORT_SCRIPT, args.model, args.onnx_dir)
+    
+    results = {}
+    with tempfile.TemporaryDirectory() as workspace:
+        for backend in backends:
+            print(f"量測後端: {backend}")
+            output = os.path.join(workspace, f"{backend}.npy")
+            stdout = run_child(CHILD_SCRIPT, backend, args.model, args.onnx_dir,
+                               str(args.n), str(args.queries), output)
+            line = next(line for line in stdout.splitlines() if line.startswith("RESULT "))
+            results[backend] = json.loads(line[len("RESULT "):])
+            results[backend]['embeddings'] = np.load(output)
+    
+    # 以 torch 向量為基準檢查一致性
+    reference = results.get("torch", {}).get('embeddings')
+    for backend, row in results.items():
+        embeddings = row.pop('embeddings')
+        if reference is not None and backend != "torch":
+            row['parity'] = parity_report(reference, embeddings, ONNX_PARITY_THRESHOLD)
+    
+    print(f"\n模型: {args.model}，批次編碼 {args.n} 筆，單筆查詢 {args.queries} 次")
+    print(f"{'後端':<12}{'載入(秒)':>10}{'模型記憶體(MB)':>16}{'峰值(MB)':>10}{'筆/秒':>10}"
+          f"{'查詢p50(ms)':>13}{'查詢p99(ms)':>13}{'最低餘弦':>10}")
+    for backend, row in results.items():
+        parity = f"{row['parity']['min_cosine']:.5f}" if 'parity' in row else "-"
+        print(f"{backend:<12}{row['load_seconds']:>10.2f}{row['model_rss_mb']:>16.1f}{row['peak_mb']:>10.1f}"
+              f"{row['texts_per_second']:>10.1f}{row['query_p50_ms']:>13.2f}{row['query_p99_ms']:>13.2f}{parity:>10}")
+    
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({'config': vars(args), 'skipped': skipped, 'results': results},
+                      f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+關鍵字索引基準測試 - 量測 BM25 索引的建立時間、大小與查詢延遲百分位數
+
+合成簡介只由少量常見詞組成，每個詞的 posting 都很長，延遲比真實資料悲觀。
+
+執行方式 (於專案根目錄):
+    python -m benchmarks.bench_keyword
+    python -m benchmarks.bench_keyword --n 100000 --json keyword.json
+"""
+
+import argparse
+import json
+import time
+import numpy as np
+from keyword_index import KeywordIndex
+from search_filter import SearchFilter, PayloadColumns
+from data_processor import AnimeDataProcessor
+from benchmarks.synthetic_data import synthetic_catalog, WORDS
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BM25 關鍵字索引延遲基準測試")
+    parser.add_argument("--n", type=int, default=20000, help="合成資料筆數")
+    parser.add_argument("--queries", type=int, default=500, help="查詢數量")
+    parser.add_argument("--limit", type=int, default=50, help="每個查詢的結果數量")
+    parser.add_argument("--json", help="將結果寫入 JSON 檔")
+    args = parser.parse_args()
+    
+    catalog = synthetic_catalog(args.n)
+    index = KeywordIndex(file_path=None)
+    start = time.perf_counter()
+    index.build(catalog.MAL_ID.tolist(), catalog.Name.tolist(), catalog.sypnopsis.tolist())
+    build_seconds = time.perf_counter() - start
+    index_mb = (index.offsets.nbytes + index.rows.nbytes + index.weights.nbytes + index.ids.nbytes) / 2 ** 20
+    
+    # 一半為名稱查詢 (專有名詞)，一半為 1 到 4 個簡介詞的描述查詢
+    rng = np.random.default_rng(1)
+    queries = [f"Anime {mal_id}" for mal_id in rng.choice(catalog.MAL_ID.to_numpy(), args.queries // 2)]
+    queries += [" ".join(rng.choice(WORDS, size=rng.integers(1, 5))) for _ in range(args.queries - len(queries))]
+    mask = SearchFilter(types=["TV"]).mask(PayloadColumns(AnimeDataProcessor.build_metadata(catalog)))
+    
+    results = {}
+    for name, query_mask in (("unfiltered", None), ("filtered", mask)):
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            index.search(query, args.limit, mask=query_mask)
+            latencies.append((time.perf_counter() - start) * 1000)
+        results[name] = {
+            'p50_ms': float(np.percentile(latencies, 50)),
+            'p95_ms': float(np.percentile(latencies, 95)),
+            'p99_ms': float(np.percentile(latencies, 99)),
+        }
+    
+    print(f"\nN={args.n}，{index.header['terms']} 個詞，{index.header['postings']} 個 posting，"
+          f"索引 {index_mb:.1f} MB，建立 {build_seconds:.2f} 秒")
+    print(f"{'查詢':<12}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}")
+    for name, row in results.items():
+        print(f"{name:<12}{row['p50_ms']:>10.3f}{row['p95_ms']:>10.3f}{row['p99_ms']:>10.3f}")
+    
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                'n': args.n,
+                'terms': index.header['terms'],
+                'postings': index.header['postings'],
+                'index_mb': index_mb,
+                'build_seconds': build_seconds,
+                'results': results,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+量化基準測試 - 比較各量化設定相對於精確餘弦搜尋的 recall@10、延遲與記憶體
+
+每個設定在新的子程序中以記憶體映射載入同一份向量儲存並建立索引，
+回報程序的總常駐記憶體 (RSS) 與其中的匿名記憶體 (不含可由 page cache 回收的映射頁面)。
+
+執行方式 (於專案根目錄):
+    python -m benchmarks.bench_quantization
+    python -m benchmarks.bench_quantization --embeddings data/anime_description_embeddings.npy
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import numpy as np
+from embedding_store import EmbeddingStore
+from config import EMBEDDING_MODEL
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD_SCRIPT = """
+import json, sys, time
+import numpy as np
+
+def status_mb(field):
+    try:
+        with open("/proc/self/status") as f:
+            return int(next(line for line in f if line.startswith(field + ":")).split()[1]) / 1024
+    except (OSError, StopIteration):
+        return float("nan")
+
+store_path, quantization, rescore, query_path, k, output = sys.argv[1:7]
+from embedding_store import EmbeddingStore
+from local_search import LocalSearchBackend
+
+vectors, ids = EmbeddingStore(store_path).load(mmap_mode="r")
+metadata = [{'MAL_ID': int(mal_id), 'Name': ""} for mal_id in ids]
+queries = np.load(query_path)
+baseline_mb = status_mb("VmRSS")
+
+backend = LocalSearchBackend(quantization=None if quantization == "none" else quantization,
+                             rescore=rescore == "1")
+start = time.perf_counter()
+backend.build_index(vectors, metadata)
+build_seconds = time.perf_counter() - start
+
+start = time.perf_counter()
+found = [backend.search_by_vector(query, limit=int(k)) for query in queries]
+latency_ms = (time.perf_counter() - start) * 1000 / len(queries)
+np.save(output, np.array([[r['MAL_ID'] for r in row] for row in found], dtype=np.int64))
+
+index_bytes = backend.quantizer.nbytes if backend.quantizer is not None else backend.vectors.nbytes
+print("RESULT " + json.dumps({
+    'latency_ms': latency_ms,
+    'index_mb': index_bytes / 1e6,
+    'build_seconds': build_seconds,
+    'rss_mb': status_mb("VmRSS"),
+    'anon_mb': status_mb("RssAnon"),
+    'index_rss_mb': status_mb("VmRSS") - baseline_mb,
+}))
+"""
+
+SETTINGS = [
+    ("float32", None, False),
+    ("float16", "float16", False),
+    ("float16+rescore", "float16", True),
+    ("int8", "int8", False),
+    ("int8+rescore", "int8", True),
+    ("pq", "pq", False),
+    ("pq+rescore", "pq", True),
+]
+
+
+def clustered_vectors(n: int, dim: int, clusters: int = 200, seed: int = 0) -> np.ndarray:
+    """
+    產生具群聚結構的單位向量 (比均勻隨機向量更接近真實文本向量的分布)
+    
+    Args:
+        n: 向量數量
+        dim: 向量維度
+        clusters: 群集數量
+        seed: 隨機種子
+    
+    Returns:
+        已正規化的 float32 向量矩陣
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def recall_at_k(exact, approximate, k: int) -> float:
+    """
+    計算 recall@k
+    
+    Args:
+        exact: 精確搜尋結果 (每個查詢一個結果列表)
+        approximate: 待評估的搜尋結果
+        k: 取前 k 個
+    
+    Returns:
+        平均 recall
+    """
+    hits = 0
+    for truth, found in zip(exact, approximate):
+        truth_ids = {r['MAL_ID'] for r in truth[:k]}
+        hits += len(truth_ids & {r['MAL_ID'] for r in found[:k]})
+    return hits / (k * len(exact))
+
+
+def run_setting(store_path: str, quantization, rescore: bool, query_path: str,
+                k: int, output: str) -> dict:
+    """
+    在新的子程序中建立索引並執行查詢
+    
+    Args:
+        store_path: 向量儲存路徑
+        quantization: 量化方式 (None 表示不量化)
+        rescore: 是否重新計分
+        query_path: 查詢向量 .npy 路徑
+        k: 每個查詢的結果數量
+        output: 搜尋結果 MAL_ID 的輸出路徑
+    
+    Returns:
+        子程序回報的量測結果
+    """
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    completed = subprocess.run(
+        [sys.executable, "-c", CHILD_SCRIPT, store_path, quantization or "none",
+         "1" if rescore else "0", query_path, str(k), output],
+        env=env, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"子程序執行失敗:\n{completed.stderr}")
+    line = next(line for line in completed.stdout.splitlines() if line.startswith("RESULT "))
+    return json.loads(line[len("RESULT "):])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="量化 recall@10 基準測試")
+    parser.add_argument("--embeddings", help="向量儲存路徑，未指定時使用合成資料")
+    parser.add_argument("--n", type=int, default=12000, help="合成資料筆數")
+    parser.add_argument("--dim", type=int, default=768, help="合成資料維度")
+    parser.add_argument("--queries", type=int, default=200, help="查詢數量")
+    parser.add_argument("--k", type=int, default=10, help="recall@k 的 k")
+    parser.add_argument("--json", help="將結果寫入 JSON 檔")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as workspace:
+        store_path = args.embeddings
+        if store_path is None:
+            store_path = os.path.join(workspace, "vectors.npy")
+            vectors = clustered_vectors(args.n, args.dim)
+            EmbeddingStore(store_path).save(vectors, np.arange(len(vectors)), EMBEDDING_MODEL)
+            del vectors
+        vectors, _ = EmbeddingStore(store_path).load(mmap_mode="r")
+        count, dimension = vectors.shape
+        
+        rng = np.random.default_rng(1)
+        query_rows = np.sort(rng.choice(count, min(args.queries, count), replace=False))
+        query_path = os.path.join(workspace, "queries.npy")
+        np.save(query_path, np.asarray(vectors[query_rows], dtype=np.float32))
+        del vectors
+        
+        results = []
+        exact = None
+        for name, quantization, rescore in SETTINGS:
+            print(f"量測設定: {name}")
+            output = os.path.join(workspace, f"{name}.npy")
+            row = run_setting(store_path, quantization, rescore, query_path, args.k, output)
+            found = [[{'MAL_ID': mal_id} for mal_id in row] for row in np.load(output).tolist()]
+            if exact is None:
+                exact = found
+            results.append({'setting': name, f'recall@{args.k}': recall_at_k(exact, found, args.k), **row})
+    
+    print(f"\nN={count}，維度={dimension}，查詢={len(query_rows)}")
+    print(f"{'設定':<18}{'recall@' + str(args.k):>12}{'延遲(ms)':>12}{'索引(MB)':>12}"
+          f"{'RSS(MB)':>12}{'匿名(MB)':>12}{'建立(秒)':>12}")
+    for row in results:
+        print(f"{row['setting']:<18}{row[f'recall@{args.k}']:>12.4f}{row['latency_ms']:>12.3f}"
+              f"{row['index_mb']:>12.1f}{row['rss_mb']:>12.1f}{row['anon_mb']:>12.1f}{row['build_seconds']:>12.2f}")
+    
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({'n': count, 'dim': dimension, 'results': results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""
+端到端推薦基準測試 - 以合成目錄量測寫入吞吐量、單筆與批次查詢延遲百分位數、記憶體用量與 recall
+
+完全離線執行：local / ivf 為程序內 NumPy 後端，qdrant 使用 QdrantClient(":memory:")，不需要 Qdrant 服務。
+合成目錄包含假簡介與篩選欄位，向量為具群聚結構的單位向量；recall 以 NumPy 精確搜尋為基準。
+加上 --json 輸出機器可讀的結果，可與先前的結果比較以追蹤效能退化。
+
+執行方式 (於專案根目錄):
+    python -m benchmarks.bench_recommend
+    python -m benchmarks.bench_recommend --backend local ivf qdrant --n 20000 --dim 384 --json recommend.json
+    python -m benchmarks.bench_recommend --encode 500     # 另外量測 generate_embeddings (需要嵌入模型)
+"""
+
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+from importlib import metadata as package_metadata
+import numpy as np
+from data_processor import AnimeDataProcessor
+from local_search import LocalSearchBackend
+from search_backend import create_search_backend
+from search_filter import SearchFilter
+from config import BATCH_SIZE
+from benchmarks.bench_quantization import clustered_vectors, recall_at_k
+from benchmarks.synthetic_data import synthetic_catalog
+
+# 篩選查詢使用的條件 (合成目錄中約有一成項目符合)
+BENCH_FILTER = SearchFilter(any_genres=["Action", "Sci-Fi"], min_score=7.5)
+
+
+def memory_mb(field: str = "VmRSS") -> float:
+    """
+    讀取目前程序的記憶體用量
+    
+    Args:
+        field: /proc/self/status 中的欄位 ("VmRSS" 為常駐記憶體，"VmHWM" 為峰值)
+    
+    Returns:
+        記憶體用量 (MB)，無法讀取時回傳 NaN
+    """
+    try:
+        with open("/proc/self/status") as f:
+            line = next(line for line in f if line.startswith(field + ":"))
+    except (OSError, StopIteration):
+        return float("nan")
+    return int(line.split()[1]) / 1024
+
+
+def latency_summary(latencies_ms) -> dict:
+    """
+    計算延遲百分位數
+    
+    Args:
+        latencies_ms: 延遲毫秒列表
+    
+    Returns:
+        p50 / p95 / p99 / 平均延遲 (毫秒)
+    """
+    latencies_ms = np.asarray(latencies_ms)
+    return {
+        'p50_ms': float(np.percentile(latencies_ms, 50)),
+        'p95_ms': float(np.percentile(latencies_ms, 95)),
+        'p99_ms': float(np.percentile(latencies_ms, 99)),
+        'mean_ms': float(latencies_ms.mean()),
+    }
+
+
+def timed(func, *args, **kwargs):
+    """
+    執行函式並記錄耗時
+    
+    Returns:
+        (回傳值, 耗時毫秒)
+    """
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def create_backend(name: str):
+    """
+    建立離線可用的搜尋後端
+    
+    Args:
+        name: "local"、"ivf" 或 "qdrant"
+    
+    Returns:
+        搜尋後端
+    """
+    if name == "qdrant":
+        from qdrant_client import QdrantClient
+        from qdrant_manager import QdrantManager
+        backend = QdrantManager()
+        backend.client = QdrantClient(":memory:")
+        return backend
+    if name == "ivf":
+        from ivf_index import IVFSearchBackend
+        # 不寫入索引檔，每次都重新訓練
+        return IVFSearchBackend(index_path=None)
+    return create_search_backend(name)
+
+
+def ingest(name: str, backend, vectors: np.ndarray, metadata: list) -> None:
+    """
+    將向量寫入後端
+    
+    Args:
+        name: 後端名稱
+        backend: 搜尋後端
+        vectors: 向量矩陣
+        metadata: 元資料列表
+    """
+    if name == "qdrant":
+        backend.create_collection(vector_size=vectors.shape[1])
+        # 記憶體模式的 Qdrant 用戶端不是執行緒安全的，只能單執行緒上傳
+        backend.batch_upsert(vectors, metadata, batch_size=BATCH_SIZE, parallel=1)
+    else:
+        backend.build_index(vectors, metadata)
+
+
+def bench_backend(name: str, vectors: np.ndarray, metadata: list,
+                  query_ids: list, exact: dict, args) -> dict:
+    """
+    量測單一後端的寫入與查詢效能
+    
+    Args:
+        name: 後端名稱
+        vectors: 向量矩陣
+        metadata: 元資料列表
+        query_ids: 查詢的 MAL_ID 列表
+        exact: 精確搜尋結果 ('single' 與 'filtered' 兩組，每個查詢一個結果列表)
+        args: 命令列參數
+    
+    Returns:
+        量測結果
+    """
+    print(f"\n=== 後端: {name} ===")
+    gc.collect()
+    rss_before = memory_mb()
+    backend = create_backend(name)
+    _, ingest_ms = timed(ingest, name, backend, vectors, metadata)
+    gc.collect()
+    index_mb = memory_mb() - rss_before
+    
+    # 預熱 (第一次查詢可能包含延遲初始化)
+    backend.search_similar(query_ids[0], limit=args.k)
+    
+    single, single_latencies = [], []
+    for mal_id in query_ids:
+        found, elapsed = timed(backend.search_similar, mal_id, limit=args.k)
+        single.append(found)
+        single_latencies.append(elapsed)
+    
+    filtered, filtered_latencies = [], []
+    for mal_id in query_ids:
+        found, elapsed = timed(backend.search_similar, mal_id, limit=args.k, search_filter=BENCH_FILTER)
+        filtered.append(found)
+        filtered_latencies.append(elapsed)
+    
+    batched, batch_latencies = {}, []
+    for start in range(0, len(query_ids), args.batch_size):
+        found, elapsed = timed(
+            backend.recommend_by_mal_ids, query_ids[start:start + args.batch_size], limit=args.k
+        )
+        batched.update(found)
+        batch_latencies.append(elapsed)
+    
+    result = {
+        'backend': name,
+        'ingest_seconds': ingest_ms / 1000,
+        'ingest_vectors_per_second': len(vectors) / (ingest_ms / 1000),
+        'index_rss_mb': index_mb,
+        'single': latency_summary(single_latencies),
+        'filtered': latency_summary(filtered_latencies),
+        'batched': dict(
+            latency_summary(batch_latencies),
+            batch_size=args.batch_size,
+            per_query_ms=float(np.sum(batch_latencies) / len(query_ids)),
+        ),
+        f'recall@{args.k}': recall_at_k(exact['single'], single, args.k),
+        f'filtered_recall@{args.k}': recall_at_k(exact['filtered'], filtered, args.k),
+        f'batched_recall@{args.k}': recall_at_k(
+            exact['single'], [batched.get(mal_id, []) for mal_id in query_ids], args.k
+        ),
+    }
+    del backend
+    return result
+
+
+def bench_encode(synopses: list, count: int) -> dict:
+    """
+    量測 generate_embeddings 的吞吐量 (需要 sentence-transformers 與模型檔)
+    
+    Args:
+        synopses: 合成簡介列表
+        count: 編碼的簡介數量
+    
+    Returns:
+        量測結果，無法載入模型時回傳略過原因
+    """
+    from embedding_generator import EmbeddingGenerator
+    
+    generator = EmbeddingGenerator()
+    try:
+        generator.load_model()
+    except Exception as e:
+        print(f"略過編碼基準測試: {e}")
+        return {'skipped': str(e)}
+    
+    texts = synopses[:count]
+    _, elapsed_ms = timed(generator.generate_embeddings, texts)
+    generator.close()
+    return {
+        'texts': len(texts),
+        'seconds': elapsed_ms / 1000,
+        'texts_per_second': len(texts) / (elapsed_ms / 1000),
+    }
+
+
+def environment() -> dict:
+    """
+    記錄執行環境，方便比較不同次的結果
+    
+    Returns:
+        Python / NumPy / qdrant-client 版本與平台資訊
+    """
+    try:
+        qdrant_version = package_metadata.version("qdrant-client")
+    except package_metadata.PackageNotFoundError:
+        qdrant_version = None
+    return {
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'qdrant_client': qdrant_version,
+        'platform': platform.platform(),
+        'processor': platform.machine(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端推薦基準測試 (合成資料，離線執行)")
+    parser.add_argument("--backend", nargs="+", default=["local", "ivf", "qdrant"],
+                        choices=["local", "ivf", "qdrant"], help="要量測的搜尋後端")
+    parser.add_argument("--n", type=int, default=20000, help="合成資料筆數")
+    parser.add_argument("--dim", type=int, default=768, help="合成資料維度")
+    parser.add_argument("--queries", type=int, default=200, help="查詢數量")
+    parser.add_argument("--k", type=int, default=10, help="每個查詢的結果數量 (recall@k 的 k)")
+    parser.add_argument("--batch-size", type=int, default=32, help="批次查詢的大小")
+    parser.add_argument("--encode", type=int, default=0, help="量測 generate_embeddings 的簡介數量 (0 表示略過)")
+    parser.add_argument("--seed", type=int, default=0, help="隨機種子")
+    parser.add_argument("--json", help="將結果寫入 JSON 檔")
+    args = parser.parse_args()
+    
+    print(f"產生合成目錄: {args.n} 筆, {args.dim} 維")
+    catalog = synthetic_catalog(args.n, args.seed)
+    metadata = AnimeDataProcessor.build_metadata(catalog)
+    vectors = clustered_vectors(args.n, args.dim, seed=args.seed)
+    
+    rng = np.random.default_rng(args.seed + 1)
+    query_ids = [int(mal_id) for mal_id in rng.choice(catalog.MAL_ID.to_numpy(), min(args.queries, args.n), replace=False)]
+    
+    exact_backend = LocalSearchBackend(quantization=None)
+    exact_backend.build_index(vectors, metadata)
+    exact = {
+        'single': [exact_backend.search_similar(mal_id, limit=args.k) for mal_id in query_ids],
+        'filtered': [exact_backend.search_similar(mal_id, limit=args.k, search_filter=BENCH_FILTER)
+                     for mal_id in query_ids],
+    }
+    del exact_backend
+    
+    results = [bench_backend(name, vectors, metadata, query_ids, exact, args) for name in args.backend]
+    encode = bench_encode(catalog.sypnopsis.tolist(), args.encode) if args.encode > 0 else None
+    
+    print(f"\nN={args.n}，維度={args.dim}，查詢={len(query_ids)}，k={args.k}")
+    print(f"{'後端':<8}{'寫入(向量/秒)':>14}{'記憶體(MB)':>12}{'單筆p50':>10}{'單筆p99':>10}"
+          f"{'篩選p50':>10}{'批次/筆':>10}{'recall':>9}{'篩選recall':>12}")
+    for row in results:
+        print(f"{row['backend']:<8}{row['ingest_vectors_per_second']:>14.0f}{row['index_rss_mb']:>12.1f}"
+              f"{row['single']['p50_ms']:>10.3f}{row['single']['p99_ms']:>10.3f}"
+              f"{row['filtered']['p50_ms']:>10.3f}{row['batched']['per_query_ms']:>10.3f}"
+              f"{row[f'recall@{args.k}']:>9.4f}{row[f'filtered_recall@{args.k}']:>12.4f}")
+    if encode and 'skipped' not in encode:
+        print(f"generate_embeddings: {encode['texts_per_second']:.1f} 筆/秒")
+    print(f"程序峰值記憶體: {memory_mb('VmHWM'):.1f} MB")
+    
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+                'config': vars(args),
+                'environment': environment(),
+                'peak_rss_mb': memory_mb("VmHWM"),
+                'results': results,
+                'encode': encode,
+            }, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
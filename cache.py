@@ -0,0 +1,240 @@
+"""
+快取模組 - 提供執行緒安全、可設定存活時間的 LRU 快取
+"""
+
+import json
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+from embedding_store import atomic_write_json
+
+
+class LRUCache:
+    """執行緒安全的 LRU 快取，可選擇設定項目存活時間 (TTL)"""
+    
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        """
+        初始化快取
+        
+        Args:
+            maxsize: 最多保留的項目數量
+            ttl: 項目存活秒數，None 表示不過期
+        """
+        if maxsize <= 0:
+            raise ValueError("maxsize 必須大於 0")
+        
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        取得快取項目並標記為最近使用
+        
+        Args:
+            key: 鍵
+            default: 未命中時的回傳值
+        
+        Returns:
+            快取值或 default
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            
+            self.misses += 1
+            return default
+    
+    def put(self, key: Hashable, value: Any) -> None:
+        """
+        寫入快取項目，超過容量時淘汰最久未使用的項目
+        
+        Args:
+            key: 鍵
+            value: 值
+        """
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def clear(self) -> None:
+        """清空快取 (保留命中統計)"""
+        with self._lock:
+            self._data.clear()
+    
+    def stats(self) -> Dict[str, int]:
+        """
+        取得快取統計
+        
+        Returns:
+            包含 hits、misses、size 的字典
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data)}
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+class RecommendationCache:
+    """
+    推薦結果快取
+    
+    以 (集合版本, MAL_ID) 為鍵保存較大的 top-k 結果，較小的 limit 直接由快取切片回傳；
+    集合版本變更時整個快取失效。另記錄各 MAL_ID 的請求次數，供啟動時預熱熱門項目。
+    """
+    
+    def __init__(self, maxsize: int):
+        """
+        初始化推薦結果快取
+        
+        Args:
+            maxsize: 最多快取的 MAL_ID 數量
+        """
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._cache = LRUCache(maxsize)
+        self._request_counts = Counter()
+        self._unsaved_requests = 0
+        self._lock = threading.Lock()
+    
+    def set_version(self, version: Optional[str]) -> None:
+        """
+        設定集合版本並清空快取
+        
+        Args:
+            version: 集合版本識別碼
+        """
+        self.version = version
+        self._cache.clear()
+    
+    def get(self, mal_id: int, limit: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        取得快取的推薦結果，並記錄一次請求
+        
+        Args:
+            mal_id: MAL_ID
+            limit: 需要的結果數量
+        
+        Returns:
+            推薦結果，未命中或快取的 top-k 不足時回傳 None
+        """
+        entry = self._cache.get((self.version, mal_id))
+        
+        results = None
+        if entry is not None:
+            fetched_k, cached = entry
+            # 快取結果少於當初請求的數量代表已取完全部候選，也可直接回傳
+            if fetched_k >= limit or len(cached) < fetched_k:
+                results = cached[:limit]
+        
+        with self._lock:
+            self._request_counts[mal_id] += 1
+            self._unsaved_requests += 1
+            if results is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return results
+    
+    def put(self, mal_id: int, fetched_k: int, results: List[Dict[str, Any]]) -> None:
+        """
+        寫入推薦結果
+        
+        Args:
+            mal_id: MAL_ID
+            fetched_k: 查詢時使用的 limit
+            results: 推薦結果
+        """
+        self._cache.put((self.version, mal_id), (fetched_k, results))
+    
+    def most_requested(self, top_n: int) -> List[int]:
+        """
+        取得請求次數最多的 MAL_ID
+        
+        Args:
+            top_n: 數量
+        
+        Returns:
+            MAL_ID 列表
+        """
+        with self._lock:
+            return [mal_id for mal_id, _ in self._request_counts.most_common(top_n)]
+    
+    def unsaved_requests(self) -> int:
+        """
+        取得上次儲存後記錄的請求次數
+        
+        Returns:
+            尚未儲存的請求次數
+        """
+        with self._lock:
+            return self._unsaved_requests
+    
+    def save_request_counts(self, file_path: str) -> None:
+        """
+        儲存各 MAL_ID 的請求次數 (先寫入暫存檔再替換，中斷時不會留下不完整的檔案)
+        
+        Args:
+            file_path: 儲存路徑
+        """
+        with self._lock:
+            counts = {str(mal_id): count for mal_id, count in self._request_counts.items()}
+            saved_requests = self._unsaved_requests
+        
+        directory = os.path.dirname(file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        atomic_write_json(file_path, counts, indent=None)
+        
+        with self._lock:
+            self._unsaved_requests -= saved_requests
+    
+    def load_request_counts(self, file_path: str) -> None:
+        """
+        載入先前儲存的請求次數並與目前的次數合併 (檔案不存在或無法解析時略過)
+        
+        Args:
+            file_path: 檔案路徑
+        """
+        if not os.path.exists(file_path):
+            return
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                counts = {int(mal_id): int(count) for mal_id, count in json.load(f).items()}
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"無法載入請求次數 ({e})，略過")
+            return
+        with self._lock:
+            self._request_counts.update(counts)
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        取得快取統計
+        
+        Returns:
+            包含 hits、misses、size、version 的字典
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._cache),
+                'version': self.version,
+            }
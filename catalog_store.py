@@ -0,0 +1,287 @@
+"""
+動漫目錄儲存模組 - 以欄位化、可記憶體映射的檔案保存處理後資料，並以 MAL_ID 索引快速取出記錄
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional, Sequence
+from embedding_store import atomic_write, atomic_write_json
+from config import CATALOG_SNAPSHOT_PATH
+
+CATALOG_FORMAT_VERSION = 1
+
+
+class CatalogStore:
+    """
+    欄位化的動漫目錄
+    
+    儲存為一個目錄，每個欄位獨立存檔，只有實際用到的欄位才會開啟：
+        header.json          標頭 (筆數、欄位清單與型別、附加資訊)
+        <i>.npy              數值欄位 (可用 mmap_mode 開啟)
+        <i>.data.npy         字串欄位的 UTF-8 位元組 (所有值串接)
+        <i>.offsets.npy      字串欄位每列在位元組中的起訖位置 (長度為筆數 + 1)
+        <i>.nulls.npy        字串欄位的缺值遮罩 (只有含缺值的欄位才有)
+    
+    載入後以 MAL_ID→列索引對照表取得列位置，批次查詢時每個欄位只做一次取值。
+    寫入時先寫到 <path>.tmp 暫存目錄，完成後才替換正式目錄，覆寫中斷時不會留下新舊混雜的欄位檔。
+    """
+    
+    def __init__(self, file_path: str = CATALOG_SNAPSHOT_PATH):
+        """
+        初始化目錄儲存
+        
+        Args:
+            file_path: 目錄路徑
+        """
+        self.file_path = file_path
+        self.header_path = os.path.join(file_path, "header.json")
+        self.header = None
+        self.ids = None
+        self.id_to_row = {}
+        self._columns: Dict[str, Dict[str, Any]] = {}
+        self._loaded: Dict[str, Any] = {}
+    
+    def save(self, data: pd.DataFrame, metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        將 DataFrame 以欄位化格式寫入 (先寫入暫存目錄再替換既有目錄)
+        
+        Args:
+            data: 含 MAL_ID 欄位的 DataFrame
+            metadata: 寫入標頭的附加資訊
+        
+        Returns:
+            寫入的標頭
+        """
+        if 'MAL_ID' not in data.columns:
+            raise ValueError("資料缺少 MAL_ID 欄位")
+        
+        staging_path = f"{self.file_path}.tmp"
+        if os.path.exists(staging_path):
+            shutil.rmtree(staging_path)
+        os.makedirs(staging_path)
+        
+        columns = []
+        for position, name in enumerate(data.columns):
+            series = data[name]
+            base = os.path.join(staging_path, f"{position:03d}")
+            if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_extension_array_dtype(series.dtype):
+                values = series.to_numpy()
+                atomic_write(f"{base}.npy", lambda f: np.save(f, values))
+                columns.append({'name': name, 'kind': "numeric", 'file': f"{position:03d}"})
+                continue
+            
+            nulls = series.isna().to_numpy()
+            encoded = [b"" if null else str(value).encode("utf-8")
+                       for value, null in zip(series.tolist(), nulls)]
+            offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+            np.cumsum([len(value) for value in encoded], out=offsets[1:])
+            buffer = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+            atomic_write(f"{base}.data.npy", lambda f: np.save(f, buffer))
+            atomic_write(f"{base}.offsets.npy", lambda f: np.save(f, offsets))
+            if nulls.any():
+                atomic_write(f"{base}.nulls.npy", lambda f: np.save(f, nulls))
+            columns.append({
+                'name': name, 'kind': "string", 'file': f"{position:03d}",
+                'has_nulls': bool(nulls.any()),
+            })
+        
+        header = {
+            'format_version': CATALOG_FORMAT_VERSION,
+            'count': len(data),
+            'columns': columns,
+            'metadata': metadata or {},
+        }
+        atomic_write_json(os.path.join(staging_path, "header.json"), header)
+        
+        # 目錄無法以 os.replace 覆蓋，先移開舊目錄再換上新目錄；兩次改名之間中斷時目錄不存在，
+        # 載入會因找不到標頭而重新建立快照，不會讀到新舊混雜的欄位
+        previous_path = f"{self.file_path}.old"
+        if os.path.exists(previous_path):
+            shutil.rmtree(previous_path)
+        if os.path.exists(self.file_path):
+            os.rename(self.file_path, previous_path)
+        os.rename(staging_path, self.file_path)
+        if os.path.exists(previous_path):
+            shutil.rmtree(previous_path)
+        
+        self.header = header
+        return header
+    
+    def load(self) -> "CatalogStore":
+        """
+        讀取標頭並建立 MAL_ID 索引 (其他欄位在第一次使用時才以記憶體映射開啟)
+        
+        Returns:
+            自身，方便鏈式呼叫
+        
+        Raises:
+            FileNotFoundError: 目錄儲存不存在
+            ValueError: 格式版本不符
+        """
+        if not os.path.exists(self.header_path):
+            raise FileNotFoundError(f"找不到目錄儲存: {self.file_path}")
+        
+        with open(self.header_path, "r", encoding="utf-8") as f:
+            header = json.load(f)
+        if header.get('format_version') != CATALOG_FORMAT_VERSION:
+            raise ValueError(f"不支援的目錄儲存格式版本: {header.get('format_version')}")
+        
+        self.header = header
+        self._columns = {column['name']: column for column in header['columns']}
+        self._loaded = {}
+        self.ids = np.asarray(self._column('MAL_ID'), dtype=np.int64)
+        self.id_to_row = {int(mal_id): row for row, mal_id in enumerate(self.ids.tolist())}
+        return self
+    
+    @property
+    def columns(self) -> List[str]:
+        """欄位名稱列表"""
+        return list(self._columns)
+    
+    def __len__(self) -> int:
+        return len(self.ids) if self.ids is not None else 0
+    
+    def fingerprint(self) -> str:
+        """
+        以標頭 (筆數、欄位與來源 CSV 資訊) 計算雜湊，供衍生索引判斷是否過期
+        
+        Returns:
+            SHA-256 十六進位字串
+        """
+        if self.header is None:
+            raise ValueError("請先載入目錄儲存")
+        
+        encoded = json.dumps(self.header, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+    
+    def get_anime_info(self, mal_id: int,
+                       columns: Optional[Sequence[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        取得單一動漫的記錄
+        
+        Args:
+            mal_id: MAL_ID
+            columns: 要取出的欄位，None 表示全部
+        
+        Returns:
+            動漫資訊字典，MAL_ID 不存在時回傳 None
+        """
+        return self.get_anime_infos([mal_id], columns)[0]
+    
+    def get_anime_infos(self, mal_ids: Sequence[int],
+                        columns: Optional[Sequence[str]] = None) -> List[Optional[Dict[str, Any]]]:
+        """
+        批次取得多個動漫的記錄
+        
+        Args:
+            mal_ids: MAL_ID 列表
+            columns: 要取出的欄位，None 表示全部
+        
+        Returns:
+            與 mal_ids 順序對應的動漫資訊字典列表 (不存在的 MAL_ID 為 None)
+        """
+        if self.header is None:
+            raise ValueError("請先載入目錄儲存")
+        
+        columns = list(columns) if columns is not None else self.columns
+        unknown = [name for name in columns if name not in self._columns]
+        if unknown:
+            raise ValueError(f"目錄中沒有這些欄位: {unknown}")
+        
+        rows = [self.id_to_row.get(int(mal_id)) for mal_id in mal_ids]
+        found = [row for row in rows if row is not None]
+        values = {name: self._take(name, found) for name in columns}
+        
+        records = []
+        position = 0
+        for row in rows:
+            if row is None:
+                records.append(None)
+                continue
+            records.append({name: values[name][position] for name in columns})
+            position += 1
+        return records
+    
+    def to_dataframe(self, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """
+        將指定欄位還原為 DataFrame
+        
+        Args:
+            columns: 要載入的欄位，None 表示全部 (MAL_ID 一定會包含)
+        
+        Returns:
+            DataFrame
+        """
+        if self.header is None:
+            raise ValueError("請先載入目錄儲存")
+        
+        columns = list(columns) if columns is not None else self.columns
+        if 'MAL_ID' not in columns:
+            columns.insert(0, 'MAL_ID')
+        
+        all_rows = np.arange(len(self))
+        frame = {}
+        for name in self.columns:
+            if name not in columns:
+                continue
+            if self._columns[name]['kind'] == "numeric":
+                frame[name] = np.asarray(self._column(name))
+            else:
+                frame[name] = self._take(name, all_rows)
+        return pd.DataFrame(frame)
+    
+    def _column(self, name: str) -> Any:
+        """
+        以記憶體映射開啟欄位 (只在第一次使用時開啟)
+        
+        Args:
+            name: 欄位名稱
+        
+        Returns:
+            數值欄位為陣列；字串欄位為 (位元組, 起訖位置, 缺值遮罩)
+        """
+        if name not in self._loaded:
+            column = self._columns[name]
+            base = os.path.join(self.file_path, column['file'])
+            if column['kind'] == "numeric":
+                self._loaded[name] = np.load(f"{base}.npy", mmap_mode="r")
+            else:
+                nulls = np.load(f"{base}.nulls.npy", mmap_mode="r") if column.get('has_nulls') else None
+                self._loaded[name] = (
+                    np.load(f"{base}.data.npy", mmap_mode="r"),
+                    np.load(f"{base}.offsets.npy", mmap_mode="r"),
+                    nulls,
+                )
+        return self._loaded[name]
+    
+    def _take(self, name: str, rows: Sequence[int]) -> List[Any]:
+        """
+        取出欄位中指定列的值
+        
+        Args:
+            name: 欄位名稱
+            rows: 列索引
+        
+        Returns:
+            Python 原生型別的值列表 (字串欄位的缺值為 None)
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        if self._columns[name]['kind'] == "numeric":
+            return self._column(name)[rows].tolist()
+        
+        data, offsets, nulls = self._column(name)
+        starts = offsets[rows].tolist()
+        ends = offsets[rows + 1].tolist()
+        is_null = nulls[rows].tolist() if nulls is not None else [False] * len(rows)
+        
+        if len(rows) == len(offsets) - 1:
+            # 取出整個欄位時一次讀入位元組，避免逐列存取記憶體映射
+            data = data.tobytes()
+        return [
+            None if null else bytes(data[start:end]).decode("utf-8")
+            for start, end, null in zip(starts, ends, is_null)
+        ]
@@ -6,21 +6,137 @@
 # 資料路徑設定
 DATA_PATH = "data/anime_with_synopsis.csv"
 EMBEDDINGS_PATH = "data/anime_description_embeddings.npy"
+# 處理後資料的欄位化目錄儲存與服務啟動清單
+CATALOG_SNAPSHOT_PATH = "data/anime_catalog"
+SERVING_MANIFEST_PATH = "data/serving_manifest.json"
+NEIGHBOR_TABLE_PATH = "data/anime_neighbors.npy"
 
 # 模型設定
 EMBEDDING_MODEL = "all-mpnet-base-v2"
 EMBEDDING_DIMENSION = 768
+# 推論後端 ("torch" 使用 sentence-transformers，"onnx" 與 "onnx-int8" 使用 ONNX Runtime；
+# ONNX 模型在第一次使用時由 torch 模型匯出到 ONNX_MODEL_DIR，匯出時以 ONNX_PARITY_THRESHOLD 檢查餘弦相似度)
+EMBEDDING_BACKEND = "torch"
+ONNX_MODEL_DIR = "models/all-mpnet-base-v2-onnx"
+ONNX_PARITY_THRESHOLD = 0.99
+
+# 向量編碼設定 (依 token 長度分桶，每批的 token 總量約為 ENCODE_TOKEN_BUDGET)
+ENCODE_TOKEN_BUDGET = 16384
+ENCODE_MAX_BATCH_SIZE = 256
+ENCODE_PROCESSES = 1
+ENCODE_THREADS_PER_WORKER = None
+
+# 自由文字查詢設定
+QUERY_CACHE_SIZE = 4096
+QUERY_CACHE_TTL = 3600
+QUERY_BATCH_WINDOW = 0.002
+QUERY_MAX_BATCH_SIZE = 64
+
+# 推薦結果快取設定
+RESULT_CACHE_SIZE = 10000
+RESULT_CACHE_FETCH_K = 20
+RESULT_CACHE_WARM_TOP_N = 0
+REQUEST_COUNTS_PATH = "data/request_counts.json"
+REQUEST_COUNTS_SAVE_INTERVAL = 300  # HTTP 服務定期儲存請求次數的間隔 (秒)
+
+# 近鄰表設定 (以 python neighbor_table.py 離線計算)
+NEIGHBOR_TABLE_ENABLED = True
+NEIGHBOR_TABLE_K = 50
+NEIGHBOR_BLOCK_MEMORY_MB = 256
 
 # 資料處理設定
 MIN_SYNOPSIS_LENGTH = 100
 EXCLUDE_PATTERN = "No synopsis information has been"
 
+# CSV 讀取設定 (只讀取下列欄位；低基數字串欄位以 category 儲存)
+# CSV_ENGINE 為 "auto" 時，有安裝 pyarrow 就使用 pyarrow 引擎，否則使用 pandas 的 C 引擎
+CSV_ENGINE = "auto"
+CSV_COLUMNS = ['MAL_ID', 'Name', 'Score', 'Genres', 'Type', 'Episodes', 'sypnopsis']
+CSV_DTYPES = {
+    'MAL_ID': 'int64',
+    'Score': 'category',
+    'Genres': 'category',
+    'Type': 'category',
+    'Episodes': 'category',
+}
+# 整批處理時的分塊列數 (None 表示一次讀入)
+PROCESS_CHUNK_SIZE = None
+
+# 關鍵字索引設定 (BM25，索引簡介與名稱；名稱中的詞以 KEYWORD_NAME_WEIGHT 倍的詞頻計入)
+KEYWORD_INDEX_ENABLED = True
+KEYWORD_INDEX_PATH = "data/anime_keyword_index"
+BM25_K1 = 1.2
+BM25_B = 0.75
+KEYWORD_NAME_WEIGHT = 3
+# 混合搜尋設定 (關鍵字與向量各取 HYBRID_CANDIDATES 個候選，以倒數排名融合合併)
+HYBRID_CANDIDATES = 50
+HYBRID_RRF_K = 60
+# 多樣性重新排序設定 (MMR：先取 MMR_CANDIDATES 個候選，再以 MMR_LAMBDA 權衡相關性與多樣性)
+MMR_LAMBDA = 0.5
+MMR_CANDIDATES = 100
+
+# 搜尋後端設定 ("qdrant" 使用 Qdrant 伺服器，"local" 使用程序內 NumPy 精確搜尋，
+# "ivf" 使用程序內 IVF 近似搜尋)
+SEARCH_BACKEND = "qdrant"
+
+# IVF 近似搜尋設定 (IVF_NLIST 為 None 時依資料量自動決定)
+IVF_INDEX_PATH = "data/anime_ivf_index.npz"
+IVF_NLIST = None
+IVF_NPROBE = 8
+IVF_FILTER_EXACT_FACTOR = 4  # 符合篩選的筆數不超過 (此倍數 × nprobe 個群集的平均筆數) 時改為精確掃描
+IVF_TRAIN_SIZE = 100000
+
+# 向量量化設定 (None、"float16"、"int8" 或 "pq")
+# 本地後端先以壓縮向量取得 limit × RESCORE_MULTIPLIER 個候選，再以完整精度向量重新計分
+LOCAL_QUANTIZATION = None
+RESCORE_MULTIPLIER = 4
+PQ_SUBSPACES = 96
+PQ_TRAIN_SIZE = 50000
+KMEANS_ITERATIONS = 20
+# Qdrant 集合的量化方式 (None、"int8" 或 "pq")，搜尋時會自動以原始向量重新計分
+QDRANT_QUANTIZATION = None
+# 向量儲存的資料型別 ("float32" 或 "float16")
+EMBEDDING_STORE_DTYPE = "float32"
+
 # Qdrant 設定
 QDRANT_HOST = "localhost"
 QDRANT_PORT = 6333
+QDRANT_GRPC_PORT = 6334
+QDRANT_PREFER_GRPC = False
 COLLECTION_NAME = "anime_description_collection"
 DISTANCE_METRIC = "Cosine"
 
 # 批次處理設定
 BATCH_SIZE = 100
+UPSERT_PARALLEL = 4
+UPSERT_MAX_RETRIES = 3
+UPSERT_RETRY_BACKOFF = 0.5
+UPSERT_SEGMENT_BATCHES = 10  # 每個上傳工作包含的批次數 (重試以工作為單位)
+INGEST_CHUNK_SIZE = 5000
 DEFAULT_SEARCH_LIMIT = 10
+SEARCH_BATCH_SIZE = 64
+
+# 非同步服務設定
+# 同時送往搜尋後端的請求數量上限，超過時請求在服務端排隊等待 (背壓)
+ASYNC_MAX_CONCURRENCY = 32
+# 共用的 Qdrant HTTP 連線池大小
+ASYNC_POOL_SIZE = 64
+# 合併單筆相似搜尋為批次搜尋的時間窗口 (秒) 與批次大小上限
+ASYNC_BATCH_WINDOW = 0.002
+ASYNC_MAX_BATCH_SIZE = 64
+
+# 效能量測設定 (停用時量測區段幾乎沒有額外成本)
+METRICS_ENABLED = False
+# 延遲直方圖的桶上界 (毫秒)，涵蓋單次查詢到完整設定的各階段
+METRICS_BUCKETS_MS = (
+    0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500,
+    1000, 2500, 5000, 10000, 30000, 60000, 300000,
+)
+# 取樣式效能剖析的取樣間隔 (秒)
+PROFILE_SAMPLE_INTERVAL = 0.001
+
+# HTTP 服務設定
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8000
+# 請求內容大小上限 (位元組)
+SERVER_MAX_BODY_SIZE = 1024 * 1024
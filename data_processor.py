@@ -3,25 +3,37 @@
 資料處理模組 - 負責載入、清理和預處理動漫資料
 """
 
+import os
 import pandas as pd
 import numpy as np
-from typing import Tuple
-from config import DATA_PATH, MIN_SYNOPSIS_LENGTH, EXCLUDE_PATTERN
+from typing import Tuple, Iterator, Dict, Any, List, Optional, Sequence
+from catalog_store import CatalogStore
+from instrumentation import metrics
+from config import (
+    DATA_PATH, MIN_SYNOPSIS_LENGTH, EXCLUDE_PATTERN, INGEST_CHUNK_SIZE, CATALOG_SNAPSHOT_PATH,
+    CSV_ENGINE, CSV_COLUMNS, CSV_DTYPES, PROCESS_CHUNK_SIZE
+)
+
+# 寫入向量資料庫 payload、可供搜尋篩選的欄位
+FILTER_COLUMNS = ['Genres', 'Score', 'Type', 'Episodes']
 
 
 class AnimeDataProcessor:
     """動漫資料處理器"""
     
-    def __init__(self, data_path: str = DATA_PATH):
+    def __init__(self, data_path: str = DATA_PATH, csv_engine: str = CSV_ENGINE):
         """
         初始化資料處理器
         
         Args:
             data_path: 資料檔案路徑
+            csv_engine: CSV 讀取引擎 ("auto"、"c" 或 "pyarrow")
         """
         self.data_path = data_path
+        self.csv_engine = csv_engine
         self.data = None
     
+    @metrics.timed("data.load_csv")
     def load_data(self) -> pd.DataFrame:
         """
         載入動漫資料
@@ -30,10 +42,11 @@ class AnimeDataProcessor:
             載入的 DataFrame
         """
         print(f"載入資料: {self.data_path}")
-        self.data = pd.read_csv(self.data_path)
+        self.data = self._read_csv()
         print(f"原始資料筆數: {len(self.data)}")
         return self.data
     
+    @metrics.timed("data.synopsis_length")
     def calculate_synopsis_length(self) -> pd.DataFrame:
         """
         計算簡介長度
@@ -44,11 +57,10 @@ class AnimeDataProcessor:
         if self.data is None:
             raise ValueError("請先載入資料")
         
-        self.data['sypnopsis_length'] = self.data['sypnopsis'].apply(
-            lambda x: len(str(x))
-        )
+        self.data = self._add_synopsis_length(self.data)
         return self.data
     
+    @metrics.timed("data.filter")
     def filter_data(self, 
                    min_length: int = MIN_SYNOPSIS_LENGTH,
                    exclude_pattern: str = EXCLUDE_PATTERN) -> pd.DataFrame:
@@ -58,33 +70,232 @@ class AnimeDataProcessor:
         Args:
             min_length: 最小簡介長度
             exclude_pattern: 要排除的模式
-            
+        
         Returns:
             篩選後的 DataFrame
         """
         if self.data is None:
             raise ValueError("請先載入資料")
         
-        # 篩選條件
-        length_filter = self.data.sypnopsis_length > min_length
-        pattern_filter = ~self.data.sypnopsis.str.contains(exclude_pattern, na=False)
-        
-        self.data = self.data[length_filter & pattern_filter]
+        self.data = self._filter_frame(self.data, min_length, exclude_pattern)
         print(f"篩選後資料筆數: {len(self.data)}")
         return self.data
     
-    def get_processed_data(self) -> pd.DataFrame:
+    def get_processed_data(self, chunk_size: Optional[int] = PROCESS_CHUNK_SIZE) -> pd.DataFrame:
         """
         執行完整的資料處理流程
         
+        Args:
+            chunk_size: 分塊讀取的列數，None 表示一次讀入；分塊時峰值記憶體只包含篩選後資料與單一分塊
+        
+        Returns:
+            處理完成的 DataFrame
+        """
+        if chunk_size is None:
+            self.load_data()
+            self.calculate_synopsis_length()
+            self.filter_data()
+            return self.data
+        
+        chunks = list(self.iter_processed_chunks(chunk_size))
+        if not chunks:
+            raise ValueError(f"資料檔案沒有任何資料: {self.data_path}")
+        self.data = self._concat_chunks(chunks)
+        print(f"篩選後資料筆數: {len(self.data)}")
+        return self.data
+    
+    @metrics.timed("data.save_snapshot")
+    def save_snapshot(self, file_path: str = CATALOG_SNAPSHOT_PATH,
+                      min_length: int = MIN_SYNOPSIS_LENGTH,
+                      exclude_pattern: str = EXCLUDE_PATTERN) -> None:
+        """
+        將處理後的資料存為欄位化的目錄儲存，供服務啟動時直接載入而不重新讀取與篩選 CSV
+        
+        Args:
+            file_path: 目錄儲存路徑
+            min_length: 產生資料時使用的最小簡介長度
+            exclude_pattern: 產生資料時使用的排除模式
+        """
+        if self.data is None:
+            raise ValueError("請先處理資料")
+        
+        metadata = {
+            'min_length': min_length,
+            'exclude_pattern': exclude_pattern,
+            **self._source_info(),
+        }
+        CatalogStore(file_path).save(self.data, metadata=metadata)
+        print(f"資料快照已寫入: {file_path} ({len(self.data)} 筆)")
+    
+    @metrics.timed("data.load_snapshot")
+    def load_snapshot(self, file_path: str = CATALOG_SNAPSHOT_PATH,
+                      check_source: bool = True,
+                      min_length: int = MIN_SYNOPSIS_LENGTH,
+                      exclude_pattern: str = EXCLUDE_PATTERN,
+                      columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """
+        載入處理後的資料快照
+        
+        Args:
+            file_path: 目錄儲存路徑
+            check_source: 來源 CSV 存在時，確認其大小與修改時間和產生快照時相同
+            min_length: 目前的最小簡介長度，與快照不同時視為過期
+            exclude_pattern: 目前的排除模式，與快照不同時視為過期
+            columns: 只載入這些欄位 (MAL_ID 一定會包含)，None 表示全部
+        
         Returns:
             處理完成的 DataFrame
+        
+        Raises:
+            FileNotFoundError: 快照不存在
+            ValueError: 來源資料或篩選條件已變更
         """
-        self.load_data()
-        self.calculate_synopsis_length()
-        self.filter_data()
+        store = CatalogStore(file_path).load()
+        header = store.header['metadata']
+        
+        if header.get('min_length') != min_length or header.get('exclude_pattern') != exclude_pattern:
+            raise ValueError("篩選條件已變更，快照已過期")
+        if check_source and os.path.exists(self.data_path):
+            source = self._source_info()
+            if any(header.get(key) != value for key, value in source.items()):
+                raise ValueError(f"來源資料 {self.data_path} 已變更，快照已過期")
+        
+        self.data = store.to_dataframe(columns)
+        print(f"載入資料快照: {file_path} ({len(self.data)} 筆)")
         return self.data
     
+    def _source_info(self) -> Dict[str, Any]:
+        """
+        取得來源 CSV 的路徑、大小與修改時間
+        
+        Returns:
+            來源資訊字典
+        """
+        stat = os.stat(self.data_path)
+        return {
+            'source_path': self.data_path,
+            'source_size': stat.st_size,
+            'source_mtime_ns': stat.st_mtime_ns,
+        }
+    
+    def iter_processed_chunks(self,
+                              chunk_size: int = INGEST_CHUNK_SIZE,
+                              skip_chunks: int = 0,
+                              min_length: int = MIN_SYNOPSIS_LENGTH,
+                              exclude_pattern: str = EXCLUDE_PATTERN) -> Iterator[pd.DataFrame]:
+        """
+        以分塊方式讀取並篩選資料，記憶體用量僅與分塊大小相關
+        
+        Args:
+            chunk_size: 每個分塊讀取的 CSV 列數
+            skip_chunks: 略過前幾個分塊 (用於從檢查點續跑)
+            min_length: 最小簡介長度
+            exclude_pattern: 要排除的模式
+        
+        Yields:
+            篩選後的分塊 DataFrame
+        """
+        print(f"分塊載入資料: {self.data_path} (每塊 {chunk_size} 列)")
+        for index, chunk in enumerate(self._read_csv(chunk_size)):
+            if index < skip_chunks:
+                continue
+            chunk = self._add_synopsis_length(chunk)
+            yield self._filter_frame(chunk, min_length, exclude_pattern)
+    
+    @staticmethod
+    def _add_synopsis_length(data: pd.DataFrame) -> pd.DataFrame:
+        """
+        為 DataFrame 加上簡介長度欄位
+        
+        Args:
+            data: 含 sypnopsis 欄位的 DataFrame
+        
+        Returns:
+            添加簡介長度欄位的 DataFrame
+        """
+        # 向量化計算字串長度，缺少簡介的項目長度為 0
+        data['sypnopsis_length'] = data['sypnopsis'].str.len().fillna(0).astype(np.int32)
+        return data
+    
+    @staticmethod
+    def _filter_frame(data: pd.DataFrame,
+                      min_length: int,
+                      exclude_pattern: str) -> pd.DataFrame:
+        """
+        依簡介長度與排除模式篩選 DataFrame
+        
+        Args:
+            data: 含 sypnopsis 與 sypnopsis_length 欄位的 DataFrame
+            min_length: 最小簡介長度
+            exclude_pattern: 要排除的文字 (以一般字串比對，不是正規表示式)
+        
+        Returns:
+            篩選後的 DataFrame
+        """
+        length_filter = data.sypnopsis_length > min_length
+        pattern_filter = ~data.sypnopsis.str.contains(exclude_pattern, regex=False, na=False)
+        return data[length_filter & pattern_filter]
+    
+    def _read_csv(self, chunk_size: Optional[int] = None):
+        """
+        依 CSV_COLUMNS 與 CSV_DTYPES 讀取 CSV (檔案中沒有的欄位會略過)
+        
+        Args:
+            chunk_size: 分塊列數，None 表示一次讀入
+        
+        Returns:
+            DataFrame，分塊時為 DataFrame 迭代器
+        """
+        available = set(pd.read_csv(self.data_path, nrows=0).columns)
+        usecols = [column for column in CSV_COLUMNS if column in available]
+        options = {
+            'usecols': usecols,
+            'dtype': {column: dtype for column, dtype in CSV_DTYPES.items() if column in available},
+        }
+        if chunk_size is not None:
+            # pyarrow 引擎不支援分塊讀取
+            return pd.read_csv(self.data_path, chunksize=chunk_size, **options)
+        return pd.read_csv(self.data_path, engine=self._csv_engine(self.csv_engine), **options)
+    
+    @staticmethod
+    def _csv_engine(engine: str) -> str:
+        """
+        決定 CSV 讀取引擎
+        
+        Args:
+            engine: "auto"、"c" 或 "pyarrow"
+        
+        Returns:
+            pandas read_csv 的 engine 參數
+        """
+        if engine != "auto":
+            return engine
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            return "c"
+        return "pyarrow"
+    
+    @staticmethod
+    def _concat_chunks(chunks: List[pd.DataFrame]) -> pd.DataFrame:
+        """
+        合併篩選後的分塊，category 欄位先統一類別以免合併後退回 object 型別
+        
+        Args:
+            chunks: 分塊 DataFrame 列表
+        
+        Returns:
+            合併後的 DataFrame
+        """
+        dtypes = {
+            column: pd.CategoricalDtype(pd.api.types.union_categoricals(
+                [chunk[column] for chunk in chunks], ignore_order=True
+            ).categories)
+            for column in chunks[0].columns
+            if isinstance(chunks[0][column].dtype, pd.CategoricalDtype)
+        }
+        return pd.concat([chunk.astype(dtypes) for chunk in chunks])
+    
     def get_synopsis_list(self) -> list:
         """
         取得簡介文本列表
@@ -107,7 +318,38 @@ class AnimeDataProcessor:
         if self.data is None:
             raise ValueError("請先處理資料")
         
-        return self.data[['MAL_ID', 'Name']].to_dict(orient="records")
+        return self.build_metadata(self.data)
+    
+    @staticmethod
+    def build_metadata(data: pd.DataFrame) -> list:
+        """
+        由 DataFrame 建立 metadata
+        
+        Args:
+            data: 處理後的 DataFrame (或其分塊)
+        
+        Returns:
+            包含 MAL_ID、Name 及篩選欄位 (Genres、Score、Type、Episodes，資料中有時才加入) 的字典列表
+        """
+        columns = ['MAL_ID', 'Name'] + [col for col in FILTER_COLUMNS if col in data.columns]
+        frame = data[columns].copy()
+        
+        # 評分與集數可能為 "Unknown"，轉為數值後以 None 表示缺值
+        if 'Score' in frame.columns:
+            frame['Score'] = pd.to_numeric(frame['Score'], errors='coerce')
+        if 'Episodes' in frame.columns:
+            frame['Episodes'] = pd.to_numeric(frame['Episodes'], errors='coerce').astype('Int64')
+        if 'Genres' in frame.columns:
+            # 類型組合重複度高 (讀取時為 category)，只拆解不重複的值
+            genres = frame['Genres'].astype(object).where(frame['Genres'].notna(), '')
+            split = {
+                value: [genre.strip() for genre in str(value).split(',') if genre.strip()]
+                for value in pd.unique(genres)
+            }
+            frame['Genres'] = genres.map(split)
+        
+        frame = frame.astype(object).where(frame.notna(), None)
+        return frame.to_dict(orient="records")
 
 
 if __name__ == "__main__":
@@ -47,9 +47,10 @@ def demo_interactive():
         print("\n請選擇操作:")
         print("1. 根據 MAL_ID 搜尋推薦")
         print("2. 查看動漫詳細資訊")
-        print("3. 退出")
+        print("3. 根據文字描述搜尋推薦")
+        print("4. 退出")
         
-        choice = input("請輸入選項 (1-3): ").strip()
+        choice = input("請輸入選項 (1-4): ").strip()
         
         if choice == "1":
             try:
@@ -79,6 +80,16 @@ def demo_interactive():
                 print(f"錯誤: {e}")
         
         elif choice == "3":
+            try:
+                query = input("請輸入劇情描述 (英文): ").strip()
+                limit = int(input("推薦數量 (預設 10): ") or 10)
+                
+                recommendations = recommender.recommend_by_text(query, limit)
+                recommender.display_recommendations(recommendations)
+            except (ValueError, TypeError) as e:
+                print(f"錯誤: {e}")
+        
+        elif choice == "4":
             print("感謝使用！")
             break
         
@@ -102,14 +113,19 @@ def demo_batch_search():
         (8, "Bouken Ou Beet")
     ]
     
+    # 一次批次查詢所有 MAL_ID，並排除查詢動漫本身
+    all_recommendations = recommender.recommend_by_mal_ids(
+        [mal_id for mal_id, _ in popular_anime], limit=3, exclude_self=True
+    )
+    
     for mal_id, anime_name in popular_anime:
         print(f"\n--- {anime_name} (MAL_ID: {mal_id}) 的推薦 ---")
-        try:
-            recommendations = recommender.recommend_by_mal_id(mal_id, limit=4)
-            for i, rec in enumerate(recommendations[1:], 1):  # 跳過自己
-                print(f"{i}. {rec['Name']} (相似度: {rec['Score']:.3f})")
-        except ValueError as e:
-            print(f"錯誤: {e}")
+        recommendations = all_recommendations.get(mal_id)
+        if recommendations is None:
+            print(f"錯誤: MAL_ID {mal_id} 在集合中不存在")
+            continue
+        for i, rec in enumerate(recommendations, 1):
+            print(f"{i}. {rec['Name']} (相似度: {rec['Score']:.3f})")
 
 
 if __name__ == "__main__":
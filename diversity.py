@@ -0,0 +1,80 @@
+"""
+多樣性重新排序模組 - 以最大邊際相關性 (MMR) 從較多的候選中挑選彼此不相似的推薦結果
+"""
+
+import numpy as np
+from typing import List, Dict, Any
+from config import MMR_LAMBDA
+
+
+def mmr_select(relevance: np.ndarray, vectors: np.ndarray, limit: int,
+               lambda_: float = MMR_LAMBDA) -> np.ndarray:
+    """
+    以 MMR 貪婪挑選候選：每一步選出 lambda * 相關性 - (1 - lambda) * 與已選項目的最大相似度 最高者
+    
+    每選出一個項目只計算一次它與所有候選的相似度 (一次矩陣-向量乘法)，並累積到「與已選項目的
+    最大相似度」陣列中；只計算實際用到的相似度矩陣列，limit 遠小於候選數時比完整矩陣便宜。
+    
+    Args:
+        relevance: 每個候選與查詢的相關性 (通常為搜尋回傳的餘弦相似度)
+        vectors: 候選向量矩陣，形狀為 (候選數量, 向量維度)
+        limit: 挑選數量
+        lambda_: 相關性權重，1 表示只看相關性 (原本的排序)，0 表示只看多樣性
+    
+    Returns:
+        依挑選順序排列的候選位置
+    """
+    if not 0.0 <= lambda_ <= 1.0:
+        raise ValueError(f"lambda_ 必須介於 0 與 1 之間: {lambda_}")
+    
+    relevance = np.asarray(relevance, dtype=np.float32)
+    count = len(relevance)
+    limit = min(limit, count)
+    if limit <= 0:
+        return np.empty(0, dtype=np.int64)
+    
+    # 搜尋後端的向量通常已正規化，此時不複製
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.sqrt(np.einsum("ij,ij->i", vectors, vectors))
+    if not np.allclose(norms, 1.0, atol=1e-4):
+        norms[norms == 0] = 1.0
+        vectors = vectors / norms[:, None]
+    
+    weighted_relevance = lambda_ * relevance
+    selected = np.empty(limit, dtype=np.int64)
+    selected[0] = int(np.argmax(relevance))
+    max_similarity = vectors @ vectors[selected[0]]
+    chosen = np.zeros(count, dtype=bool)
+    chosen[selected[0]] = True
+    
+    for step in range(1, limit):
+        scores = weighted_relevance - (1.0 - lambda_) * max_similarity
+        scores[chosen] = -np.inf
+        best = int(np.argmax(scores))
+        selected[step] = best
+        chosen[best] = True
+        np.maximum(max_similarity, vectors @ vectors[best], out=max_similarity)
+    return selected
+
+
+def mmr_rerank(results: List[Dict[str, Any]], vectors: np.ndarray, limit: int,
+               lambda_: float = MMR_LAMBDA) -> List[Dict[str, Any]]:
+    """
+    以 MMR 重新排序搜尋結果 (結果的 'Score' 保留原本的相似度)
+    
+    Args:
+        results: 搜尋結果列表，'Score' 為與查詢的相似度
+        vectors: 與 results 對齊的候選向量
+        limit: 回傳數量
+        lambda_: 相關性權重
+    
+    Returns:
+        重新排序後的結果列表
+    """
+    if not results:
+        return []
+    if len(vectors) != len(results):
+        raise ValueError(f"向量數量 ({len(vectors)}) 與結果數量 ({len(results)}) 不一致")
+    
+    relevance = np.array([result['Score'] for result in results], dtype=np.float32)
+    return [results[position] for position in mmr_select(relevance, vectors, limit, lambda_)]
@@ -3,39 +3,98 @@
 向量生成模組 - 負責將文本轉換為向量表示
 """
 
+import hashlib
+import os
+import time
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from typing import List, Optional
-from config import EMBEDDING_MODEL, EMBEDDINGS_PATH, EMBEDDING_DIMENSION
+from typing import List, Optional, Sequence
+from embedding_store import EmbeddingStore
+from instrumentation import metrics
+from config import (
+    EMBEDDING_MODEL, EMBEDDINGS_PATH, EMBEDDING_DIMENSION,
+    ENCODE_TOKEN_BUDGET, ENCODE_MAX_BATCH_SIZE, ENCODE_PROCESSES,
+    ENCODE_THREADS_PER_WORKER, EMBEDDING_STORE_DTYPE,
+    EMBEDDING_BACKEND, ONNX_MODEL_DIR
+)
 
 
 class EmbeddingGenerator:
     """文本向量生成器"""
     
-    def __init__(self, model_name: str = EMBEDDING_MODEL):
+    def __init__(self, model_name: str = EMBEDDING_MODEL,
+                 processes: int = ENCODE_PROCESSES,
+                 threads_per_worker: Optional[int] = ENCODE_THREADS_PER_WORKER,
+                 token_budget: int = ENCODE_TOKEN_BUDGET,
+                 max_batch_size: int = ENCODE_MAX_BATCH_SIZE,
+                 backend: str = EMBEDDING_BACKEND,
+                 onnx_model_dir: str = ONNX_MODEL_DIR):
         """
         初始化向量生成器
         
         Args:
             model_name: 預訓練模型名稱
+            processes: 編碼使用的 CPU 程序數量 (1 表示在目前程序內編碼，ONNX 後端一律在程序內編碼)
+            threads_per_worker: 每個程序使用的執行緒上限，None 表示不限制
+            token_budget: 每個批次的 token 總量上限，用於決定各長度分桶的批次大小
+            max_batch_size: 批次大小上限
+            backend: 推論後端 ("torch"、"onnx" 或 "onnx-int8")
+            onnx_model_dir: ONNX 模型目錄 (不存在時第一次載入會自動匯出)
         """
+        if backend not in ("torch", "onnx", "onnx-int8"):
+            raise ValueError(f"不支援的推論後端: {backend}")
+        
         self.model_name = model_name
+        self.backend = backend
+        self.onnx_model_dir = onnx_model_dir
+        self.processes = processes
+        self.threads_per_worker = threads_per_worker
+        self.token_budget = token_budget
+        self.max_batch_size = max_batch_size
         self.model = None
         self.embeddings = None
+        self.mal_ids = None
+        self.cache_stats = None
+        self.encode_stats = None
+        self.store_header = None
+        self._pool = None
     
+    @metrics.timed("embedding.load_model")
     def load_model(self) -> None:
         """載入預訓練模型"""
+        if self.backend != "torch":
+            self._load_onnx_model()
+            return
+        
+        # 延遲匯入：只提供 MAL_ID 推薦的服務不需要載入 torch 與 sentence-transformers
+        from sentence_transformers import SentenceTransformer
+        
         print(f"載入模型: {self.model_name}")
         self.model = SentenceTransformer(self.model_name)
         print("模型載入完成")
     
+    def _load_onnx_model(self) -> None:
+        """載入 ONNX 模型 (尚未匯出時先由 torch 模型匯出並檢查一致性)"""
+        from onnx_encoder import ONNXSentenceEncoder, export_onnx
+        
+        quantized = self.backend == "onnx-int8"
+        if not ONNXSentenceEncoder.exists(self.onnx_model_dir, quantized):
+            export_onnx(self.model_name, self.onnx_model_dir, quantize=quantized)
+        
+        print(f"載入 ONNX 模型: {self.onnx_model_dir} ({'int8' if quantized else 'fp32'})")
+        self.model = ONNXSentenceEncoder(
+            self.onnx_model_dir, quantized=quantized,
+            threads=self.threads_per_worker, model_name=self.model_name
+        )
+        print("模型載入完成")
+    
+    @metrics.timed("embedding.encode")
     def generate_embeddings(self, texts: List[str]) -> np.ndarray:
         """
         生成文本向量
         
         Args:
             texts: 文本列表
-            
+        
         Returns:
             向量陣列
         """
@@ -43,39 +102,316 @@ class EmbeddingGenerator:
             self.load_model()
         
         print(f"開始生成 {len(texts)} 個文本的向量...")
-        self.embeddings = self.model.encode(texts, show_progress_bar=True)
-        print(f"向量生成完成，形狀: {self.embeddings.shape}")
+        start_time = time.perf_counter()
+        
+        buckets = self._length_buckets(texts)
+        embeddings = np.empty(
+            (len(texts), self.model.get_sentence_embedding_dimension()), dtype=np.float32
+        )
+        for batch_size, indices in buckets:
+            bucket_texts = [texts[i] for i in indices]
+            embeddings[indices] = self._encode_bucket(bucket_texts, batch_size)
+        
+        elapsed = time.perf_counter() - start_time
+        self.embeddings = embeddings
+        self.encode_stats = {
+            'texts': len(texts),
+            'buckets': len(buckets),
+            'seconds': elapsed,
+            'texts_per_sec': len(texts) / elapsed if elapsed > 0 else 0.0,
+        }
+        metrics.increment("embedding.vectors_encoded", len(texts))
+        print(f"向量生成完成，形狀: {self.embeddings.shape}，"
+              f"{len(buckets)} 個長度分桶，{self.encode_stats['texts_per_sec']:.1f} 筆/秒")
         
         return self.embeddings
     
-    def save_embeddings(self, file_path: str = EMBEDDINGS_PATH) -> None:
+    @metrics.timed("embedding.encode_queries")
+    def encode_queries(self, texts: List[str]) -> np.ndarray:
+        """
+        編碼線上查詢文字 (不顯示進度、不覆寫目前的向量)
+        
+        Args:
+            texts: 查詢文字列表
+        
+        Returns:
+            向量陣列
+        """
+        if self.model is None:
+            self.load_model()
+        
+        metrics.increment("embedding.queries_encoded", len(texts))
+        return np.asarray(
+            self.model.encode(texts, batch_size=max(len(texts), 1), show_progress_bar=False),
+            dtype=np.float32
+        )
+    
+    def close(self) -> None:
+        """關閉多程序編碼池"""
+        if self._pool is not None:
+            self.model.stop_multi_process_pool(self._pool)
+            self._pool = None
+    
+    def _length_buckets(self, texts: List[str]):
+        """
+        依 token 長度由長到短排序並分桶，每個分桶使用相同的批次大小
+        
+        批次大小取 token_budget / 該文本 token 數並向下取到 2 的冪次，
+        長文本使用小批次、短文本使用大批次，減少補齊 (padding) 浪費。
+        
+        Args:
+            texts: 文本列表
+        
+        Returns:
+            (批次大小, 原始索引陣列) 的列表
+        """
+        lengths = self._token_lengths(texts)
+        order = np.argsort(-lengths, kind="stable")
+        
+        raw_sizes = np.clip(self.token_budget // np.maximum(lengths[order], 1), 1, self.max_batch_size)
+        batch_sizes = 2 ** np.floor(np.log2(raw_sizes)).astype(np.int64)
+        
+        buckets = []
+        boundaries = np.flatnonzero(np.diff(batch_sizes)) + 1
+        for indices, sizes in zip(np.split(order, boundaries), np.split(batch_sizes, boundaries)):
+            if len(indices) > 0:
+                buckets.append((int(sizes[0]), indices))
+        return buckets
+    
+    def _token_lengths(self, texts: List[str]) -> np.ndarray:
         """
-        儲存向量到檔案
+        計算每個文本截斷後的 token 數 (無 tokenizer 時以字元數估計)
+        
+        Args:
+            texts: 文本列表
+        
+        Returns:
+            token 數陣列
+        """
+        max_length = getattr(self.model, "max_seq_length", None) or 512
+        tokenizer = getattr(self.model, "tokenizer", None)
+        if tokenizer is None:
+            return np.minimum(np.array([len(text) for text in texts]) // 4 + 2, max_length)
+        
+        encoded = tokenizer(list(texts), add_special_tokens=True, truncation=True,
+                            max_length=max_length)
+        return np.array([len(ids) for ids in encoded["input_ids"]], dtype=np.int64)
+    
+    def _encode_bucket(self, texts: List[str], batch_size: int) -> np.ndarray:
+        """
+        以固定批次大小編碼一個分桶，必要時使用多程序編碼池
+        
+        Args:
+            texts: 分桶內的文本
+            batch_size: 批次大小
+        
+        Returns:
+            向量陣列
+        """
+        if self.backend != "torch":
+            # ONNX Runtime 以執行緒平行計算，不使用多程序編碼池
+            return self.model.encode(texts, batch_size=batch_size, show_progress_bar=True)
+        
+        if self.processes <= 1:
+            if self.threads_per_worker:
+                import torch
+                torch.set_num_threads(self.threads_per_worker)
+            return self.model.encode(texts, batch_size=batch_size, show_progress_bar=True)
+        
+        if self._pool is None:
+            self._pool = self._start_pool()
+        
+        # 每個工作程序一次處理數個批次，兼顧負載平衡與程序間傳輸成本
+        chunk_size = max(batch_size, min(batch_size * 4, len(texts) // self.processes or 1))
+        return self.model.encode_multi_process(
+            texts, self._pool, batch_size=batch_size, chunk_size=chunk_size
+        )
+    
+    def _start_pool(self):
+        """
+        啟動 CPU 多程序編碼池，並限制每個工作程序的執行緒數量
+        
+        Returns:
+            sentence-transformers 的多程序編碼池
+        """
+        print(f"啟動 {self.processes} 個編碼程序"
+              + (f" (每程序 {self.threads_per_worker} 執行緒)" if self.threads_per_worker else ""))
+        
+        # 工作程序以 spawn 啟動，會在匯入 torch 時讀取這些環境變數
+        saved_env = {}
+        if self.threads_per_worker:
+            for key in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+                saved_env[key] = os.environ.get(key)
+                os.environ[key] = str(self.threads_per_worker)
+        try:
+            return self.model.start_multi_process_pool(target_devices=["cpu"] * self.processes)
+        finally:
+            for key, value in saved_env.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+    
+    def save_embeddings(self, file_path: str = EMBEDDINGS_PATH,
+                        mal_ids: Optional[Sequence[int]] = None) -> None:
+        """
+        儲存向量到檔案 (含 MAL_ID 對齊檔與標頭)
         
         Args:
             file_path: 儲存路徑
+            mal_ids: 與向量逐列對齊的 MAL_ID，未提供時以列號代替
         """
         if self.embeddings is None:
             raise ValueError("請先生成向量")
         
-        np.save(file_path, self.embeddings)
+        if mal_ids is None:
+            mal_ids = np.arange(len(self.embeddings))
+        
+        self.embeddings = self.embeddings.astype(EMBEDDING_STORE_DTYPE, copy=False)
+        self.store_header = EmbeddingStore(file_path).save(self.embeddings, mal_ids, self.model_name)
+        self.mal_ids = np.asarray(mal_ids, dtype=np.int64)
         print(f"向量已儲存至: {file_path}")
     
-    def load_embeddings(self, file_path: str = EMBEDDINGS_PATH) -> np.ndarray:
+    def load_embeddings(self, file_path: str = EMBEDDINGS_PATH,
+                        mmap_mode: Optional[str] = "r") -> np.ndarray:
         """
         從檔案載入向量
         
+        預設以唯讀記憶體映射開啟，不會將整個檔案讀入記憶體。
+        
         Args:
             file_path: 檔案路徑
-            
+            mmap_mode: 記憶體映射模式，None 表示完整讀入記憶體
+        
         Returns:
             向量陣列
         """
         print(f"載入向量: {file_path}")
-        self.embeddings = np.load(file_path)
+        store = EmbeddingStore(file_path)
+        self.embeddings, self.mal_ids = store.load(
+            mmap_mode=mmap_mode, model_name=self.model_name
+        )
+        self.store_header = store.header
         print(f"向量載入完成，形狀: {self.embeddings.shape}")
         return self.embeddings
     
+    def update_embeddings(self, texts: List[str],
+                          mal_ids: Sequence[int],
+                          file_path: str = EMBEDDINGS_PATH) -> np.ndarray:
+        """
+        增量生成向量：以 (模型名稱, 正規化簡介雜湊) 比對既有儲存，
+        只對新增或內容變更的文本重新編碼，並移除已不存在的列；
+        內容完全未變更時直接沿用記憶體映射的儲存，不重寫檔案
+        
+        Args:
+            texts: 文本列表
+            mal_ids: 與文本逐列對齊的 MAL_ID
+            file_path: 向量儲存路徑 (同時作為快取來源)
+        
+        Returns:
+            與文本逐列對齊的向量陣列
+        """
+        if len(texts) != len(mal_ids):
+            raise ValueError(f"文本數量 ({len(texts)}) 與 MAL_ID 數量 ({len(mal_ids)}) 不一致")
+        
+        hashes = np.array([self.text_hash(text) for text in texts], dtype="S16")
+        mal_ids = np.asarray(mal_ids, dtype=np.int64)
+        
+        # 載入既有儲存作為快取；模型不同或格式不符時視為沒有快取
+        store = EmbeddingStore(file_path)
+        cached_vectors = None
+        cached_ids = None
+        cached_hashes = None
+        try:
+            cached_vectors, cached_ids = store.load(mmap_mode="r", model_name=self.model_name)
+            cached_hashes = store.load_text_hashes()
+        except FileNotFoundError:
+            print("沒有可用的向量快取，將編碼全部文本")
+        except ValueError as e:
+            print(f"既有向量無法作為快取 ({e})，將編碼全部文本")
+        
+        aligned = cached_ids is not None and np.array_equal(cached_ids, mal_ids)
+        if cached_vectors is not None and cached_hashes is None and aligned:
+            # 舊版儲存沒有文本雜湊：MAL_ID 逐列對齊時沿用既有向量，並補寫目前的雜湊。
+            # 升級前已變更的簡介無法辨識，會沿用舊向量一次；之後的變更都能以雜湊偵測
+            print("既有向量沒有文本雜湊，沿用與 MAL_ID 對齊的向量並補寫文本雜湊")
+            store.save_text_hashes(hashes)
+            cached_hashes = hashes
+        
+        if aligned and np.array_equal(cached_hashes, hashes):
+            # 內容完全未變更：直接使用記憶體映射，不重寫儲存
+            self.embeddings = cached_vectors
+            self.mal_ids = mal_ids
+            self.store_header = store.header
+            self.cache_stats = {'cached': len(texts), 'encoded': 0, 'evicted': 0}
+            metrics.increment("embedding.store_cache_hits", len(texts))
+            print(f"向量儲存與資料一致，沿用全部 {len(texts)} 筆向量")
+            return cached_vectors
+        
+        cache_index = {}
+        if cached_hashes is not None:
+            cache_index = {h: row for row, h in enumerate(cached_hashes.tolist())}
+        
+        hit_rows, cached_rows, miss_rows = [], [], []
+        for row, h in enumerate(hashes.tolist()):
+            if h in cache_index:
+                hit_rows.append(row)
+                cached_rows.append(cache_index[h])
+            else:
+                miss_rows.append(row)
+        
+        encoded = None
+        if miss_rows:
+            encoded = self.generate_embeddings([texts[row] for row in miss_rows])
+        
+        if encoded is not None:
+            dimension = encoded.shape[1]
+        elif cached_vectors is not None:
+            dimension = cached_vectors.shape[1]
+        else:
+            dimension = EMBEDDING_DIMENSION
+        
+        embeddings = np.empty((len(texts), dimension), dtype=EMBEDDING_STORE_DTYPE)
+        if hit_rows:
+            embeddings[hit_rows] = cached_vectors[cached_rows]
+        if encoded is not None:
+            embeddings[miss_rows] = encoded
+        
+        evicted = len(set(cache_index) - set(hashes.tolist()))
+        # 釋放記憶體映射後再覆寫檔案
+        del cached_vectors
+        
+        self.embeddings = embeddings
+        self.cache_stats = {
+            'cached': len(hit_rows),
+            'encoded': len(miss_rows),
+            'evicted': evicted,
+        }
+        metrics.increment("embedding.store_cache_hits", len(hit_rows))
+        print(f"增量向量生成完成: 快取命中 {len(hit_rows)} 筆、重新編碼 {len(miss_rows)} 筆、"
+              f"移除 {evicted} 筆")
+        
+        store = EmbeddingStore(file_path)
+        self.store_header = store.save(embeddings, mal_ids, self.model_name, text_hashes=hashes)
+        # 改用記憶體映射的儲存，釋放剛組合好的記憶體陣列
+        self.embeddings, _ = store.load(mmap_mode="r")
+        self.mal_ids = mal_ids
+        return self.embeddings
+    
+    @staticmethod
+    def text_hash(text: str) -> bytes:
+        """
+        計算正規化文本的雜湊 (去除首尾空白並合併連續空白)
+        
+        Args:
+            text: 文本
+        
+        Returns:
+            16 位元組的雜湊值
+        """
+        normalized = " ".join(str(text).split())
+        return hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).digest()
+    
     def get_embeddings(self) -> Optional[np.ndarray]:
         """
         取得當前的向量
@@ -86,19 +422,21 @@ class EmbeddingGenerator:
         return self.embeddings
     
     def process_texts_to_embeddings(self, texts: List[str], 
-                                   save_path: str = EMBEDDINGS_PATH) -> np.ndarray:
+                                   save_path: str = EMBEDDINGS_PATH,
+                                   mal_ids: Optional[Sequence[int]] = None) -> np.ndarray:
         """
         完整的文本向量化流程
         
         Args:
             texts: 文本列表
             save_path: 儲存路徑
-            
+            mal_ids: 與文本逐列對齊的 MAL_ID
+        
         Returns:
             向量陣列
         """
         embeddings = self.generate_embeddings(texts)
-        self.save_embeddings(save_path)
+        self.save_embeddings(save_path, mal_ids)
         return embeddings
 
 
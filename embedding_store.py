@@ -0,0 +1,470 @@
+"""
+向量儲存模組 - 以記憶體映射方式存取向量，並以附屬檔案記錄 MAL_ID 對齊資訊
+"""
+
+import hashlib
+import json
+import os
+import struct
+import numpy as np
+from typing import Any, BinaryIO, Callable, Dict, Optional, Sequence, Tuple
+from config import EMBEDDINGS_PATH
+
+STORE_FORMAT_VERSION = 1
+
+# 可追加寫入的 .npy 檔保留固定長度的標頭，筆數增加時可原地改寫
+_APPENDABLE_HEADER_SIZE = 128
+
+
+def atomic_write(path: str, write: Callable[[BinaryIO], Any]) -> None:
+    """
+    以暫存檔寫入後替換目標檔案，讀取端不會看到寫到一半的檔案
+    
+    Args:
+        path: 目標檔案路徑
+        write: 接收二進位檔案物件並寫入內容的函式
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def atomic_write_json(path: str, data: Any, indent: Optional[int] = 2) -> None:
+    """
+    以 atomic_write 寫入 UTF-8 編碼的 JSON 檔案
+    
+    Args:
+        path: 目標檔案路徑
+        data: 可序列化為 JSON 的內容
+        indent: 縮排空格數，None 表示不換行
+    """
+    atomic_write(path, lambda f: f.write(json.dumps(data, ensure_ascii=False, indent=indent).encode("utf-8")))
+
+
+class EmbeddingStore:
+    """
+    向量儲存
+    
+    一份儲存由四個檔案組成：
+        <path>            連續的向量區塊 (.npy，可用 mmap_mode 開啟)
+        <path>.ids.npy    與向量逐列對齊的 MAL_ID 陣列
+        <path>.json       標頭 (模型名稱、維度、型別、筆數、內容雜湊)
+        <path>.hashes.npy 每列來源文本的雜湊 (選用，供增量生成向量時比對)
+    """
+    
+    def __init__(self, file_path: str = EMBEDDINGS_PATH):
+        """
+        初始化向量儲存
+        
+        Args:
+            file_path: 向量區塊檔案路徑
+        """
+        self.file_path = file_path
+        self.ids_path = f"{file_path}.ids.npy"
+        self.header_path = f"{file_path}.json"
+        self.hashes_path = f"{file_path}.hashes.npy"
+        self.header = None
+    
+    def save(self,
+             embeddings: np.ndarray,
+             mal_ids: Sequence[int],
+             model_name: str,
+             text_hashes: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        """
+        儲存向量、MAL_ID 與標頭
+        
+        Args:
+            embeddings: 向量陣列
+            mal_ids: 與向量逐列對齊的 MAL_ID
+            model_name: 產生向量的模型名稱
+            text_hashes: 與向量逐列對齊的來源文本雜湊 (選用)
+        
+        Returns:
+            寫入的標頭
+        """
+        embeddings = np.ascontiguousarray(embeddings)
+        ids = np.asarray(mal_ids, dtype=np.int64)
+        
+        if embeddings.ndim != 2:
+            raise ValueError(f"向量必須為二維陣列，目前形狀: {embeddings.shape}")
+        if len(ids) != len(embeddings):
+            raise ValueError(
+                f"MAL_ID 數量 ({len(ids)}) 與向量數量 ({len(embeddings)}) 不一致"
+            )
+        if len(np.unique(ids)) != len(ids):
+            raise ValueError("MAL_ID 含有重複值")
+        if text_hashes is not None and len(text_hashes) != len(ids):
+            raise ValueError(
+                f"文本雜湊數量 ({len(text_hashes)}) 與向量數量 ({len(embeddings)}) 不一致"
+            )
+        
+        header = {
+            'format_version': STORE_FORMAT_VERSION,
+            'model_name': model_name,
+            'dimension': int(embeddings.shape[1]),
+            'dtype': embeddings.dtype.str,
+            'count': int(embeddings.shape[0]),
+            'content_hash': self._content_hash(embeddings, ids),
+            'has_text_hashes': text_hashes is not None,
+        }
+        
+        directory = os.path.dirname(self.file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        # 先寫入暫存檔再替換，標頭最後寫入，確保讀取端不會看到不完整的儲存
+        atomic_write(self.file_path, lambda f: np.save(f, embeddings))
+        atomic_write(self.ids_path, lambda f: np.save(f, ids))
+        if text_hashes is not None:
+            atomic_write(self.hashes_path, lambda f: np.save(f, np.asarray(text_hashes)))
+        atomic_write_json(self.header_path, header)
+        
+        self.header = header
+        print(f"向量儲存已寫入: {self.file_path} ({header['count']} 筆, {header['dimension']} 維)")
+        return header
+    
+    def load(self,
+             mmap_mode: Optional[str] = "r",
+             verify: bool = False,
+             model_name: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        載入向量與 MAL_ID
+        
+        預設以唯讀記憶體映射開啟向量區塊，多個程序可共用同一份 page cache，
+        啟動時不需讀入整個檔案。
+        
+        Args:
+            mmap_mode: 傳給 np.load 的 mmap_mode，None 表示完整讀入記憶體
+            verify: 是否重新計算內容雜湊並與標頭比對 (需讀取整個檔案)
+            model_name: 若指定，檢查儲存的模型名稱是否相符
+        
+        Returns:
+            (向量陣列, MAL_ID 陣列)
+        """
+        if not os.path.exists(self.header_path):
+            raise FileNotFoundError(f"找不到向量儲存標頭: {self.header_path}")
+        
+        with open(self.header_path, "r", encoding="utf-8") as f:
+            header = json.load(f)
+        
+        if header.get('format_version') != STORE_FORMAT_VERSION:
+            raise ValueError(f"不支援的向量儲存格式版本: {header.get('format_version')}")
+        
+        embeddings = np.load(self.file_path, mmap_mode=mmap_mode)
+        ids = np.load(self.ids_path, mmap_mode=mmap_mode)
+        
+        expected_shape = (header['count'], header['dimension'])
+        if embeddings.shape != expected_shape:
+            raise ValueError(f"向量形狀 {embeddings.shape} 與標頭記錄 {expected_shape} 不一致")
+        if embeddings.dtype.str != header['dtype']:
+            raise ValueError(f"向量型別 {embeddings.dtype.str} 與標頭記錄 {header['dtype']} 不一致")
+        if len(ids) != header['count']:
+            raise ValueError(f"MAL_ID 數量 ({len(ids)}) 與標頭記錄 ({header['count']}) 不一致")
+        if model_name is not None and header['model_name'] != model_name:
+            raise ValueError(
+                f"向量由模型 '{header['model_name']}' 產生，與目前模型 '{model_name}' 不符"
+            )
+        if verify and self._content_hash(embeddings, ids) != header['content_hash']:
+            raise ValueError(f"向量儲存內容雜湊不符，檔案可能已損毀: {self.file_path}")
+        
+        self.header = header
+        return embeddings, ids
+    
+    def load_text_hashes(self) -> Optional[np.ndarray]:
+        """
+        載入每列來源文本的雜湊 (需先呼叫 load)
+        
+        Returns:
+            文本雜湊陣列，儲存時未提供則回傳 None
+        """
+        if self.header is None:
+            raise ValueError("請先載入向量儲存")
+        
+        if not self.header.get('has_text_hashes') or not os.path.exists(self.hashes_path):
+            return None
+        
+        hashes = np.load(self.hashes_path)
+        if len(hashes) != self.header['count']:
+            raise ValueError(f"文本雜湊數量 ({len(hashes)}) 與標頭記錄 ({self.header['count']}) 不一致")
+        return hashes
+    
+    def save_text_hashes(self, text_hashes: np.ndarray) -> None:
+        """
+        為既有儲存補寫來源文本雜湊 (需先呼叫 load，向量與內容雜湊不變)
+        
+        Args:
+            text_hashes: 與向量逐列對齊的來源文本雜湊
+        """
+        if self.header is None:
+            raise ValueError("請先載入向量儲存")
+        if len(text_hashes) != self.header['count']:
+            raise ValueError(
+                f"文本雜湊數量 ({len(text_hashes)}) 與標頭記錄 ({self.header['count']}) 不一致"
+            )
+        
+        header = dict(self.header, has_text_hashes=True)
+        atomic_write(self.hashes_path, lambda f: np.save(f, np.asarray(text_hashes)))
+        atomic_write_json(self.header_path, header)
+        self.header = header
+    
+    @staticmethod
+    def check_alignment(store_ids: np.ndarray, expected_ids: Sequence[int]) -> None:
+        """
+        檢查儲存的 MAL_ID 是否與資料逐列對齊，不一致時拋出錯誤
+        
+        Args:
+            store_ids: 向量儲存中的 MAL_ID 陣列
+            expected_ids: 目前資料的 MAL_ID 序列
+        """
+        expected = np.asarray(expected_ids, dtype=np.int64)
+        if len(store_ids) != len(expected):
+            raise ValueError(
+                f"向量筆數 ({len(store_ids)}) 與資料筆數 ({len(expected)}) 不一致，請重建向量"
+            )
+        
+        mismatched = np.flatnonzero(np.asarray(store_ids) != expected)
+        if len(mismatched) > 0:
+            row = int(mismatched[0])
+            raise ValueError(
+                f"向量與資料未對齊: 第 {row} 列儲存的 MAL_ID 為 {int(store_ids[row])}，"
+                f"資料為 {int(expected[row])} (共 {len(mismatched)} 列不一致)，請重建向量"
+            )
+    
+    @staticmethod
+    def _content_hash(embeddings: np.ndarray, ids: np.ndarray) -> str:
+        """
+        計算 MAL_ID 與向量內容的 SHA-256 雜湊
+        
+        Args:
+            embeddings: 向量陣列
+            ids: MAL_ID 陣列
+        
+        Returns:
+            十六進位雜湊字串
+        """
+        digest = hashlib.sha256()
+        digest.update(np.ascontiguousarray(ids, dtype=np.int64).tobytes())
+        # 逐區塊雜湊 (結果與一次雜湊整個陣列相同)，記憶體映射時不需複製整個矩陣
+        for start in range(0, len(embeddings), 4096):
+            digest.update(np.ascontiguousarray(embeddings[start:start + 4096]))
+        return digest.hexdigest()
+
+
+class EmbeddingStoreWriter:
+    """
+    可分段追加的向量儲存寫入器
+    
+    寫入期間資料存放在 <path>.partial 等暫存檔 (皆為合法的 .npy 檔)，
+    每次 flush 後即可從已寫入的筆數續寫；finalize 時先寫入暫存標頭，再替換為正式檔案並寫入標頭，
+    替換途中中斷時可以 commit_staged 完成剩餘的替換。
+    """
+    
+    def __init__(self, file_path: str = EMBEDDINGS_PATH,
+                 model_name: str = "",
+                 resume_rows: int = 0):
+        """
+        初始化寫入器
+        
+        Args:
+            file_path: 向量區塊檔案路徑
+            model_name: 產生向量的模型名稱
+            resume_rows: 從既有暫存檔的第幾筆開始續寫 (0 表示重新寫入)
+        """
+        self.store = EmbeddingStore(file_path)
+        self.model_name = model_name
+        self.rows = 0
+        self._files = {
+            'vectors': _AppendableNpy(f"{self.store.file_path}.partial"),
+            'ids': _AppendableNpy(f"{self.store.ids_path}.partial"),
+            'hashes': _AppendableNpy(f"{self.store.hashes_path}.partial"),
+        }
+        self._targets = {
+            'vectors': self.store.file_path,
+            'ids': self.store.ids_path,
+            'hashes': self.store.hashes_path,
+        }
+        self.staged_header_path = f"{self.store.header_path}.partial"
+        
+        if resume_rows > 0:
+            for appendable in self._files.values():
+                appendable.reopen(resume_rows)
+            self.rows = resume_rows
+    
+    def append(self, vectors: np.ndarray, mal_ids: Sequence[int],
+               text_hashes: np.ndarray) -> None:
+        """
+        追加一段向量
+        
+        Args:
+            vectors: 向量陣列
+            mal_ids: 與向量逐列對齊的 MAL_ID
+            text_hashes: 與向量逐列對齊的來源文本雜湊
+        """
+        ids = np.asarray(mal_ids, dtype=np.int64)
+        if not (len(vectors) == len(ids) == len(text_hashes)):
+            raise ValueError("向量、MAL_ID 與文本雜湊的數量不一致")
+        
+        self._files['vectors'].append(np.ascontiguousarray(vectors))
+        self._files['ids'].append(ids)
+        self._files['hashes'].append(np.asarray(text_hashes, dtype="S16"))
+        self.rows += len(ids)
+    
+    def flush(self) -> None:
+        """將已追加的資料寫入磁碟並更新暫存檔標頭"""
+        for appendable in self._files.values():
+            appendable.flush()
+    
+    def finalize(self) -> Dict[str, Any]:
+        """
+        完成寫入：檢查資料、計算內容雜湊，並以暫存檔替換正式檔案
+        
+        Returns:
+            寫入的標頭
+        """
+        self.flush()
+        for appendable in self._files.values():
+            appendable.close()
+        
+        if self.rows == 0:
+            raise ValueError("沒有寫入任何向量")
+        
+        embeddings = np.load(self._files['vectors'].path, mmap_mode="r")
+        ids = np.load(self._files['ids'].path, mmap_mode="r")
+        if len(np.unique(ids)) != len(ids):
+            raise ValueError("MAL_ID 含有重複值")
+        
+        header = {
+            'format_version': STORE_FORMAT_VERSION,
+            'model_name': self.model_name,
+            'dimension': int(embeddings.shape[1]),
+            'dtype': embeddings.dtype.str,
+            'count': int(embeddings.shape[0]),
+            'content_hash': EmbeddingStore._content_hash(embeddings, ids),
+            'has_text_hashes': True,
+        }
+        del embeddings, ids
+        
+        directory = os.path.dirname(self.store.file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        # 暫存標頭寫入後所有暫存檔皆已完整，之後的替換中斷時可由 commit_staged 完成
+        atomic_write_json(self.staged_header_path, header)
+        return self.commit_staged()
+    
+    def has_staged(self) -> bool:
+        """
+        檢查是否有 finalize 途中中斷、尚未替換完成的暫存檔
+        
+        Returns:
+            暫存標頭是否存在
+        """
+        return os.path.exists(self.staged_header_path)
+    
+    def commit_staged(self) -> Dict[str, Any]:
+        """
+        將 finalize 已準備好的暫存檔替換為正式檔案，最後才替換標頭 (可重複執行)
+        
+        Returns:
+            寫入的標頭
+        """
+        with open(self.staged_header_path, "r", encoding="utf-8") as f:
+            header = json.load(f)
+        
+        for key, appendable in self._files.items():
+            if os.path.exists(appendable.path):
+                os.replace(appendable.path, self._targets[key])
+        os.replace(self.staged_header_path, self.store.header_path)
+        
+        self.rows = header['count']
+        self.store.header = header
+        print(f"向量儲存已寫入: {self.store.file_path} ({header['count']} 筆, {header['dimension']} 維)")
+        return header
+
+
+class _AppendableNpy:
+    """保留固定長度標頭、可在檔尾追加列並原地更新筆數的 .npy 檔"""
+    
+    def __init__(self, path: str):
+        """
+        Args:
+            path: 檔案路徑
+        """
+        self.path = path
+        self.file = None
+        self.dtype = None
+        self.row_shape = None
+        self.rows = 0
+    
+    def reopen(self, keep_rows: int) -> None:
+        """
+        開啟既有檔案並截斷至指定筆數
+        
+        Args:
+            keep_rows: 保留的筆數
+        """
+        existing = np.load(self.path, mmap_mode="r")
+        if len(existing) < keep_rows:
+            raise ValueError(f"暫存檔 {self.path} 只有 {len(existing)} 筆，無法從第 {keep_rows} 筆續寫")
+        self.dtype = existing.dtype
+        self.row_shape = existing.shape[1:]
+        del existing
+        
+        self.file = open(self.path, "r+b")
+        self.rows = keep_rows
+        self.file.truncate(_APPENDABLE_HEADER_SIZE + keep_rows * self._row_bytes())
+        self.flush()
+    
+    def append(self, array: np.ndarray) -> None:
+        """
+        在檔尾追加列
+        
+        Args:
+            array: 要追加的陣列
+        """
+        if self.file is None:
+            self.dtype = array.dtype
+            self.row_shape = array.shape[1:]
+            self.file = open(self.path, "w+b")
+            self.file.write(self._header())
+        elif array.dtype != self.dtype or array.shape[1:] != self.row_shape:
+            raise ValueError(
+                f"追加的資料 ({array.dtype}, {array.shape[1:]}) 與既有資料 "
+                f"({self.dtype}, {self.row_shape}) 不一致"
+            )
+        
+        self.file.seek(0, os.SEEK_END)
+        self.file.write(np.ascontiguousarray(array).tobytes())
+        self.rows += len(array)
+    
+    def flush(self) -> None:
+        """更新標頭中的筆數並同步到磁碟"""
+        if self.file is None:
+            return
+        self.file.seek(0)
+        self.file.write(self._header())
+        self.file.flush()
+        os.fsync(self.file.fileno())
+    
+    def close(self) -> None:
+        """關閉檔案"""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+    
+    def _row_bytes(self) -> int:
+        """單列資料的位元組數"""
+        return int(np.prod(self.row_shape, dtype=np.int64)) * self.dtype.itemsize
+    
+    def _header(self) -> bytes:
+        """產生固定長度的 .npy 1.0 標頭"""
+        shape = (self.rows,) + tuple(self.row_shape)
+        header = "{'descr': %r, 'fortran_order': False, 'shape': %r, }" % (
+            np.lib.format.dtype_to_descr(self.dtype), shape
+        )
+        padding = _APPENDABLE_HEADER_SIZE - 10 - len(header) - 1
+        if padding < 0:
+            raise ValueError("陣列形狀過長，無法寫入固定長度標頭")
+        header = (header + " " * padding + "\n").encode("latin1")
+        return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header
@@ -0,0 +1,200 @@
+"""
+串流匯入模組 - 以分塊方式完成 讀取 → 篩選 → 向量化 → 寫入向量儲存 → 上傳 的流程
+"""
+
+import json
+import os
+import numpy as np
+from typing import Any, Dict, Optional
+from data_processor import AnimeDataProcessor
+from embedding_generator import EmbeddingGenerator
+from embedding_store import EmbeddingStoreWriter, atomic_write_json
+from config import EMBEDDINGS_PATH, COLLECTION_NAME, INGEST_CHUNK_SIZE, EMBEDDING_STORE_DTYPE
+
+
+class StreamingIngestPipeline:
+    """
+    串流匯入流程
+    
+    每個 CSV 分塊處理完後都會寫入檢查點，程式中斷後重新執行即可從最後完成的分塊續跑；
+    向量儲存替換完成後檢查點會標記為 finalized，之後中斷時續跑只需完成別名切換。
+    記憶體用量只與分塊大小相關，不隨資料總量成長。
+    """
+    
+    def __init__(self,
+                 data_processor: Optional[AnimeDataProcessor] = None,
+                 embedding_generator: Optional[EmbeddingGenerator] = None,
+                 qdrant_manager=None,
+                 file_path: str = EMBEDDINGS_PATH,
+                 chunk_size: int = INGEST_CHUNK_SIZE,
+                 alias_name: str = COLLECTION_NAME):
+        """
+        初始化串流匯入流程
+        
+        Args:
+            data_processor: 資料處理器
+            embedding_generator: 向量生成器
+            qdrant_manager: Qdrant 管理器，None 表示只寫入向量儲存不上傳
+            file_path: 向量儲存路徑
+            chunk_size: 每個分塊讀取的 CSV 列數
+            alias_name: 匯入完成後要切換的集合別名
+        """
+        self.data_processor = data_processor or AnimeDataProcessor()
+        self.embedding_generator = embedding_generator or EmbeddingGenerator()
+        self.qdrant_manager = qdrant_manager
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        self.alias_name = alias_name
+        self.checkpoint_path = f"{file_path}.checkpoint.json"
+    
+    def run(self, resume: bool = True) -> Dict[str, Any]:
+        """
+        執行串流匯入
+        
+        Args:
+            resume: 是否從既有檢查點續跑
+        
+        Returns:
+            匯入統計 (chunks, rows, collection)
+        """
+        state = self._load_checkpoint() if resume else None
+        resumed = state is not None
+        if resumed:
+            if state['chunk_size'] != self.chunk_size:
+                raise ValueError(
+                    f"檢查點的分塊大小 ({state['chunk_size']}) 與目前設定 ({self.chunk_size}) 不同，"
+                    "請使用相同設定續跑或以 resume=False 重新匯入"
+                )
+            if state['model_name'] != self.embedding_generator.model_name:
+                raise ValueError(
+                    f"檢查點由模型 '{state['model_name']}' 產生，與目前模型不同，請以 resume=False 重新匯入"
+                )
+            print(f"從檢查點續跑: 已完成 {state['chunks_done']} 個分塊、{state['rows_written']} 筆向量")
+        else:
+            state = {
+                'chunk_size': self.chunk_size,
+                'model_name': self.embedding_generator.model_name,
+                'chunks_done': 0,
+                'rows_written': 0,
+                'collection': None,
+                'finalized': False,
+            }
+        
+        if not state.get('finalized'):
+            self._write_store(state, resumed)
+        
+        if self.qdrant_manager is not None and state['collection'] is not None:
+            self.qdrant_manager.switch_alias(state['collection'], self.alias_name)
+        
+        os.remove(self.checkpoint_path)
+        print(f"串流匯入完成: {state['chunks_done']} 個分塊、{state['rows_written']} 筆向量")
+        return {
+            'chunks': state['chunks_done'],
+            'rows': state['rows_written'],
+            'collection': state['collection'],
+        }
+    
+    def _write_store(self, state: Dict[str, Any], resumed: bool) -> None:
+        """
+        處理剩餘的分塊並完成向量儲存，完成後在檢查點標記 finalized
+        
+        Args:
+            state: 檢查點狀態
+            resumed: 是否從檢查點續跑
+        """
+        writer = EmbeddingStoreWriter(self.file_path, model_name=self.embedding_generator.model_name)
+        if writer.has_staged() and not resumed:
+            # 重新匯入時捨棄先前中斷的匯入留下的暫存標頭
+            os.remove(writer.staged_header_path)
+        if writer.has_staged():
+            # 上次在替換正式檔案途中中斷，暫存檔可能已部分替換，只需完成剩餘的替換
+            print("完成上次中斷的向量儲存替換")
+            writer.commit_staged()
+        else:
+            if state['rows_written'] > 0:
+                writer = EmbeddingStoreWriter(
+                    self.file_path,
+                    model_name=self.embedding_generator.model_name,
+                    resume_rows=state['rows_written']
+                )
+            
+            chunks = self.data_processor.iter_processed_chunks(
+                self.chunk_size, skip_chunks=state['chunks_done']
+            )
+            for chunk in chunks:
+                if len(chunk) > 0:
+                    self._process_chunk(chunk, writer, state)
+                
+                state['chunks_done'] += 1
+                state['rows_written'] = writer.rows
+                self._save_checkpoint(state)
+            
+            self.embedding_generator.close()
+            writer.finalize()
+        
+        state['finalized'] = True
+        self._save_checkpoint(state)
+    
+    def _process_chunk(self, chunk, writer: EmbeddingStoreWriter,
+                       state: Dict[str, Any]) -> None:
+        """
+        向量化單一分塊，追加至向量儲存並上傳
+        
+        Args:
+            chunk: 篩選後的分塊 DataFrame
+            writer: 向量儲存寫入器
+            state: 檢查點狀態
+        """
+        texts = chunk.sypnopsis.tolist()
+        mal_ids = chunk.MAL_ID.to_numpy()
+        vectors = self.embedding_generator.generate_embeddings(texts)
+        hashes = np.array([self.embedding_generator.text_hash(text) for text in texts], dtype="S16")
+        
+        writer.append(vectors.astype(EMBEDDING_STORE_DTYPE, copy=False), mal_ids, hashes)
+        writer.flush()
+        
+        if self.qdrant_manager is None:
+            return
+        
+        if state['collection'] is None:
+            state['collection'] = self.qdrant_manager.create_versioned_collection(
+                self.alias_name, vector_size=vectors.shape[1]
+            )
+            self._save_checkpoint(state)
+        
+        # 上傳以 MAL_ID 為資料點 ID，重跑同一分塊不會產生重複資料
+        self.qdrant_manager.batch_upsert(
+            vectors,
+            self.data_processor.build_metadata(chunk),
+            collection_name=state['collection'],
+            add_content_hash=True
+        )
+    
+    def _load_checkpoint(self) -> Optional[Dict[str, Any]]:
+        """
+        載入檢查點
+        
+        Returns:
+            檢查點狀態，不存在時回傳 None
+        """
+        if not os.path.exists(self.checkpoint_path):
+            return None
+        with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    
+    def _save_checkpoint(self, state: Dict[str, Any]) -> None:
+        """
+        以原子替換方式寫入檢查點
+        
+        Args:
+            state: 檢查點狀態
+        """
+        atomic_write_json(self.checkpoint_path, state)
+
+
+if __name__ == "__main__":
+    from qdrant_manager import QdrantManager
+    
+    pipeline = StreamingIngestPipeline(qdrant_manager=QdrantManager())
+    stats = pipeline.run()
+    print(f"\n匯入完成！{stats}")
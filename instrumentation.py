@@ -0,0 +1,485 @@
+"""
+效能量測模組 - 以具名區段 (span) 記錄各階段耗時的直方圖與計數器，支援多種匯出格式與單一請求的效能剖析
+
+停用時 (預設) span() 回傳共用的空區段、increment() 直接返回，額外成本只有一次屬性檢查。
+"""
+
+import bisect
+import cProfile
+import functools
+import io
+import json
+import pstats
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from config import METRICS_ENABLED, METRICS_BUCKETS_MS, PROFILE_SAMPLE_INTERVAL
+
+
+class Histogram:
+    """固定邊界的延遲直方圖 (毫秒)，百分位數以桶內線性內插估計"""
+    
+    def __init__(self, buckets: Sequence[float] = METRICS_BUCKETS_MS):
+        """
+        初始化直方圖
+        
+        Args:
+            buckets: 遞增的桶上界 (毫秒)，超過最後一個上界的值計入 +Inf 桶
+        """
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+    
+    def observe(self, value: float) -> None:
+        """
+        記錄一個值
+        
+        Args:
+            value: 耗時 (毫秒)
+        """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+    
+    def percentile(self, q: float) -> float:
+        """
+        估計百分位數
+        
+        Args:
+            q: 百分位 (0 到 100)
+        
+        Returns:
+            估計值 (毫秒)，沒有資料時為 0
+        """
+        if self.count == 0:
+            return 0.0
+        
+        target = self.count * q / 100
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count and cumulative + bucket_count >= target:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                fraction = (target - cumulative) / bucket_count
+                return min(lower + (upper - lower) * fraction, self.max)
+            cumulative += bucket_count
+        return self.max
+    
+    def summary(self) -> Dict[str, Any]:
+        """
+        取得摘要
+        
+        Returns:
+            次數、總和、平均、p50 / p95 / p99、最大值與各桶累計次數
+        """
+        cumulative, buckets = 0, []
+        for bound, bucket_count in zip(self.buckets + [float("inf")], self.counts):
+            cumulative += bucket_count
+            buckets.append((bound, cumulative))
+        return {
+            'count': self.count,
+            'sum_ms': self.sum,
+            'mean_ms': self.sum / self.count if self.count else 0.0,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'max_ms': self.max,
+            'buckets': buckets,
+        }
+
+
+class _NullSpan:
+    """停用時使用的空區段"""
+    
+    __slots__ = ()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """計時區段，結束時將耗時寫入同名直方圖"""
+    
+    __slots__ = ("metrics", "name", "start")
+    
+    def __init__(self, metrics: "Metrics", name: str):
+        self.metrics = metrics
+        self.name = name
+        self.start = 0.0
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.name, (time.perf_counter() - self.start) * 1000)
+        return False
+
+
+class Metrics:
+    """
+    計時與計數器登錄表
+    
+    區段名稱以點分隔階層，例如 "qdrant.search"、"recommender.setup.build_index"。
+    """
+    
+    def __init__(self, enabled: bool = METRICS_ENABLED,
+                 buckets: Sequence[float] = METRICS_BUCKETS_MS):
+        """
+        初始化登錄表
+        
+        Args:
+            enabled: 是否記錄
+            buckets: 直方圖的桶上界 (毫秒)
+        """
+        self.enabled = enabled
+        self.buckets = list(buckets)
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Dict[str, float] = {}
+        self.exporters: List["Exporter"] = []
+        self._lock = threading.Lock()
+    
+    def span(self, name: str):
+        """
+        建立計時區段 (with metrics.span("stage"): ...)
+        
+        Args:
+            name: 區段名稱
+        
+        Returns:
+            context manager
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+    
+    def timed(self, name: str) -> Callable:
+        """
+        函式裝飾器，以區段記錄每次呼叫的耗時
+        
+        Args:
+            name: 區段名稱
+        
+        Returns:
+            裝飾器
+        """
+        def decorator(func: Callable) -> Callable:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Span(self, name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+    
+    def observe(self, name: str, value_ms: float) -> None:
+        """
+        直接記錄一個耗時
+        
+        Args:
+            name: 直方圖名稱
+            value_ms: 耗時 (毫秒)
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(self.buckets)
+            histogram.observe(value_ms)
+    
+    def increment(self, name: str, value: float = 1) -> None:
+        """
+        增加計數器
+        
+        Args:
+            name: 計數器名稱
+            value: 增加量
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        取得目前所有直方圖與計數器
+        
+        Returns:
+            {'counters': {...}, 'histograms': {名稱: 摘要}}
+        """
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'histograms': {name: histogram.summary() for name, histogram in sorted(self.histograms.items())},
+            }
+    
+    def reset(self) -> None:
+        """清除所有記錄"""
+        with self._lock:
+            self.histograms = {}
+            self.counters = {}
+    
+    def add_exporter(self, exporter: "Exporter") -> None:
+        """
+        註冊匯出器
+        
+        Args:
+            exporter: 匯出器
+        """
+        self.exporters.append(exporter)
+    
+    def export(self) -> None:
+        """以所有已註冊的匯出器輸出目前的記錄"""
+        snapshot = self.snapshot()
+        for exporter in self.exporters:
+            exporter.export(snapshot)
+
+
+class Exporter(ABC):
+    """匯出器基底類別：format() 將記錄轉為文字，export() 輸出到 stream 或檔案"""
+    
+    def __init__(self, file_path: Optional[str] = None, stream=None):
+        """
+        初始化匯出器
+        
+        Args:
+            file_path: 輸出檔案 (每次覆寫)，None 表示輸出到 stream
+            stream: 輸出串流，預設為標準輸出
+        """
+        self.file_path = file_path
+        self.stream = stream
+    
+    @abstractmethod
+    def format(self, snapshot: Dict[str, Any]) -> str:
+        """
+        將記錄轉為文字
+        
+        Args:
+            snapshot: Metrics.snapshot() 的結果
+        
+        Returns:
+            輸出文字
+        """
+    
+    def export(self, snapshot: Dict[str, Any]) -> None:
+        """
+        輸出記錄
+        
+        Args:
+            snapshot: Metrics.snapshot() 的結果
+        """
+        text = self.format(snapshot)
+        if self.file_path is not None:
+            with open(self.file_path, "w", encoding="utf-8") as f:
+                f.write(text)
+        else:
+            (self.stream or sys.stdout).write(text)
+
+
+class LogExporter(Exporter):
+    """每個直方圖與計數器一行的日誌格式"""
+    
+    def format(self, snapshot: Dict[str, Any]) -> str:
+        lines = []
+        for name, summary in snapshot['histograms'].items():
+            lines.append(
+                f"[metrics] {name} count={summary['count']} mean={summary['mean_ms']:.3f}ms "
+                f"p50={summary['p50_ms']:.3f}ms p95={summary['p95_ms']:.3f}ms "
+                f"p99={summary['p99_ms']:.3f}ms max={summary['max_ms']:.3f}ms"
+            )
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f"[metrics] {name} total={value:g}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+class PrometheusExporter(Exporter):
+    """Prometheus 文字格式 (直方圖單位為秒，名稱中的點轉為底線)"""
+    
+    def __init__(self, file_path: Optional[str] = None, stream=None, prefix: str = "anime_"):
+        """
+        初始化匯出器
+        
+        Args:
+            file_path: 輸出檔案，None 表示輸出到 stream
+            stream: 輸出串流
+            prefix: 指標名稱前綴
+        """
+        super().__init__(file_path, stream)
+        self.prefix = prefix
+    
+    def _name(self, name: str) -> str:
+        return self.prefix + "".join(c if c.isalnum() else "_" for c in name)
+    
+    def format(self, snapshot: Dict[str, Any]) -> str:
+        lines = []
+        for name, value in sorted(snapshot['counters'].items()):
+            metric = self._name(name) + "_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value:g}")
+        for name, summary in snapshot['histograms'].items():
+            metric = self._name(name) + "_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            for bound, cumulative in summary['buckets']:
+                le = "+Inf" if bound == float("inf") else f"{bound / 1000:g}"
+                lines.append(f'{metric}_bucket{{le="{le}"}} {cumulative}')
+            lines.append(f"{metric}_sum {summary['sum_ms'] / 1000:g}")
+            lines.append(f"{metric}_count {summary['count']}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+class JSONExporter(Exporter):
+    """JSON 格式 (不含直方圖各桶)"""
+    
+    def format(self, snapshot: Dict[str, Any]) -> str:
+        histograms = {
+            name: {key: value for key, value in summary.items() if key != 'buckets'}
+            for name, summary in snapshot['histograms'].items()
+        }
+        return json.dumps({
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'counters': snapshot['counters'],
+            'histograms': histograms,
+        }, ensure_ascii=False, indent=2) + "\n"
+
+
+class SamplingProfiler:
+    """
+    取樣式效能剖析器
+    
+    背景執行緒每隔 interval 秒記錄目標執行緒的呼叫堆疊，
+    結果可輸出為 folded stacks 格式 (可直接交給 flamegraph.pl / speedscope)。
+    """
+    
+    def __init__(self, interval: float = PROFILE_SAMPLE_INTERVAL,
+                 thread_id: Optional[int] = None):
+        """
+        初始化剖析器
+        
+        Args:
+            interval: 取樣間隔 (秒)
+            thread_id: 要取樣的執行緒，None 表示呼叫 start() 的執行緒
+        """
+        self.interval = interval
+        self.thread_id = thread_id
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def start(self) -> None:
+        """開始取樣"""
+        if self.thread_id is None:
+            self.thread_id = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+    
+    def stop(self) -> None:
+        """停止取樣"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+    
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+    
+    def folded(self) -> str:
+        """
+        輸出 folded stacks 格式
+        
+        Returns:
+            每行 "堆疊;以;分號;分隔 次數"
+        """
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common())
+    
+    def report(self, top: int = 20) -> str:
+        """
+        輸出最常出現在堆疊頂端的函式
+        
+        Args:
+            top: 列出的數量
+        
+        Returns:
+            報告文字
+        """
+        total = sum(self.samples.values())
+        leaves = Counter()
+        for stack, count in self.samples.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        lines = [f"{total} 個樣本 (間隔 {self.interval * 1000:.1f} ms)"]
+        for name, count in leaves.most_common(top):
+            lines.append(f"{count / max(total, 1):7.1%}  {name}")
+        return "\n".join(lines)
+
+
+@contextmanager
+def profile(mode: str = "cprofile", top: int = 20, output: Optional[str] = None):
+    """
+    剖析一段程式 (通常為單一請求)，結束時印出報告
+    
+    with profile("cprofile"):
+        recommender.recommend_by_mal_id(1)
+    
+    Args:
+        mode: "cprofile" (確定性剖析，較精確但有額外成本) 或 "sampling" (取樣式，成本低)
+        top: 報告列出的函式數量
+        output: cprofile 模式寫入 .prof 檔；sampling 模式寫入 folded stacks 檔
+    
+    Yields:
+        結果字典，結束後 'report' 為報告文字
+    """
+    result: Dict[str, Any] = {}
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield result
+        finally:
+            profiler.disable()
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(top)
+            result['report'] = stream.getvalue()
+            if output:
+                profiler.dump_stats(output)
+    elif mode == "sampling":
+        profiler = SamplingProfiler()
+        profiler.start()
+        try:
+            yield result
+        finally:
+            profiler.stop()
+            result['report'] = profiler.report(top)
+            if output:
+                with open(output, "w", encoding="utf-8") as f:
+                    f.write(profiler.folded())
+    else:
+        raise ValueError(f"不支援的剖析模式: {mode}")
+    print(result['report'])
+
+
+# 全域登錄表，各模組共用
+metrics = Metrics()
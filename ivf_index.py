@@ -0,0 +1,310 @@
+"""
+IVF 近似搜尋模組 - 以 k-means 分群建立倒排列表，只掃描最接近查詢的數個群集
+"""
+
+import os
+import numpy as np
+from typing import List, Dict, Any, Optional
+from local_search import LocalSearchBackend
+from embedding_store import EmbeddingStore, atomic_write
+from quantization import kmeans, assign_clusters
+from config import (
+    IVF_INDEX_PATH, IVF_NLIST, IVF_NPROBE, IVF_TRAIN_SIZE, KMEANS_ITERATIONS,
+    IVF_FILTER_EXACT_FACTOR
+)
+
+INDEX_FORMAT_VERSION = 2
+
+
+class IVFSearchBackend(LocalSearchBackend):
+    """
+    IVF-flat 近似搜尋後端
+    
+    建立索引時以 k-means 將向量分為 nlist 個群集；搜尋時只計算與查詢最接近的
+    nprobe 個群集內向量的精確餘弦相似度。nprobe 越大 recall 越高、延遲也越高。
+    """
+    
+    def __init__(self, nlist: Optional[int] = IVF_NLIST,
+                 nprobe: int = IVF_NPROBE,
+                 train_size: int = IVF_TRAIN_SIZE,
+                 n_iter: int = KMEANS_ITERATIONS,
+                 index_path: Optional[str] = IVF_INDEX_PATH):
+        """
+        初始化 IVF 搜尋後端
+        
+        Args:
+            nlist: 群集數量，None 表示依資料量自動決定 (約 4 × √N)
+            nprobe: 每次搜尋掃描的群集數量
+            train_size: 訓練群集中心時抽樣的向量數量上限
+            n_iter: k-means 迭代次數
+            index_path: 索引檔案路徑，None 表示不儲存也不載入
+        """
+        super().__init__(quantization=None)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_size = train_size
+        self.n_iter = n_iter
+        self.index_path = index_path
+        self.centroids = None
+        self.lists: List[np.ndarray] = []
+        self.content_hash = None
+    
+    def build_index(self,
+                    embeddings: np.ndarray,
+                    metadata: List[Dict[str, Any]],
+                    force_rebuild: bool = False) -> None:
+        """
+        建立 IVF 索引；索引檔存在且向量內容雜湊與訓練參數一致時直接載入群集資訊，不重新訓練
+        
+        Args:
+            embeddings: 向量陣列
+            metadata: 元資料列表，需包含 MAL_ID 與 Name
+            force_rebuild: 是否強制重新訓練群集
+        """
+        super().build_index(embeddings, metadata)
+        # 與向量儲存標頭的 content_hash 計算方式相同 (儲存為正規化 float32 時兩者一致)
+        self.content_hash = EmbeddingStore._content_hash(self.vectors, self.ids)
+        
+        if not force_rebuild and self.index_path and os.path.exists(self.index_path):
+            try:
+                self.load(self.index_path)
+                return
+            except ValueError as e:
+                print(f"既有 IVF 索引無法使用 ({e})，將重新訓練")
+        
+        self.train()
+        if self.index_path:
+            self.save(self.index_path)
+    
+    def train(self) -> None:
+        """以目前的向量訓練群集中心並建立倒排列表"""
+        count = len(self.vectors)
+        nlist = self.nlist or max(1, int(4 * np.sqrt(count)))
+        nlist = min(nlist, count)
+        print(f"訓練 IVF 索引: {count} 個向量，{nlist} 個群集")
+        
+        rng = np.random.default_rng(0)
+        sample = self.vectors[rng.choice(count, min(count, self.train_size), replace=False)]
+        centroids = kmeans(sample, nlist, n_iter=self.n_iter)
+        self.centroids = self._normalize(centroids)
+        
+        assignments = self._assign(self.vectors)
+        order = np.argsort(assignments, kind="stable")
+        boundaries = np.searchsorted(assignments[order], np.arange(nlist + 1))
+        self.lists = [order[boundaries[c]:boundaries[c + 1]] for c in range(nlist)]
+        
+        sizes = np.diff(boundaries)
+        print(f"IVF 索引建立完成，群集大小 平均 {sizes.mean():.1f}、最大 {sizes.max()}")
+    
+    def add_items(self, embeddings: np.ndarray, metadata: List[Dict[str, Any]]) -> None:
+        """
+        增量加入向量 (不重新訓練群集中心)；已存在的 MAL_ID 會以新向量取代
+        
+        Args:
+            embeddings: 向量陣列
+            metadata: 元資料列表，需包含 MAL_ID 與 Name
+        """
+        if self.centroids is None:
+            raise ValueError("請先建立索引")
+        if len(embeddings) != len(metadata):
+            raise ValueError(
+                f"向量數量 ({len(embeddings)}) 與元資料數量 ({len(metadata)}) 不一致"
+            )
+        
+        vectors = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        assignments = self._assign(vectors)
+        
+        # 已存在的 MAL_ID 先從原本的群集移除並原地更新向量
+        new_rows = []
+        updated_rows = []
+        for position, meta in enumerate(metadata):
+            row = self.id_to_row.get(int(meta['MAL_ID']))
+            if row is None:
+                new_rows.append(position)
+            else:
+                updated_rows.append((row, position))
+        
+        if updated_rows:
+            # 記憶體映射的向量為唯讀，需先複製
+            self.vectors = np.array(self.vectors, dtype=np.float32)
+            moved = {row for row, _ in updated_rows}
+            self.lists = [rows[~np.isin(rows, list(moved))] for rows in self.lists]
+            for row, position in updated_rows:
+                self.vectors[row] = vectors[position]
+                self.names[row] = metadata[position].get('Name', "")
+            self.payloads.update(
+                [row for row, _ in updated_rows],
+                [metadata[position] for _, position in updated_rows]
+            )
+        
+        start = len(self.vectors)
+        if new_rows:
+            self.vectors = np.concatenate([self.vectors, vectors[new_rows]])
+            self.ids = np.concatenate([
+                self.ids,
+                np.array([int(metadata[p]['MAL_ID']) for p in new_rows], dtype=np.int64)
+            ])
+            for offset, position in enumerate(new_rows):
+                self.names.append(metadata[position].get('Name', ""))
+                self.id_to_row[int(metadata[position]['MAL_ID'])] = start + offset
+            self.payloads.extend([metadata[position] for position in new_rows])
+        
+        rows = np.array(
+            [row for row, _ in updated_rows] + list(range(start, start + len(new_rows))),
+            dtype=np.int64
+        )
+        positions = np.array([p for _, p in updated_rows] + new_rows, dtype=np.int64)
+        for cluster in np.unique(assignments[positions]):
+            self.lists[cluster] = np.concatenate(
+                [self.lists[cluster], rows[assignments[positions] == cluster]]
+            )
+        print(f"IVF 索引已新增 {len(new_rows)} 筆、更新 {len(updated_rows)} 筆")
+        
+        # 保存增量結果，重新啟動時若向量儲存已包含相同的更新即可直接載入，不需重新訓練
+        self.content_hash = EmbeddingStore._content_hash(self.vectors, self.ids)
+        if self.index_path:
+            self.save(self.index_path)
+    
+    def save(self, file_path: str) -> None:
+        """
+        儲存群集中心、倒排列表、向量內容雜湊與訓練參數
+        
+        Args:
+            file_path: 索引檔案路徑 (.npz)
+        """
+        sizes = np.array([len(rows) for rows in self.lists], dtype=np.int64)
+        directory = os.path.dirname(file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        atomic_write(file_path, lambda f: np.savez(
+            f,
+            centroids=self.centroids,
+            list_offsets=np.concatenate([[0], np.cumsum(sizes)]),
+            list_rows=np.concatenate(self.lists) if self.lists else np.empty(0, dtype=np.int64),
+            ids=self.ids,
+            format_version=INDEX_FORMAT_VERSION,
+            content_hash=self.content_hash or "",
+            train_params=self._train_params(),
+        ))
+        print(f"IVF 索引已儲存至: {file_path}")
+    
+    def load(self, file_path: str) -> None:
+        """
+        載入群集中心與倒排列表 (需先以相同的向量呼叫 LocalSearchBackend.build_index)
+        
+        Args:
+            file_path: 索引檔案路徑 (.npz)
+        
+        Raises:
+            ValueError: 格式版本、MAL_ID、向量內容或訓練參數與目前設定不一致
+        """
+        with np.load(file_path) as data:
+            if 'format_version' not in data or int(data['format_version']) != INDEX_FORMAT_VERSION:
+                raise ValueError("索引格式版本不符")
+            if not np.array_equal(data['ids'], self.ids):
+                raise ValueError("索引的 MAL_ID 與目前資料不一致")
+            if self.content_hash is not None and str(data['content_hash']) != self.content_hash:
+                raise ValueError("索引訓練時的向量內容與目前資料不一致")
+            if not np.array_equal(data['train_params'], self._train_params()):
+                raise ValueError("索引的訓練參數 (nlist、train_size、n_iter) 已變更")
+            offsets = data['list_offsets']
+            rows = data['list_rows']
+            self.centroids = data['centroids']
+        
+        self.lists = [rows[offsets[c]:offsets[c + 1]] for c in range(len(offsets) - 1)]
+        print(f"IVF 索引載入完成: {len(self.lists)} 個群集")
+    
+    def _train_params(self) -> np.ndarray:
+        """
+        取得影響群集訓練結果的參數 (nlist 為 None 時記為 0)
+        
+        Returns:
+            [nlist, train_size, n_iter]
+        """
+        return np.array([self.nlist or 0, self.train_size, self.n_iter], dtype=np.int64)
+    
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        將向量指派給最接近的群集
+        
+        Args:
+            vectors: 已正規化的向量矩陣
+        
+        Returns:
+            群集索引陣列
+        """
+        return assign_clusters(vectors, self.centroids)
+    
+    def _search_top_k(self, queries: np.ndarray, limit: int,
+                      mask: Optional[np.ndarray] = None):
+        """
+        只掃描最接近的 nprobe 個群集取得 top-k
+        
+        有篩選條件時：符合條件的向量很少 (不超過 IVF_FILTER_EXACT_FACTOR × nprobe 個群集的
+        平均筆數) 時直接精確掃描這些向量；否則依篩選比例放大 nprobe (比例為 s 時掃描 nprobe / s 個群集)，
+        讓掃描到的符合條件向量數量與不篩選時相當，若仍不足 limit 個再繼續掃描下一個群集。
+        
+        Args:
+            queries: 已 L2 正規化的查詢矩陣
+            limit: 每個查詢回傳結果數量
+            mask: 篩選遮罩，None 表示不篩選
+        
+        Returns:
+            (每個查詢的位置陣列列表, 每個查詢的分數陣列列表)
+        """
+        if self.centroids is None:
+            raise ValueError("請先建立索引")
+        
+        nprobe = min(self.nprobe, len(self.lists))
+        if mask is not None:
+            matched = np.flatnonzero(mask)
+            probed_rows = nprobe * len(self.vectors) / len(self.lists)
+            if len(matched) <= IVF_FILTER_EXACT_FACTOR * probed_rows:
+                # 只掃描前幾個群集會漏掉散落在其他群集的符合條件向量，精確掃描的成本也不高
+                rows, scores = self._top_k(queries @ self.vectors[matched].T, limit)
+                return list(matched[rows]), list(scores)
+            selectivity = len(matched) / len(self.vectors)
+            nprobe = min(len(self.lists), int(np.ceil(nprobe / selectivity)))
+        
+        centroid_scores = queries @ self.centroids.T
+        if mask is None:
+            probes, _ = self._top_k(centroid_scores, nprobe)
+        else:
+            probes = np.argsort(-centroid_scores, axis=1, kind="stable")
+        
+        top_rows, top_scores = [], []
+        for query, clusters in zip(queries, probes):
+            if mask is None:
+                candidates = np.concatenate([self.lists[c] for c in clusters])
+            else:
+                candidates = self._filtered_candidates(clusters, nprobe, limit, mask)
+            rows, scores = self._top_k((self.vectors[candidates] @ query)[None, :], limit)
+            top_rows.append(candidates[rows[0]])
+            top_scores.append(scores[0])
+        return top_rows, top_scores
+    
+    def _filtered_candidates(self, clusters: np.ndarray, nprobe: int,
+                             limit: int, mask: np.ndarray) -> np.ndarray:
+        """
+        依序掃描群集並只保留符合條件的列，至少掃描 nprobe 個群集且湊滿 limit 個候選
+        
+        Args:
+            clusters: 依與查詢的相似度排序的群集編號
+            nprobe: 至少掃描的群集數量
+            limit: 需要的候選數量
+            mask: 篩選遮罩
+        
+        Returns:
+            候選列索引
+        """
+        parts = []
+        found = 0
+        for probed, cluster in enumerate(clusters):
+            if probed >= nprobe and found >= limit:
+                break
+            rows = self.lists[cluster]
+            rows = rows[mask[rows]]
+            parts.append(rows)
+            found += len(rows)
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
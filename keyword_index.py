@@ -0,0 +1,279 @@
+"""
+關鍵字索引模組 - 以 BM25 倒排索引搜尋簡介與名稱，並以倒數排名融合 (RRF) 合併關鍵字與向量搜尋結果
+"""
+
+import json
+import os
+import re
+import time
+import numpy as np
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+from embedding_store import atomic_write, atomic_write_json
+from config import KEYWORD_INDEX_PATH, BM25_K1, BM25_B, KEYWORD_NAME_WEIGHT, HYBRID_RRF_K
+
+INDEX_FORMAT_VERSION = 1
+TOKEN_PATTERN = re.compile(r"\w+")
+# 幾乎每篇簡介都會出現的詞，posting 很長卻幾乎不影響排序
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have he her his in into is it its of on or "
+    "she that the their them they this to was were which while who will with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    將文字切成小寫詞 (略過停用詞)
+    
+    Args:
+        text: 文字
+    
+    Returns:
+        詞列表
+    """
+    return [token for token in TOKEN_PATTERN.findall(str(text).lower()) if token not in STOPWORDS]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]],
+                           limit: int,
+                           k: int = HYBRID_RRF_K) -> List[Tuple[int, float]]:
+    """
+    以倒數排名融合合併多個排序結果 (每個項目的分數為各排序中 1 / (k + 名次) 的總和)
+    
+    Args:
+        rankings: MAL_ID 排序列表 (由最相關到最不相關)
+        limit: 回傳數量
+        k: 平滑常數，越大則各排序的前幾名差距越小
+    
+    Returns:
+        (MAL_ID, 融合分數) 列表，依分數由高到低排列
+    """
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, mal_id in enumerate(ranking, 1):
+            scores[mal_id] = scores.get(mal_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+
+class KeywordIndex:
+    """
+    BM25 倒排索引
+    
+    每個詞的 posting 依詞編號連續存放在同一個陣列中，並預先計算好 BM25 分數，
+    查詢時只需取出查詢詞的 posting 區段相加，不需掃描整個目錄。
+    儲存為一個目錄：
+        header.json     標頭 (筆數、平均長度、BM25 參數、來源雜湊)
+        terms.json      詞表 (第 i 個詞的編號為 i)
+        offsets.npy     每個詞的 posting 起訖位置 (int64，長度為詞數 + 1)
+        rows.npy        posting 的列索引 (int32)
+        weights.npy     posting 的 BM25 分數 (float32)
+        ids.npy         每一列對應的 MAL_ID (int64)
+    """
+    
+    def __init__(self, file_path: Optional[str] = KEYWORD_INDEX_PATH,
+                 k1: float = BM25_K1,
+                 b: float = BM25_B,
+                 name_weight: int = KEYWORD_NAME_WEIGHT):
+        """
+        初始化關鍵字索引
+        
+        Args:
+            file_path: 索引目錄路徑，None 表示只保留在記憶體中
+            k1: BM25 詞頻飽和參數
+            b: BM25 長度正規化參數
+            name_weight: 名稱中的詞計入詞頻的倍數
+        """
+        self.file_path = file_path
+        self.k1 = k1
+        self.b = b
+        self.name_weight = name_weight
+        self.header = None
+        self.vocabulary: Dict[str, int] = {}
+        self.offsets = None
+        self.rows = None
+        self.weights = None
+        self.ids = None
+    
+    def build(self,
+              mal_ids: Sequence[int],
+              names: Sequence[str],
+              synopses: Sequence[str],
+              source_hash: Optional[str] = None) -> Dict[str, object]:
+        """
+        建立索引 (file_path 不為 None 時一併寫入磁碟)
+        
+        Args:
+            mal_ids: MAL_ID 序列
+            names: 與 mal_ids 對齊的名稱
+            synopses: 與 mal_ids 對齊的簡介
+            source_hash: 來源資料的雜湊，用於載入時確認索引未過期
+        
+        Returns:
+            索引標頭
+        """
+        start_time = time.perf_counter()
+        ids = np.asarray(mal_ids, dtype=np.int64)
+        vocabulary: Dict[str, int] = {}
+        term_ids: List[int] = []
+        rows: List[int] = []
+        frequencies: List[int] = []
+        lengths = np.zeros(len(ids), dtype=np.float32)
+        
+        for row, (name, synopsis) in enumerate(zip(names, synopses)):
+            counts = Counter(tokenize(synopsis))
+            for token in tokenize(name):
+                counts[token] += self.name_weight
+            lengths[row] = sum(counts.values())
+            for token, count in counts.items():
+                term_ids.append(vocabulary.setdefault(token, len(vocabulary)))
+                rows.append(row)
+                frequencies.append(count)
+        
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        order = np.argsort(term_ids, kind="stable")
+        term_ids = term_ids[order]
+        posting_rows = np.asarray(rows, dtype=np.int32)[order]
+        tf = np.asarray(frequencies, dtype=np.float32)[order]
+        
+        count = len(ids)
+        document_frequency = np.bincount(term_ids, minlength=len(vocabulary))
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(document_frequency, out=offsets[1:])
+        
+        # 預先計算每個 posting 的 BM25 分數
+        average_length = float(lengths.mean()) if count else 0.0
+        idf = np.log1p((count - document_frequency + 0.5) / (document_frequency + 0.5)).astype(np.float32)
+        norm = self.k1 * (1 - self.b + self.b * lengths[posting_rows] / max(average_length, 1e-9))
+        weights = (idf[term_ids] * tf * (self.k1 + 1) / (tf + norm)).astype(np.float32)
+        
+        self.header = {
+            'format_version': INDEX_FORMAT_VERSION,
+            'count': count,
+            'terms': len(vocabulary),
+            'postings': int(len(posting_rows)),
+            'average_length': average_length,
+            'k1': self.k1,
+            'b': self.b,
+            'name_weight': self.name_weight,
+            'source_hash': source_hash,
+        }
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.rows = posting_rows
+        self.weights = weights
+        self.ids = ids
+        
+        if self.file_path is not None:
+            self._save()
+        print(f"關鍵字索引建立完成: {count} 筆，{len(vocabulary)} 個詞，"
+              f"{len(posting_rows)} 個 posting ({time.perf_counter() - start_time:.2f} 秒)")
+        return self.header
+    
+    def _save(self) -> None:
+        """將索引寫入 file_path (標頭最後寫入)"""
+        os.makedirs(self.file_path, exist_ok=True)
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        arrays = {
+            'offsets.npy': self.offsets,
+            'rows.npy': self.rows,
+            'weights.npy': self.weights,
+            'ids.npy': self.ids,
+        }
+        for name, array in arrays.items():
+            atomic_write(os.path.join(self.file_path, name), lambda f: np.save(f, array))
+        atomic_write_json(os.path.join(self.file_path, "terms.json"), terms, indent=None)
+        atomic_write_json(os.path.join(self.file_path, "header.json"), self.header)
+        print(f"關鍵字索引已寫入: {self.file_path}")
+    
+    def load(self, mmap_mode: Optional[str] = "r",
+             source_hash: Optional[str] = None) -> None:
+        """
+        載入索引
+        
+        Args:
+            mmap_mode: 傳給 np.load 的 mmap_mode，None 表示完整讀入記憶體
+            source_hash: 若指定，檢查索引是否由相同的來源資料建立
+        
+        Raises:
+            FileNotFoundError: 索引不存在
+            ValueError: 格式版本或來源雜湊不符
+        """
+        header_path = os.path.join(self.file_path, "header.json")
+        if not os.path.exists(header_path):
+            raise FileNotFoundError(f"找不到關鍵字索引: {self.file_path}")
+        
+        with open(header_path, "r", encoding="utf-8") as f:
+            header = json.load(f)
+        if header.get('format_version') != INDEX_FORMAT_VERSION:
+            raise ValueError(f"不支援的關鍵字索引格式版本: {header.get('format_version')}")
+        if source_hash is not None and header.get('source_hash') != source_hash:
+            raise ValueError("關鍵字索引與目前資料不一致")
+        if (header['k1'], header['b'], header['name_weight']) != (self.k1, self.b, self.name_weight):
+            raise ValueError("關鍵字索引的 BM25 參數已變更")
+        
+        with open(os.path.join(self.file_path, "terms.json"), "r", encoding="utf-8") as f:
+            terms = json.load(f)
+        
+        self.header = header
+        self.vocabulary = {term: index for index, term in enumerate(terms)}
+        self.offsets = np.load(os.path.join(self.file_path, "offsets.npy"), mmap_mode=mmap_mode)
+        self.rows = np.load(os.path.join(self.file_path, "rows.npy"), mmap_mode=mmap_mode)
+        self.weights = np.load(os.path.join(self.file_path, "weights.npy"), mmap_mode=mmap_mode)
+        self.ids = np.load(os.path.join(self.file_path, "ids.npy"))
+        print(f"關鍵字索引載入完成: {header['count']} 筆，{header['terms']} 個詞")
+    
+    def __len__(self) -> int:
+        return len(self.ids) if self.ids is not None else 0
+    
+    def search(self, query: str, limit: int,
+               mask: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        以 BM25 搜尋
+        
+        Args:
+            query: 查詢文字
+            limit: 回傳數量
+            mask: 與索引列對齊的布林遮罩，只回傳為 True 的列
+        
+        Returns:
+            (MAL_ID, BM25 分數) 列表，依分數由高到低排列；沒有任何查詢詞在詞表中時為空列表
+        """
+        if self.ids is None:
+            raise ValueError("請先建立或載入關鍵字索引")
+        
+        term_ids = {self.vocabulary[token] for token in tokenize(query) if token in self.vocabulary}
+        if not term_ids:
+            return []
+        
+        spans = [(int(self.offsets[term]), int(self.offsets[term + 1])) for term in term_ids]
+        total = sum(end - start for start, end in spans)
+        if len(spans) == 1:
+            start, end = spans[0]
+            rows = np.asarray(self.rows[start:end])
+            scores = np.asarray(self.weights[start:end])
+        elif total * 8 < len(self.ids):
+            # posting 很短時只在出現查詢詞的列上累加，成本與 posting 長度成正比
+            all_rows = np.concatenate([self.rows[start:end] for start, end in spans])
+            all_weights = np.concatenate([self.weights[start:end] for start, end in spans])
+            rows, inverse = np.unique(all_rows, return_inverse=True)
+            scores = np.bincount(inverse, weights=all_weights).astype(np.float32)
+        else:
+            # 常見詞的 posting 很長時改用整個目錄大小的累加陣列 (同一個詞的 posting 列索引不重複)
+            accumulator = np.zeros(len(self.ids), dtype=np.float32)
+            for start, end in spans:
+                accumulator[self.rows[start:end]] += self.weights[start:end]
+            rows = np.flatnonzero(accumulator)
+            scores = accumulator[rows]
+        
+        if mask is not None:
+            # 先套用篩選再取前 limit 名，結果數量不會因篩選而少於 limit
+            keep = np.asarray(mask, dtype=bool)[rows]
+            rows, scores = rows[keep], scores[keep]
+        if len(scores) == 0 or limit <= 0:
+            return []
+        if len(scores) > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return list(zip(self.ids[rows[top]].tolist(), scores[top].astype(np.float32).tolist()))
@@ -0,0 +1,454 @@
+"""
+本地向量搜尋模組 - 以 NumPy 在程序內進行精確的餘弦相似度搜尋
+"""
+
+import mmap
+import numpy as np
+from typing import List, Dict, Any, Optional
+from search_backend import SearchBackend
+from quantization import create_quantizer
+from search_filter import SearchFilter, PayloadColumns
+from config import (
+    DEFAULT_SEARCH_LIMIT, SEARCH_BATCH_SIZE, LOCAL_QUANTIZATION, RESCORE_MULTIPLIER
+)
+
+
+class LocalSearchBackend(SearchBackend):
+    """以 NumPy 矩陣運算實作的本地精確搜尋後端"""
+    
+    def __init__(self, quantization: Optional[str] = LOCAL_QUANTIZATION,
+                 rescore: bool = True,
+                 rescore_multiplier: int = RESCORE_MULTIPLIER):
+        """
+        初始化本地搜尋後端
+        
+        Args:
+            quantization: 量化方式 (None、"float16"、"int8" 或 "pq")
+            rescore: 量化搜尋後是否以完整精度向量重新計分
+            rescore_multiplier: 重新計分的候選數量為 limit 的幾倍
+        """
+        self.quantization = quantization
+        self.rescore = rescore
+        self.rescore_multiplier = rescore_multiplier
+        self.quantizer = None
+        self.vectors = None
+        self.norms = None
+        self.ids = None
+        self.names = None
+        self.payloads = None
+        self.id_to_row = {}
+    
+    def build_index(self,
+                    embeddings: np.ndarray,
+                    metadata: List[Dict[str, Any]],
+                    force_rebuild: bool = False) -> None:
+        """
+        建立本地索引 (L2 正規化後的 float32 向量與 MAL_ID→列索引)
+        
+        使用量化時只保存壓縮碼與傳入的完整精度向量 (通常為向量儲存的記憶體映射，
+        未正規化時另存每列的範數)，重新計分只讀取候選列，不在記憶體中保留正規化副本。
+        
+        Args:
+            embeddings: 向量陣列
+            metadata: 元資料列表，需包含 MAL_ID 與 Name (篩選欄位 Genres、Score、Type、Episodes 可選)
+            force_rebuild: 本地索引每次皆重建，保留此參數以符合介面
+        """
+        if len(embeddings) != len(metadata):
+            raise ValueError(
+                f"向量數量 ({len(embeddings)}) 與元資料數量 ({len(metadata)}) 不一致"
+            )
+        
+        print(f"建立本地搜尋索引，共 {len(embeddings)} 個向量")
+        self.ids = np.array([int(meta['MAL_ID']) for meta in metadata], dtype=np.int64)
+        self.names = [meta.get('Name', "") for meta in metadata]
+        self.payloads = PayloadColumns(metadata)
+        self.id_to_row = {int(mal_id): row for row, mal_id in enumerate(self.ids)}
+        
+        self.quantizer = create_quantizer(self.quantization)
+        self.norms = None
+        if self.quantizer is None:
+            self.vectors = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        else:
+            # 保留原本的陣列 (記憶體映射時不轉型、不複製)
+            self.vectors = embeddings if isinstance(embeddings, np.ndarray) else np.asarray(embeddings)
+            norms = self._row_norms(self.vectors)
+            if not np.allclose(norms, 1.0, atol=1e-4):
+                norms[norms == 0] = 1.0
+                self.norms = norms
+            print(f"量化向量: {self.quantization}")
+            # 逐區塊正規化並編碼，不建立整個矩陣的正規化副本
+            self.quantizer.fit(self.vectors, self.norms)
+            self._release_pages()
+            print(f"量化完成，{self.vectors.nbytes / 1e6:.1f} MB → {self.quantizer.nbytes / 1e6:.1f} MB")
+        print("本地搜尋索引建立完成")
+    
+    def search_similar(self,
+                       mal_id: int,
+                       limit: int = DEFAULT_SEARCH_LIMIT,
+                       search_filter: Optional[SearchFilter] = None) -> List[Dict[str, Any]]:
+        """
+        搜尋相似動漫
+        
+        Args:
+            mal_id: 目標動漫的 MAL_ID
+            limit: 回傳結果數量
+            search_filter: 篩選條件，只在符合條件的向量中搜尋
+        
+        Returns:
+            相似動漫列表
+        """
+        row = self._get_row(int(mal_id))
+        if row is None:
+            raise ValueError(f"MAL_ID {mal_id} 在集合中不存在")
+        
+        return self._search_rows(self._row_vectors([row]), limit, search_filter)[0]
+    
+    def recommend_by_mal_ids(self,
+                             mal_ids: List[int],
+                             limit: int = DEFAULT_SEARCH_LIMIT,
+                             chunk_size: int = SEARCH_BATCH_SIZE,
+                             exclude_self: bool = False,
+                             search_filter: Optional[SearchFilter] = None) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        批次搜尋多個動漫的相似動漫 (以矩陣乘法一次計算整個批次)
+        
+        Args:
+            mal_ids: 目標動漫的 MAL_ID 列表
+            limit: 每個 MAL_ID 回傳結果數量
+            chunk_size: 每次矩陣乘法包含的查詢數量
+            exclude_self: 是否從結果中排除查詢動漫本身
+            search_filter: 篩選條件，只在符合條件的向量中搜尋
+        
+        Returns:
+            以 MAL_ID 為鍵的相似動漫列表字典 (不存在於索引中的 MAL_ID 不會出現)
+        """
+        if chunk_size <= 0:
+            raise ValueError("chunk_size 必須大於 0")
+        
+        mal_ids = list(dict.fromkeys(int(mal_id) for mal_id in mal_ids))
+        rows = {mal_id: self._get_row(mal_id) for mal_id in mal_ids}
+        
+        missing = [mal_id for mal_id, row in rows.items() if row is None]
+        if missing:
+            print(f"以下 MAL_ID 在集合中不存在，已略過: {missing}")
+        
+        found_ids = [mal_id for mal_id in mal_ids if rows[mal_id] is not None]
+        search_limit = limit + 1 if exclude_self else limit
+        
+        mask = self._filter_mask(search_filter)
+        results = {}
+        for start in range(0, len(found_ids), chunk_size):
+            chunk_ids = found_ids[start:start + chunk_size]
+            queries = self._row_vectors([rows[mal_id] for mal_id in chunk_ids])
+            
+            for mal_id, formatted in zip(chunk_ids, self._search_rows(queries, search_limit, mask=mask)):
+                if exclude_self:
+                    formatted = [r for r in formatted if r['MAL_ID'] != mal_id]
+                results[mal_id] = formatted[:limit]
+        
+        return results
+    
+    def recommend_by_profile(self,
+                             liked_ids: List[int],
+                             disliked_ids: Optional[List[int]] = None,
+                             limit: int = DEFAULT_SEARCH_LIMIT,
+                             search_filter: Optional[SearchFilter] = None) -> List[Dict[str, Any]]:
+        """
+        以喜歡與不喜歡的動漫向量平均值組成查詢向量，一次搜尋取得推薦
+        
+        Args:
+            liked_ids: 喜歡的動漫 MAL_ID 列表
+            disliked_ids: 不喜歡的動漫 MAL_ID 列表
+            limit: 回傳結果數量
+            search_filter: 篩選條件，只在符合條件的向量中搜尋
+        
+        Returns:
+            相似動漫列表 (不包含作為範例的動漫；不存在於索引中的 MAL_ID 會略過)
+        """
+        liked_ids = list(dict.fromkeys(int(mal_id) for mal_id in liked_ids))
+        disliked_ids = [mal_id for mal_id in dict.fromkeys(int(mal_id) for mal_id in disliked_ids or [])
+                        if mal_id not in liked_ids]
+        
+        liked_rows = [self._get_row(mal_id) for mal_id in liked_ids]
+        disliked_rows = [self._get_row(mal_id) for mal_id in disliked_ids]
+        missing = [mal_id for mal_id, row in zip(liked_ids + disliked_ids, liked_rows + disliked_rows)
+                   if row is None]
+        if missing:
+            print(f"以下 MAL_ID 在集合中不存在，已略過: {missing}")
+        liked_rows = [row for row in liked_rows if row is not None]
+        disliked_rows = [row for row in disliked_rows if row is not None]
+        if not liked_rows:
+            raise ValueError("喜歡的動漫皆不存在於集合中")
+        
+        query = self._row_vectors(liked_rows).mean(axis=0)
+        if disliked_rows:
+            query = 2 * query - self._row_vectors(disliked_rows).mean(axis=0)
+        query = self._normalize(query.reshape(1, -1))
+        
+        seeds = liked_rows + disliked_rows
+        mask = self._filter_mask(search_filter)
+        if mask is not None:
+            # 已有篩選遮罩時直接排除範例，不需多取結果
+            mask[seeds] = False
+            return self._search_rows(query, limit, mask=mask)[0]
+        
+        seed_ids = set(liked_ids + disliked_ids)
+        results = self._search_rows(query, limit + len(seeds))[0]
+        return [r for r in results if r['MAL_ID'] not in seed_ids][:limit]
+    
+    def get_vectors(self, mal_ids: List[int]) -> np.ndarray:
+        """
+        取得多個動漫的向量 (已 L2 正規化)
+        
+        Args:
+            mal_ids: MAL_ID 列表
+        
+        Returns:
+            與 mal_ids 順序對應的向量矩陣
+        """
+        rows = [self._get_row(int(mal_id)) for mal_id in mal_ids]
+        missing = [mal_id for mal_id, row in zip(mal_ids, rows) if row is None]
+        if missing:
+            raise ValueError(f"以下 MAL_ID 在集合中不存在: {missing}")
+        return self._row_vectors(rows)
+    
+    def search_by_vector(self,
+                         vector: np.ndarray,
+                         limit: int = DEFAULT_SEARCH_LIMIT,
+                         search_filter: Optional[SearchFilter] = None) -> List[Dict[str, Any]]:
+        """
+        以查詢向量搜尋相似動漫
+        
+        Args:
+            vector: 查詢向量
+            limit: 回傳結果數量
+            search_filter: 篩選條件，只在符合條件的向量中搜尋
+        
+        Returns:
+            相似動漫列表
+        """
+        return self.search_by_vectors(np.asarray(vector).reshape(1, -1), limit, search_filter)[0]
+    
+    def search_by_vectors(self,
+                          vectors: np.ndarray,
+                          limit: int = DEFAULT_SEARCH_LIMIT,
+                          search_filter: Optional[SearchFilter] = None) -> List[List[Dict[str, Any]]]:
+        """
+        以多個查詢向量批次搜尋相似動漫
+        
+        Args:
+            vectors: 查詢向量矩陣，形狀為 (查詢數量, 向量維度)
+            limit: 每個查詢回傳結果數量
+            search_filter: 篩選條件，只在符合條件的向量中搜尋
+        
+        Returns:
+            與查詢順序對應的相似動漫列表
+        """
+        queries = self._normalize(np.asarray(vectors, dtype=np.float32))
+        return self._search_rows(queries, limit, search_filter)
+    
+    def _search_rows(self, queries: np.ndarray, limit: int,
+                     search_filter: Optional[SearchFilter] = None,
+                     mask: Optional[np.ndarray] = None) -> List[List[Dict[str, Any]]]:
+        """
+        對已正規化的查詢矩陣計算餘弦相似度並取出 top-k
+        
+        Args:
+            queries: 已 L2 正規化的查詢矩陣
+            limit: 每個查詢回傳結果數量
+            search_filter: 篩選條件
+            mask: 已計算好的篩選遮罩 (批次查詢時共用，優先於 search_filter)
+        
+        Returns:
+            與查詢順序對應的相似動漫列表
+        """
+        if self.vectors is None:
+            raise ValueError("請先建立索引")
+        
+        if mask is None:
+            mask = self._filter_mask(search_filter)
+        top_rows, top_scores = self._search_top_k(queries, limit, mask)
+        
+        return [
+            [
+                {
+                    'MAL_ID': int(self.ids[row]),
+                    'Name': self.names[row],
+                    'Score': float(score)
+                }
+                for row, score in zip(rows, row_scores)
+                if score > -np.inf
+            ]
+            for rows, row_scores in zip(top_rows, top_scores)
+        ]
+    
+    def _search_top_k(self, queries: np.ndarray, limit: int,
+                      mask: Optional[np.ndarray] = None):
+        """
+        取得每個查詢的 top-k 列索引與分數 (子類別可覆寫以改變候選產生方式)
+        
+        Args:
+            queries: 已 L2 正規化的查詢矩陣
+            limit: 每個查詢回傳結果數量
+            mask: 篩選遮罩，None 表示不篩選
+        
+        Returns:
+            (位置矩陣, 分數矩陣)；分數為 -inf 的位置表示已被篩除
+        """
+        if self.quantizer is not None:
+            return self._quantized_top_k(queries, limit, mask)
+        if mask is None:
+            return self._top_k(queries @ self.vectors.T, limit)
+        
+        # 只對符合條件的列計算相似度，條件越嚴格計算量越小
+        allowed = np.flatnonzero(mask)
+        rows, scores = self._top_k(queries @ self.vectors[allowed].T, limit)
+        return allowed[rows], scores
+    
+    def _quantized_top_k(self, queries: np.ndarray, limit: int,
+                         mask: Optional[np.ndarray] = None):
+        """
+        以壓縮向量估算分數取得候選，再以完整精度向量重新計分
+        
+        Args:
+            queries: 已 L2 正規化的查詢矩陣
+            limit: 每個查詢回傳結果數量
+            mask: 篩選遮罩，None 表示不篩選
+        
+        Returns:
+            (位置矩陣, 分數矩陣)
+        """
+        approximate = self.quantizer.scores(queries)
+        if mask is not None:
+            approximate[:, ~mask] = -np.inf
+        if not self.rescore:
+            return self._top_k(approximate, limit)
+        
+        candidates, candidate_scores = self._top_k(approximate, limit * self.rescore_multiplier)
+        # 只讀取候選列的完整精度向量 (記憶體映射時僅載入這些頁面)
+        exact = np.einsum("qd,qkd->qk", queries, np.asarray(self.vectors[candidates], dtype=np.float32))
+        if self.norms is not None:
+            exact /= self.norms[candidates]
+        exact[candidate_scores == -np.inf] = -np.inf
+        order, top_scores = self._top_k(exact, limit)
+        return np.take_along_axis(candidates, order, axis=1), top_scores
+    
+    def _filter_mask(self, search_filter: Optional[SearchFilter]) -> Optional[np.ndarray]:
+        """
+        計算篩選遮罩
+        
+        Args:
+            search_filter: 篩選條件
+        
+        Returns:
+            布林遮罩，未指定條件時為 None
+        """
+        if search_filter is None:
+            return None
+        return search_filter.mask(self.payloads)
+    
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int):
+        """
+        以 argpartition 取出每列分數最高的 k 個位置 (由高到低排序)
+        
+        Args:
+            scores: 分數矩陣，形狀為 (查詢數量, 向量數量)
+            k: 取出數量
+        
+        Returns:
+            (位置矩陣, 分數矩陣)
+        """
+        k = min(k, scores.shape[1])
+        if k <= 0:
+            empty = np.empty((scores.shape[0], 0), dtype=np.int64)
+            return empty, empty.astype(scores.dtype)
+        
+        if k < scores.shape[1]:
+            candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            candidates = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+        
+        candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+        order = np.argsort(-candidate_scores, axis=1, kind="stable")
+        top_rows = np.take_along_axis(candidates, order, axis=1)
+        return top_rows, np.take_along_axis(candidate_scores, order, axis=1)
+    
+    def _row_vectors(self, rows: List[int]) -> np.ndarray:
+        """
+        取得指定列的 L2 正規化 float32 向量
+        
+        Args:
+            rows: 列索引列表
+        
+        Returns:
+            向量矩陣，形狀為 (列數, 向量維度)
+        """
+        vectors = np.asarray(self.vectors[rows], dtype=np.float32)
+        if self.norms is not None:
+            vectors = vectors / self.norms[rows, None]
+        return vectors
+    
+    @staticmethod
+    def _row_norms(vectors: np.ndarray, block_rows: int = 16384) -> np.ndarray:
+        """
+        逐區塊計算每列的 L2 範數 (不配置與整個矩陣同大小的暫存)
+        
+        Args:
+            vectors: 向量矩陣
+            block_rows: 每次計算的列數
+        
+        Returns:
+            float32 範數陣列
+        """
+        norms = np.empty(len(vectors), dtype=np.float32)
+        for start in range(0, len(vectors), block_rows):
+            block = np.asarray(vectors[start:start + block_rows], dtype=np.float32)
+            norms[start:start + len(block)] = np.sqrt(np.einsum("ij,ij->i", block, block))
+        return norms
+    
+    def _release_pages(self) -> None:
+        """
+        建立壓縮碼時讀過整個記憶體映射，通知核心可從本程序的常駐記憶體移除這些頁面
+        (仍保留在 page cache 中，重新計分時再按需載入候選列)
+        """
+        mapping = getattr(self.vectors, "_mmap", None)
+        if mapping is not None and hasattr(mmap, "MADV_DONTNEED"):
+            try:
+                mapping.madvise(mmap.MADV_DONTNEED)
+            except (OSError, ValueError):
+                pass
+    
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        """
+        將向量做 L2 正規化 (已正規化的連續 float32 陣列直接沿用，不複製)
+        
+        Args:
+            vectors: 向量矩陣
+        
+        Returns:
+            正規化後的 float32 向量矩陣
+        """
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        if (vectors.dtype == np.float32 and vectors.flags.c_contiguous
+                and np.allclose(norms, 1.0, atol=1e-4)):
+            # 記憶體映射的向量可直接共用，不產生額外副本
+            return vectors
+        norms[norms == 0] = 1.0
+        return np.ascontiguousarray(vectors / norms, dtype=np.float32)
+    
+    def _get_row(self, mal_id: int) -> Optional[int]:
+        """
+        取得 MAL_ID 對應的列索引
+        
+        Args:
+            mal_id: MAL_ID
+        
+        Returns:
+            列索引或 None
+        """
+        if self.vectors is None:
+            raise ValueError("請先建立索引")
+        
+        return self.id_to_row.get(mal_id)
@@ -0,0 +1,192 @@
+"""
+近鄰表模組 - 離線預先計算每部動漫的 top-K 相似動漫，線上以 O(1) 查表回傳
+"""
+
+import json
+import os
+import time
+import numpy as np
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from embedding_store import EmbeddingStore, atomic_write, atomic_write_json
+from config import (
+    EMBEDDINGS_PATH, NEIGHBOR_TABLE_PATH, NEIGHBOR_TABLE_K, NEIGHBOR_BLOCK_MEMORY_MB
+)
+
+TABLE_FORMAT_VERSION = 1
+
+
+class NeighborTable:
+    """
+    預先計算的 top-K 近鄰表
+
+    一份近鄰表由四個檔案組成：
+        <path>             近鄰 MAL_ID 矩陣 (int32，形狀為 (筆數, K))
+        <path>.scores.npy  對應的餘弦相似度 (float16)
+        <path>.ids.npy     每一列對應的查詢 MAL_ID (int32)
+        <path>.json        標頭 (K、筆數、來源向量的內容雜湊)
+    """
+    
+    def __init__(self, file_path: str = NEIGHBOR_TABLE_PATH):
+        """
+        初始化近鄰表
+        
+        Args:
+            file_path: 近鄰矩陣檔案路徑
+        """
+        self.file_path = file_path
+        self.scores_path = f"{file_path}.scores.npy"
+        self.ids_path = f"{file_path}.ids.npy"
+        self.header_path = f"{file_path}.json"
+        self.header = None
+        self.neighbors = None
+        self.scores = None
+        self.ids = None
+        self.id_to_row = {}
+    
+    def build(self,
+              embeddings: np.ndarray,
+              mal_ids: Sequence[int],
+              k: int = NEIGHBOR_TABLE_K,
+              block_memory_mb: int = NEIGHBOR_BLOCK_MEMORY_MB,
+              source_hash: Optional[str] = None) -> Dict[str, Any]:
+        """
+        以分塊矩陣乘法計算所有 MAL_ID 的 top-K 近鄰並寫入磁碟
+        
+        每個分塊的相似度矩陣大小約為 block_memory_mb，結果直接寫入記憶體映射檔，
+        整體記憶體用量不隨資料量平方成長。
+        
+        Args:
+            embeddings: 向量陣列
+            mal_ids: 與向量逐列對齊的 MAL_ID
+            k: 每個 MAL_ID 保留的近鄰數量 (包含自己)
+            block_memory_mb: 每個分塊相似度矩陣的記憶體上限 (MB)
+            source_hash: 來源向量的內容雜湊，用於載入時確認近鄰表未過期
+            
+        Returns:
+            寫入的標頭
+        """
+        ids = np.asarray(mal_ids, dtype=np.int64)
+        if len(ids) != len(embeddings):
+            raise ValueError(f"MAL_ID 數量 ({len(ids)}) 與向量數量 ({len(embeddings)}) 不一致")
+        if len(ids) > 0 and ids.max() > np.iinfo(np.int32).max:
+            raise ValueError("MAL_ID 超出 int32 範圍")
+        
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors = np.ascontiguousarray(vectors / norms)
+        
+        count = len(vectors)
+        k = min(k, count)
+        block_rows = max(1, (block_memory_mb * 1024 * 1024) // max(count * 4, 1))
+        print(f"計算近鄰表: {count} 筆，K={k}，每塊 {block_rows} 列")
+        
+        directory = os.path.dirname(self.file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        start_time = time.perf_counter()
+        neighbors = np.lib.format.open_memmap(
+            f"{self.file_path}.tmp", mode="w+", dtype=np.int32, shape=(count, k)
+        )
+        scores = np.lib.format.open_memmap(
+            f"{self.scores_path}.tmp", mode="w+", dtype=np.float16, shape=(count, k)
+        )
+        for start in range(0, count, block_rows):
+            end = min(start + block_rows, count)
+            block_scores = vectors[start:end] @ vectors.T
+            
+            if k < count:
+                top = np.argpartition(-block_scores, k - 1, axis=1)[:, :k]
+            else:
+                top = np.tile(np.arange(count), (end - start, 1))
+            top_scores = np.take_along_axis(block_scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind="stable")
+            
+            neighbors[start:end] = ids[np.take_along_axis(top, order, axis=1)]
+            scores[start:end] = np.take_along_axis(top_scores, order, axis=1)
+        
+        neighbors.flush()
+        scores.flush()
+        del neighbors, scores
+        
+        header = {
+            'format_version': TABLE_FORMAT_VERSION,
+            'k': int(k),
+            'count': int(count),
+            'source_hash': source_hash,
+        }
+        os.replace(f"{self.file_path}.tmp", self.file_path)
+        os.replace(f"{self.scores_path}.tmp", self.scores_path)
+        atomic_write(self.ids_path, lambda f: np.save(f, ids.astype(np.int32)))
+        atomic_write_json(self.header_path, header)
+        
+        print(f"近鄰表已寫入: {self.file_path} ({time.perf_counter() - start_time:.1f} 秒)")
+        self.header = header
+        return header
+    
+    def load(self, mmap_mode: Optional[str] = "r",
+             source_hash: Optional[str] = None) -> None:
+        """
+        載入近鄰表
+        
+        Args:
+            mmap_mode: 傳給 np.load 的 mmap_mode，None 表示完整讀入記憶體
+            source_hash: 若指定，檢查近鄰表是否由相同內容的向量產生
+        """
+        if not os.path.exists(self.header_path):
+            raise FileNotFoundError(f"找不到近鄰表標頭: {self.header_path}")
+        
+        with open(self.header_path, "r", encoding="utf-8") as f:
+            header = json.load(f)
+        
+        if header.get('format_version') != TABLE_FORMAT_VERSION:
+            raise ValueError(f"不支援的近鄰表格式版本: {header.get('format_version')}")
+        if source_hash is not None and header.get('source_hash') != source_hash:
+            raise ValueError("近鄰表與目前向量內容不一致，請重新計算")
+        
+        neighbors = np.load(self.file_path, mmap_mode=mmap_mode)
+        scores = np.load(self.scores_path, mmap_mode=mmap_mode)
+        ids = np.load(self.ids_path)
+        
+        expected_shape = (header['count'], header['k'])
+        if neighbors.shape != expected_shape or scores.shape != expected_shape:
+            raise ValueError(f"近鄰表形狀與標頭記錄 {expected_shape} 不一致")
+        if len(ids) != header['count']:
+            raise ValueError(f"MAL_ID 數量 ({len(ids)}) 與標頭記錄 ({header['count']}) 不一致")
+        
+        self.header = header
+        self.neighbors = neighbors
+        self.scores = scores
+        self.ids = ids
+        self.id_to_row = {int(mal_id): row for row, mal_id in enumerate(ids.tolist())}
+        print(f"近鄰表載入完成: {header['count']} 筆，K={header['k']}")
+    
+    def lookup(self, mal_id: int, limit: int) -> Optional[List[Tuple[int, float]]]:
+        """
+        查詢 MAL_ID 的近鄰
+        
+        Args:
+            mal_id: MAL_ID
+            limit: 需要的近鄰數量
+            
+        Returns:
+            (MAL_ID, 相似度) 列表；MAL_ID 不在表中或 limit 超過 K 時回傳 None
+        """
+        if self.neighbors is None:
+            return None
+        
+        row = self.id_to_row.get(int(mal_id))
+        if row is None or limit > self.header['k']:
+            return None
+        
+        return list(zip(self.neighbors[row, :limit].tolist(),
+                        self.scores[row, :limit].astype(np.float32).tolist()))
+
+
+if __name__ == "__main__":
+    # 離線計算近鄰表
+    store = EmbeddingStore(EMBEDDINGS_PATH)
+    embeddings, mal_ids = store.load()
+    table = NeighborTable()
+    table.build(embeddings, mal_ids, source_hash=store.header['content_hash'])
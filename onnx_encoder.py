@@ -0,0 +1,405 @@
+"""
+ONNX 推論模組 - 將 sentence-transformers 模型匯出為 ONNX (可選 int8 動態量化)，
+以 ONNX Runtime、fast tokenizer 與平均池化產生與原模型一致的向量，不需要載入 torch
+"""
+
+import argparse
+import inspect
+import json
+import os
+import time
+import numpy as np
+from typing import List, Dict, Any, Optional, Sequence
+from config import EMBEDDING_MODEL, ONNX_MODEL_DIR, ONNX_PARITY_THRESHOLD
+
+EXPORT_FORMAT_VERSION = 1
+MODEL_FILE = "model.onnx"
+QUANTIZED_MODEL_FILE = "model_int8.onnx"
+EXPORT_CONFIG_FILE = "export.json"
+# 未提供文本時用於一致性檢查的句子
+PARITY_TEXTS = [
+    "A young pilot joins a military academy to fight giant robots invading Earth.",
+    "Two brothers use alchemy to search for the philosopher's stone after a failed ritual.",
+    "A bounty hunter and his crew travel across the solar system in 2071.",
+    "High school students form a light music club and perform at the school festival.",
+    "A detective shrunk into a child's body solves murder cases while hunting the organization responsible.",
+    "Pirates search the Grand Line for a legendary treasure.",
+    "A quiet slice of life story about friendship, cooking and the changing seasons.",
+    "Short",
+]
+
+
+class FastTokenizer:
+    """
+    以 tokenizers 套件 (Rust 實作) 斷詞
+    
+    呼叫方式與 sentence-transformers 的 tokenizer 相同 (回傳 'input_ids')，
+    可直接用於 EmbeddingGenerator 的長度分桶。
+    """
+    
+    def __init__(self, file_path: str, max_length: int, pad_token_id: int):
+        """
+        初始化斷詞器
+        
+        Args:
+            file_path: tokenizer.json 路徑
+            max_length: 截斷長度 (含特殊 token)
+            pad_token_id: 補齊用的 token 編號
+        """
+        from tokenizers import Tokenizer
+        
+        self.tokenizer = Tokenizer.from_file(file_path)
+        self.tokenizer.no_padding()
+        self.tokenizer.enable_truncation(max_length)
+        self.max_length = max_length
+        self.pad_token_id = pad_token_id
+    
+    def __call__(self, texts: Sequence[str], add_special_tokens: bool = True,
+                 truncation: bool = True, max_length: Optional[int] = None) -> Dict[str, List[List[int]]]:
+        """
+        斷詞 (不補齊)
+        
+        Args:
+            texts: 文本列表
+            add_special_tokens: 是否加入特殊 token
+            truncation: 是否截斷 (一律截斷到建立時的 max_length)
+            max_length: 截斷長度，不可大於建立時的 max_length
+        
+        Returns:
+            {'input_ids': 每個文本的 token 編號列表}
+        """
+        encodings = self.tokenizer.encode_batch(list(texts), add_special_tokens=add_special_tokens)
+        limit = min(max_length or self.max_length, self.max_length)
+        return {'input_ids': [encoding.ids[:limit] for encoding in encodings]}
+    
+    def batch(self, texts: Sequence[str]):
+        """
+        斷詞並補齊為模型輸入
+        
+        Args:
+            texts: 文本列表
+        
+        Returns:
+            (input_ids, attention_mask)，皆為 int64 矩陣，寬度為批次內最長的文本
+        """
+        encodings = self.tokenizer.encode_batch(list(texts))
+        width = max((len(encoding.ids) for encoding in encodings), default=0)
+        input_ids = np.full((len(encodings), width), self.pad_token_id, dtype=np.int64)
+        attention_mask = np.zeros((len(encodings), width), dtype=np.int64)
+        for row, encoding in enumerate(encodings):
+            input_ids[row, :len(encoding.ids)] = encoding.ids
+            attention_mask[row, :len(encoding.ids)] = 1
+        return input_ids, attention_mask
+
+
+class ONNXSentenceEncoder:
+    """
+    以 ONNX Runtime 執行匯出的模型
+    
+    提供 EmbeddingGenerator 使用的 SentenceTransformer 介面子集
+    (encode、get_sentence_embedding_dimension、max_seq_length、tokenizer)。
+    """
+    
+    def __init__(self, model_dir: str = ONNX_MODEL_DIR,
+                 quantized: bool = False,
+                 threads: Optional[int] = None,
+                 model_name: Optional[str] = None):
+        """
+        載入匯出的模型
+        
+        Args:
+            model_dir: export_onnx 的輸出目錄
+            quantized: 是否使用 int8 動態量化的模型
+            threads: ONNX Runtime 的執行緒數量，None 表示由 ONNX Runtime 決定
+            model_name: 若指定，檢查匯出的模型是否由此模型產生
+        
+        Raises:
+            FileNotFoundError: 尚未匯出
+            ValueError: 匯出格式或來源模型不符，或一致性檢查未通過
+        """
+        import onnxruntime
+        
+        self.config = self.read_config(model_dir)
+        if model_name is not None and self.config['model_name'] != model_name:
+            raise ValueError(
+                f"ONNX 模型由 {self.config['model_name']} 匯出，與目前的模型 {model_name} 不符，請重新匯出"
+            )
+        
+        variant = "int8" if quantized else "fp32"
+        parity = self.config.get('parity', {}).get(variant)
+        if parity is not None and not parity['passed']:
+            raise ValueError(
+                f"ONNX {variant} 模型未通過一致性檢查 (最低餘弦相似度 {parity['min_cosine']:.4f})"
+            )
+        
+        model_path = os.path.join(model_dir, QUANTIZED_MODEL_FILE if quantized else MODEL_FILE)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"找不到 ONNX 模型: {model_path}")
+        
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            model_path, options, providers=["CPUExecutionProvider"]
+        )
+        self.quantized = quantized
+        self.max_seq_length = self.config['max_seq_length']
+        self.normalize = self.config['normalize']
+        self.tokenizer = FastTokenizer(
+            os.path.join(model_dir, "tokenizer.json"), self.max_seq_length, self.config['pad_token_id']
+        )
+    
+    @staticmethod
+    def read_config(model_dir: str) -> Dict[str, Any]:
+        """
+        讀取匯出設定
+        
+        Args:
+            model_dir: 匯出目錄
+        
+        Returns:
+            匯出設定
+        """
+        config_path = os.path.join(model_dir, EXPORT_CONFIG_FILE)
+        if not os.path.exists(config_path):
+            raise FileNotFoundError(f"找不到 ONNX 匯出設定: {config_path}")
+        with open(config_path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        if config.get('format_version') != EXPORT_FORMAT_VERSION:
+            raise ValueError(f"不支援的 ONNX 匯出格式版本: {config.get('format_version')}")
+        return config
+    
+    @staticmethod
+    def exists(model_dir: str = ONNX_MODEL_DIR, quantized: bool = False) -> bool:
+        """
+        確認模型是否已匯出
+        
+        Args:
+            model_dir: 匯出目錄
+            quantized: 是否為 int8 模型
+        
+        Returns:
+            匯出設定與模型檔是否都存在
+        """
+        model_file = QUANTIZED_MODEL_FILE if quantized else MODEL_FILE
+        return (os.path.exists(os.path.join(model_dir, EXPORT_CONFIG_FILE))
+                and os.path.exists(os.path.join(model_dir, model_file)))
+    
+    def get_sentence_embedding_dimension(self) -> int:
+        """向量維度"""
+        return self.config['dimension']
+    
+    def encode(self, texts: Sequence[str], batch_size: int = 32,
+               show_progress_bar: bool = False) -> np.ndarray:
+        """
+        編碼文本
+        
+        Args:
+            texts: 文本列表
+            batch_size: 批次大小
+            show_progress_bar: 是否顯示進度條
+        
+        Returns:
+            float32 向量矩陣
+        """
+        texts = list(texts)
+        embeddings = np.empty((len(texts), self.get_sentence_embedding_dimension()), dtype=np.float32)
+        starts = range(0, len(texts), batch_size)
+        if show_progress_bar:
+            from tqdm import tqdm
+            starts = tqdm(starts, desc="Batches")
+        for start in starts:
+            embeddings[start:start + batch_size] = self._encode_batch(texts[start:start + batch_size])
+        return embeddings
+    
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        """
+        以 ONNX Runtime 計算 token 向量，再做平均池化 (與正規化)
+        
+        Args:
+            texts: 一個批次的文本
+        
+        Returns:
+            向量矩陣
+        """
+        input_ids, attention_mask = self.tokenizer.batch(texts)
+        token_embeddings = self.session.run(
+            ["token_embeddings"], {'input_ids': input_ids, 'attention_mask': attention_mask}
+        )[0]
+        
+        mask = attention_mask.astype(np.float32)
+        pooled = np.einsum("bsd,bs->bd", token_embeddings, mask) / np.maximum(mask.sum(axis=1, keepdims=True), 1e-9)
+        if self.normalize:
+            pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+        return pooled.astype(np.float32, copy=False)
+
+
+def export_onnx(model_name: str = EMBEDDING_MODEL,
+                output_dir: str = ONNX_MODEL_DIR,
+                quantize: bool = True,
+                parity_texts: Optional[Sequence[str]] = None,
+                threshold: float = ONNX_PARITY_THRESHOLD,
+                opset: int = 17) -> Dict[str, Any]:
+    """
+    將 sentence-transformers 模型的 Transformer 部分匯出為 ONNX (需要 torch，只需執行一次)
+    
+    匯出後以 parity_texts 比較 ONNX 與 torch 向量的餘弦相似度，結果寫入匯出設定；
+    未通過 threshold 的模型在載入時會被拒絕。
+    
+    Args:
+        model_name: sentence-transformers 模型名稱或路徑
+        output_dir: 輸出目錄
+        quantize: 是否另外輸出 int8 動態量化的模型
+        parity_texts: 一致性檢查的文本，None 表示使用內建句子
+        threshold: 每個文本的最低餘弦相似度
+        opset: ONNX opset 版本
+    
+    Returns:
+        匯出設定
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+    
+    print(f"匯出 ONNX 模型: {model_name} → {output_dir}")
+    start_time = time.perf_counter()
+    model = SentenceTransformer(model_name, device="cpu")
+    modules = list(model)
+    # sentence-transformers 2.x 以 pooling_mode_*_tokens 旗標表示池化方式，較新版本改為 pooling_mode
+    pooling = modules[1].get_config_dict() if len(modules) > 1 else {}
+    modes = {key for key, value in pooling.items() if key.startswith("pooling_mode_") and value is True}
+    if pooling.get('pooling_mode', "mean" if modes == {"pooling_mode_mean_tokens"} else None) != "mean":
+        raise ValueError("只支援平均池化 (mean pooling) 的模型")
+    
+    class TokenEmbeddings(torch.nn.Module):
+        """只輸出最後一層 token 向量，池化在 NumPy 中進行"""
+        
+        def __init__(self, transformer):
+            super().__init__()
+            self.transformer = transformer
+        
+        def forward(self, input_ids, attention_mask):
+            return self.transformer(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+    
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = model.tokenizer
+    tokenizer.save_pretrained(output_dir)
+    if not os.path.exists(os.path.join(output_dir, "tokenizer.json")):
+        raise ValueError("模型沒有 fast tokenizer (tokenizer.json)，無法以 tokenizers 套件斷詞")
+    
+    dummy = tokenizer(["ONNX export", "a longer sentence for the dynamic axes"],
+                      padding=True, return_tensors="pt")
+    export_options = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        # 以 TorchScript 匯出器匯出，dynamic_axes 在所有支援的 torch 版本中行為一致
+        export_options['dynamo'] = False
+    wrapper = TokenEmbeddings(modules[0].auto_model).eval()
+    with torch.no_grad():
+        torch.onnx.export(
+            wrapper,
+            (dummy['input_ids'], dummy['attention_mask']),
+            os.path.join(output_dir, MODEL_FILE),
+            input_names=["input_ids", "attention_mask"],
+            output_names=["token_embeddings"],
+            dynamic_axes={
+                'input_ids': {0: "batch", 1: "sequence"},
+                'attention_mask': {0: "batch", 1: "sequence"},
+                'token_embeddings': {0: "batch", 1: "sequence"},
+            },
+            opset_version=opset,
+            **export_options
+        )
+    
+    variants = ["fp32"]
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(
+            os.path.join(output_dir, MODEL_FILE),
+            os.path.join(output_dir, QUANTIZED_MODEL_FILE),
+            weight_type=QuantType.QInt8
+        )
+        variants.append("int8")
+    
+    config = {
+        'format_version': EXPORT_FORMAT_VERSION,
+        'model_name': model_name,
+        'max_seq_length': int(model.max_seq_length),
+        'dimension': int(model.get_sentence_embedding_dimension()),
+        'normalize': any(type(module).__name__ == "Normalize" for module in modules),
+        'pad_token_id': int(tokenizer.pad_token_id),
+        'opset': opset,
+        'parity': {},
+    }
+    config_path = os.path.join(output_dir, EXPORT_CONFIG_FILE)
+    with open(config_path, "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2, ensure_ascii=False)
+    
+    # 一致性檢查：與 torch 向量比較
+    texts = list(parity_texts) if parity_texts is not None else PARITY_TEXTS
+    reference = model.encode(texts, batch_size=32, show_progress_bar=False)
+    for variant in variants:
+        config['parity'][variant] = parity_report(
+            reference, ONNXSentenceEncoder(output_dir, quantized=variant == "int8").encode(texts), threshold
+        )
+        report = config['parity'][variant]
+        print(f"一致性檢查 ({variant}): 最低餘弦相似度 {report['min_cosine']:.5f}，"
+              f"平均 {report['mean_cosine']:.5f} ({'通過' if report['passed'] else '未通過'})")
+    
+    with open(config_path, "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2, ensure_ascii=False)
+    print(f"ONNX 模型匯出完成 ({time.perf_counter() - start_time:.1f} 秒)")
+    return config
+
+
+def parity_report(reference: np.ndarray, candidate: np.ndarray,
+                  threshold: float = ONNX_PARITY_THRESHOLD) -> Dict[str, Any]:
+    """
+    比較兩組向量的逐列餘弦相似度
+    
+    Args:
+        reference: 基準向量 (torch)
+        candidate: 待檢查的向量 (ONNX)
+        threshold: 每一列的最低餘弦相似度
+    
+    Returns:
+        {'texts', 'min_cosine', 'mean_cosine', 'threshold', 'passed'}
+    """
+    reference = np.asarray(reference, dtype=np.float32)
+    candidate = np.asarray(candidate, dtype=np.float32)
+    norms = np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    cosine = np.einsum("ij,ij->i", reference, candidate) / np.maximum(norms, 1e-12)
+    return {
+        'texts': int(len(cosine)),
+        'min_cosine': float(cosine.min()),
+        'mean_cosine': float(cosine.mean()),
+        'threshold': threshold,
+        'passed': bool(cosine.min() >= threshold),
+    }
+
+
+def main():
+    """命令列進入點：匯出 ONNX 模型並執行一致性檢查"""
+    parser = argparse.ArgumentParser(description="將嵌入模型匯出為 ONNX (可選 int8 量化) 並檢查一致性")
+    parser.add_argument("--model", default=EMBEDDING_MODEL, help="sentence-transformers 模型名稱或路徑")
+    parser.add_argument("--output", default=ONNX_MODEL_DIR, help="輸出目錄")
+    parser.add_argument("--no-quantize", action="store_true", help="不輸出 int8 量化模型")
+    parser.add_argument("--parity-samples", type=int, default=200,
+                        help="以處理後資料中的前 N 筆簡介做一致性檢查 (資料不存在時使用內建句子)")
+    parser.add_argument("--threshold", type=float, default=ONNX_PARITY_THRESHOLD, help="最低餘弦相似度")
+    args = parser.parse_args()
+    
+    parity_texts = None
+    try:
+        from data_processor import AnimeDataProcessor
+        parity_texts = AnimeDataProcessor().get_processed_data().sypnopsis.head(args.parity_samples).tolist()
+    except (FileNotFoundError, OSError) as e:
+        print(f"使用內建句子做一致性檢查 ({e})")
+    
+    config = export_onnx(args.model, args.output, quantize=not args.no_quantize,
+                         parity_texts=parity_texts, threshold=args.threshold)
+    if not all(report['passed'] for report in config['parity'].values()):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,39 +3,102 @@
 Qdrant 資料庫管理模組 - 負責向量資料庫的所有操作
 """
 
+import hashlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 import numpy as np
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+import grpc
+import httpx
 from tqdm import tqdm
 from qdrant_client import QdrantClient
-from qdrant_client.http.models import VectorParams, PointStruct
+from qdrant_client.http.exceptions import UnexpectedResponse, ResponseHandlingException
+from qdrant_client.http.models import (
+    VectorParams, SearchRequest, PointIdsList, PointStruct,
+    CreateAlias, CreateAliasOperation, DeleteAlias, DeleteAliasOperation,
+    ScalarQuantization, ScalarQuantizationConfig, ScalarType,
+    ProductQuantization, ProductQuantizationConfig, CompressionRatio,
+    SearchParams, QuantizationSearchParams, PayloadSchemaType
+)
+from search_backend import SearchBackend
+from search_filter import SearchFilter
+from instrumentation import metrics
 from config import (
-    QDRANT_HOST, QDRANT_PORT, COLLECTION_NAME, 
-    DISTANCE_METRIC, BATCH_SIZE, DEFAULT_SEARCH_LIMIT,
-    EMBEDDING_DIMENSION
+    QDRANT_HOST, QDRANT_PORT, QDRANT_GRPC_PORT, QDRANT_PREFER_GRPC,
+    COLLECTION_NAME, DISTANCE_METRIC, BATCH_SIZE, DEFAULT_SEARCH_LIMIT,
+    EMBEDDING_DIMENSION, SEARCH_BATCH_SIZE,
+    UPSERT_PARALLEL, UPSERT_MAX_RETRIES, UPSERT_RETRY_BACKOFF, UPSERT_SEGMENT_BATCHES,
+    QDRANT_QUANTIZATION, RESCORE_MULTIPLIER, PQ_SUBSPACES
 )
 
 
-class QdrantManager:
+def search_params(quantization: Optional[str]) -> Optional[SearchParams]:
+    """
+    產生搜尋參數：啟用量化時以原始向量重新計分並超額取樣
+    
+    同步與非同步管理器共用。
+    
+    Args:
+        quantization: 集合使用的量化方式
+    
+    Returns:
+        搜尋參數，未啟用量化時回傳 None
+    """
+    if quantization is None:
+        return None
+    return SearchParams(
+        quantization=QuantizationSearchParams(
+            rescore=True, oversampling=float(RESCORE_MULTIPLIER)
+        )
+    )
+
+
+class QdrantManager(SearchBackend):
     """Qdrant 資料庫管理器"""
     
-    def __init__(self, host: str = QDRANT_HOST, port: int = QDRANT_PORT):
+    # 可供 SearchFilter 篩選的 payload 欄位與索引型別
+    PAYLOAD_INDEXES = {
+        'Genres': PayloadSchemaType.KEYWORD,
+        'Score': PayloadSchemaType.FLOAT,
+        'Type': PayloadSchemaType.KEYWORD,
+        'Episodes': PayloadSchemaType.INTEGER,
+    }
+    
+    def __init__(self, host: str = QDRANT_HOST, port: int = QDRANT_PORT,
+                 prefer_grpc: bool = QDRANT_PREFER_GRPC,
+                 grpc_port: int = QDRANT_GRPC_PORT,
+                 quantization: Optional[str] = QDRANT_QUANTIZATION):
         """
         初始化 Qdrant 管理器
         
         Args:
             host: Qdrant 主機位址
             port: Qdrant 端口
+            prefer_grpc: 是否優先使用 gRPC 連線
+            grpc_port: Qdrant gRPC 端口
+            quantization: 新建集合的量化方式 (None、"int8" 或 "pq")
         """
         self.host = host
         self.port = port
+        self.prefer_grpc = prefer_grpc
+        self.grpc_port = grpc_port
+        self.quantization = quantization
         self.client = None
     
     def connect(self) -> None:
         """建立與 Qdrant 的連線"""
-        print(f"連接到 Qdrant: {self.host}:{self.port}")
-        self.client = QdrantClient(host=self.host, port=self.port)
+        protocol = "gRPC" if self.prefer_grpc else "HTTP"
+        print(f"連接到 Qdrant: {self.host}:{self.port} ({protocol})")
+        self.client = QdrantClient(
+            host=self.host,
+            port=self.port,
+            grpc_port=self.grpc_port,
+            prefer_grpc=self.prefer_grpc
+        )
         print("連線建立成功")
     
+    @metrics.timed("qdrant.create_collection")
     def create_collection(self, 
                          collection_name: str = COLLECTION_NAME,
                          vector_size: int = EMBEDDING_DIMENSION,
@@ -62,52 +125,508 @@ class QdrantManager:
         # 建立新集合
         self.client.create_collection(
             collection_name=collection_name,
-            vectors_config=VectorParams(size=vector_size, distance=distance)
+            vectors_config=VectorParams(size=vector_size, distance=distance),
+            quantization_config=self._quantization_config(vector_size)
         )
+        self._create_payload_indexes(collection_name)
         print(f"集合 '{collection_name}' 建立成功")
     
+    @metrics.timed("qdrant.upsert")
     def batch_upsert(self, 
                     embeddings: np.ndarray,
                     metadata: List[Dict[str, Any]],
                     collection_name: str = COLLECTION_NAME,
-                    batch_size: int = BATCH_SIZE) -> None:
+                    batch_size: int = BATCH_SIZE,
+                    parallel: int = UPSERT_PARALLEL,
+                    max_retries: int = UPSERT_MAX_RETRIES,
+                    add_content_hash: bool = False) -> None:
         """
         批次上傳向量資料
         
+        向量以 NumPy 陣列區段交給 client.upload_collection，由 qdrant-client 逐批轉換與傳送，
+        不先把整個陣列轉成 Python 列表；執行緒池並行上傳多個區段，
+        進行中的區段數量有上限，避免切分速度超前上傳時佔用過多記憶體。
+        
         Args:
             embeddings: 向量陣列
             metadata: 元資料列表
             collection_name: 集合名稱
             batch_size: 批次大小
+            parallel: 並行上傳的執行緒數量
+            max_retries: 單一區段遇到暫時性錯誤時的最大重試次數
+            add_content_hash: 是否在 payload 中加上供同步比對的內容雜湊
         """
         if self.client is None:
             self.connect()
         
+        if parallel <= 0:
+            raise ValueError("parallel 必須大於 0")
+        
+        if add_content_hash:
+            metadata = self._with_content_hash(embeddings, metadata)
+        
         total = len(embeddings)
-        print(f"開始批次上傳 {total} 個向量，批次大小: {batch_size}")
+        print(f"開始批次上傳 {total} 個向量，批次大小: {batch_size}，並行數: {parallel}")
         
-        for start in tqdm(range(0, total, batch_size), desc="上傳批次"):
-            end = min(start + batch_size, total)
-            batch_embeddings = embeddings[start:end]
-            batch_metadata = metadata[start:end]
+        max_pending = parallel * 2
+        with ThreadPoolExecutor(max_workers=parallel) as pool, \
+                tqdm(total=total, desc="上傳批次") as progress:
+            pending = set()
+            for segment in self._iter_segments(embeddings, metadata, batch_size * UPSERT_SEGMENT_BATCHES):
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        progress.update(future.result())
+                
+                pending.add(pool.submit(
+                    self._upsert_with_retry, collection_name, segment, batch_size, max_retries
+                ))
             
-            points = [
-                PointStruct(
-                    id=meta['MAL_ID'], 
-                    vector=vec.tolist(), 
-                    payload=meta
-                )
-                for vec, meta in zip(batch_embeddings, batch_metadata)
-            ]
-            
-            self.client.upsert(collection_name=collection_name, points=points)
+            for future in pending:
+                progress.update(future.result())
         
         print("批次上傳完成")
     
+    @staticmethod
+    def _iter_segments(embeddings: np.ndarray,
+                       metadata: List[Dict[str, Any]],
+                       segment_size: int) -> Iterator[Tuple[np.ndarray, List[int], List[Dict[str, Any]]]]:
+        """
+        將向量與元資料切成區段 (向量保持為 NumPy 陣列，記憶體映射的 float32 儲存不會複製)
+        
+        Args:
+            embeddings: 向量陣列
+            metadata: 元資料列表
+            segment_size: 每個區段的資料點數量
+        
+        Yields:
+            (向量陣列, 資料點 ID 列表, payload 列表)
+        """
+        for start in range(0, len(embeddings), segment_size):
+            end = min(start + segment_size, len(embeddings))
+            segment_metadata = metadata[start:end]
+            yield (
+                np.asarray(embeddings[start:end], dtype=np.float32),
+                [int(meta['MAL_ID']) for meta in segment_metadata],
+                segment_metadata,
+            )
+    
+    def _upsert_with_retry(self, collection_name: str,
+                           segment: Tuple[np.ndarray, List[int], List[Dict[str, Any]]],
+                           batch_size: int,
+                           max_retries: int) -> int:
+        """
+        上傳單一區段，遇到連線錯誤或伺服器 5xx 錯誤時以指數退避重試
+        
+        Args:
+            collection_name: 集合名稱
+            segment: (向量陣列, 資料點 ID 列表, payload 列表)
+            batch_size: 每次請求的資料點數量
+            max_retries: 最大重試次數
+        
+        Returns:
+            上傳的資料點數量
+        """
+        vectors, ids, payloads = segment
+        for attempt in range(max_retries + 1):
+            try:
+                with metrics.span("qdrant.upsert_batch"):
+                    # 重試由這裡依錯誤類型決定，client 內部只嘗試一次
+                    self.client.upload_collection(
+                        collection_name=collection_name, vectors=vectors, payload=payloads, ids=ids,
+                        batch_size=batch_size, parallel=1, max_retries=1, wait=True
+                    )
+                metrics.increment("qdrant.points_upserted", len(ids))
+                return len(ids)
+            except Exception as e:
+                if attempt == max_retries or not self._is_transient(e):
+                    raise
+                metrics.increment("qdrant.upsert_retries")
+                delay = UPSERT_RETRY_BACKOFF * (2 ** attempt)
+                print(f"批次上傳失敗 ({e})，{delay:.1f} 秒後重試 ({attempt + 1}/{max_retries})")
+                time.sleep(delay)
+    
+    @staticmethod
+    def _is_transient(error: Exception) -> bool:
+        """
+        判斷錯誤是否為重試可能成功的暫時性錯誤 (連線中斷、逾時、伺服器 5xx 或 429)
+        
+        維度不符、集合不存在等 4xx 錯誤重試也不會成功，應立即回報。
+        
+        Args:
+            error: 上傳時發生的錯誤
+        
+        Returns:
+            是否應重試
+        """
+        if isinstance(error, UnexpectedResponse):
+            return error.status_code is not None and (error.status_code >= 500 or error.status_code == 429)
+        if isinstance(error, (ResponseHandlingException, httpx.TransportError, ConnectionError, TimeoutError)):
+            return True
+        if isinstance(error, grpc.RpcError):
+            return error.code() in (
+                grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.DEADLINE_EXCEEDED,
+                grpc.StatusCode.RESOURCE_EXHAUSTED,
+            )
+        return False
+    
+    def build_index(self,
+                    embeddings: np.ndarray,
+                    metadata: List[Dict[str, Any]],
+                    force_rebuild: bool = False,
+                    collection_name: str = COLLECTION_NAME) -> None:
+        """
+        建立或同步向量集合
+        
+        集合不存在或強制重建時，寫入新的版本化集合並切換別名；
+        否則只同步有變動的資料點。
+        
+        Args:
+            embeddings: 向量陣列
+            metadata: 元資料列表
+            force_rebuild: 是否強制重建集合
+            collection_name: 集合名稱 (或別名)
+        """
+        if self.client is None:
+            self.connect()
+        
+        if force_rebuild or not self.collection_exists(collection_name):
+            self.rebuild_collection(embeddings, metadata, alias_name=collection_name)
+        else:
+            self.sync_collection(embeddings, metadata, collection_name=collection_name)
+    
+    def collection_exists(self, collection_name: str = COLLECTION_NAME) -> bool:
+        """
+        檢查集合或別名是否存在
+        
+        Args:
+            collection_name: 集合名稱或別名
+        
+        Returns:
+            是否存在
+        """
+        return (collection_name in self.get_collections()
+                or self.get_alias_target(collection_name) is not None)
+    
+    def get_alias_target(self, alias_name: str = COLLECTION_NAME) -> Optional[str]:
+        """
+        取得別名目前指向的集合
+        
+        Args:
+            alias_name: 別名
+        
+        Returns:
+            集合名稱，別名不存在時回傳 None
+        """
+        if self.client is None:
+            self.connect()
+        
+        for alias in self.client.get_aliases().aliases:
+            if alias.alias_name == alias_name:
+                return alias.collection_name
+        return None
+    
+    @metrics.timed("qdrant.sync")
+    def sync_collection(self,
+                        embeddings: np.ndarray,
+                        metadata: List[Dict[str, Any]],
+                        collection_name: str = COLLECTION_NAME,
+                        batch_size: int = BATCH_SIZE) -> Dict[str, int]:
+        """
+        以資料點 ID 與內容雜湊比對既有集合，只上傳新增或變更的資料點並刪除已移除的 MAL_ID
+        
+        Args:
+            embeddings: 向量陣列
+            metadata: 元資料列表
+            collection_name: 集合名稱 (或別名)
+            batch_size: 批次大小
+        
+        Returns:
+            同步統計 (upserted, deleted, unchanged)
+        """
+        if self.client is None:
+            self.connect()
+        
+        # 舊版集合可能尚未建立篩選欄位索引 (重複建立不會有影響)
+        self._create_payload_indexes(self.get_alias_target(collection_name) or collection_name)
+        
+        payloads = self._with_content_hash(embeddings, metadata)
+        stored_hashes = self._get_stored_hashes(collection_name)
+        
+        changed_rows = [
+            row for row, payload in enumerate(payloads)
+            if stored_hashes.get(int(payload['MAL_ID'])) != payload['content_hash']
+        ]
+        current_ids = {int(payload['MAL_ID']) for payload in payloads}
+        removed_ids = [point_id for point_id in stored_hashes if point_id not in current_ids]
+        
+        print(f"同步集合 '{collection_name}': 更新 {len(changed_rows)} 筆、刪除 {len(removed_ids)} 筆、"
+              f"未變動 {len(payloads) - len(changed_rows)} 筆")
+        
+        if changed_rows:
+            self.batch_upsert(
+                embeddings[changed_rows],
+                [payloads[row] for row in changed_rows],
+                collection_name=collection_name,
+                batch_size=batch_size
+            )
+        
+        for start in range(0, len(removed_ids), batch_size):
+            self.client.delete(
+                collection_name=collection_name,
+                points_selector=PointIdsList(points=removed_ids[start:start + batch_size])
+            )
+        
+        return {
+            'upserted': len(changed_rows),
+            'deleted': len(removed_ids),
+            'unchanged': len(payloads) - len(changed_rows),
+        }
+    
+    def rebuild_collection(self,
+                           embeddings: np.ndarray,
+                           metadata: List[Dict[str, Any]],
+                           alias_name: str = COLLECTION_NAME,
+                           batch_size: int = BATCH_SIZE) -> str:
+        """
+        寫入新的版本化集合，完成後以原子操作將別名切換過去，並刪除舊版集合
+        
+        Args:
+            embeddings: 向量陣列
+            metadata: 元資料列表
+            alias_name: 對外使用的集合別名
+            batch_size: 批次大小
+        
+        Returns:
+            新集合名稱
+        """
+        new_collection = self.create_versioned_collection(alias_name, embeddings.shape[1])
+        self.batch_upsert(
+            embeddings,
+            metadata,
+            collection_name=new_collection,
+            batch_size=batch_size,
+            add_content_hash=True
+        )
+        self.switch_alias(new_collection, alias_name)
+        return new_collection
+    
+    @metrics.timed("qdrant.create_collection")
+    def create_versioned_collection(self,
+                                    alias_name: str = COLLECTION_NAME,
+                                    vector_size: int = EMBEDDING_DIMENSION,
+                                    distance: str = DISTANCE_METRIC) -> str:
+        """
+        建立以別名加上版本號命名的新集合 (尚未切換別名)
+        
+        Args:
+            alias_name: 對外使用的集合別名
+            vector_size: 向量維度
+            distance: 距離計算方式
+        
+        Returns:
+            新集合名稱
+        """
+        if self.client is None:
+            self.connect()
+        
+        self._check_not_legacy(alias_name)
+        return self._create_versioned(alias_name, vector_size, distance)
+    
+    def _create_versioned(self, alias_name: str, vector_size: int, distance: str) -> str:
+        """
+        建立版本化集合 (不檢查別名名稱是否仍為實體集合)
+        
+        Args:
+            alias_name: 對外使用的集合別名
+            vector_size: 向量維度
+            distance: 距離計算方式
+        
+        Returns:
+            新集合名稱
+        """
+        # 以毫秒時間戳記作為版本號，避免與既有集合重名
+        existing = set(self.get_collections())
+        version = int(time.time() * 1000)
+        while f"{alias_name}_v{version}" in existing:
+            version += 1
+        new_collection = f"{alias_name}_v{version}"
+        
+        print(f"建立版本化集合: {new_collection}")
+        self.client.create_collection(
+            collection_name=new_collection,
+            vectors_config=VectorParams(size=vector_size, distance=distance),
+            quantization_config=self._quantization_config(vector_size)
+        )
+        self._create_payload_indexes(new_collection)
+        return new_collection
+    
+    def _create_payload_indexes(self, collection_name: str) -> None:
+        """
+        為篩選欄位建立 payload 索引，使篩選在搜尋圖內執行而非事後過濾
+        
+        Args:
+            collection_name: 集合名稱
+        """
+        for field_name, schema in self.PAYLOAD_INDEXES.items():
+            self.client.create_payload_index(
+                collection_name=collection_name,
+                field_name=field_name,
+                field_schema=schema
+            )
+    
+    def switch_alias(self, new_collection: str, alias_name: str = COLLECTION_NAME) -> None:
+        """
+        以原子操作將別名切換至新集合，並刪除別名原先指向的集合
+        
+        Args:
+            new_collection: 新集合名稱
+            alias_name: 對外使用的集合別名
+        """
+        if self.client is None:
+            self.connect()
+        
+        self._check_not_legacy(alias_name)
+        old_collection = self.get_alias_target(alias_name)
+        
+        operations = []
+        if old_collection is not None:
+            operations.append(DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=alias_name)))
+        operations.append(CreateAliasOperation(
+            create_alias=CreateAlias(collection_name=new_collection, alias_name=alias_name)
+        ))
+        self.client.update_collection_aliases(change_aliases_operations=operations)
+        print(f"別名 '{alias_name}' 已切換至 '{new_collection}'")
+        
+        if old_collection is not None and old_collection != new_collection:
+            self.client.delete_collection(collection_name=old_collection)
+            print(f"舊版集合 '{old_collection}' 已刪除")
+    
+    def _check_not_legacy(self, alias_name: str) -> None:
+        """
+        確認別名名稱沒有被舊版部署的實體集合佔用
+        
+        Args:
+            alias_name: 對外使用的集合別名
+        
+        Raises:
+            ValueError: 別名名稱仍是實體集合，需先執行 migrate_to_alias
+        """
+        if alias_name in self.get_collections():
+            raise ValueError(
+                f"'{alias_name}' 是舊版部署的實體集合，無法建立同名別名；"
+                f"請先執行一次 QdrantManager().migrate_to_alias('{alias_name}')"
+            )
+    
+    def migrate_to_alias(self, alias_name: str = COLLECTION_NAME,
+                         page_size: int = BATCH_SIZE) -> Optional[str]:
+        """
+        一次性遷移：將舊版部署的實體集合複製為版本化集合，再以同名別名取代
+        
+        複製完成前舊集合持續提供服務；之後刪除舊集合並建立別名，兩個操作之間的查詢會失敗，
+        請在維護時段執行。別名已存在時不做任何事。
+        
+        Args:
+            alias_name: 舊版實體集合名稱 (遷移後成為別名)
+            page_size: 每次複製的資料點數量
+        
+        Returns:
+            新集合名稱，不需遷移時回傳 None
+        """
+        if self.client is None:
+            self.connect()
+        
+        if alias_name not in self.get_collections():
+            print(f"'{alias_name}' 不是實體集合，不需遷移")
+            return None
+        
+        vectors_config = self.client.get_collection(collection_name=alias_name).config.params.vectors
+        new_collection = self._create_versioned(alias_name, vectors_config.size, vectors_config.distance)
+        
+        copied = 0
+        offset = None
+        while True:
+            records, offset = self.client.scroll(
+                collection_name=alias_name,
+                limit=page_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True
+            )
+            if records:
+                self.client.upsert(
+                    collection_name=new_collection,
+                    points=[PointStruct(id=record.id, vector=record.vector, payload=record.payload)
+                            for record in records]
+                )
+                copied += len(records)
+            if offset is None:
+                break
+        print(f"已將 {copied} 筆資料點從 '{alias_name}' 複製至 '{new_collection}'")
+        
+        self.client.delete_collection(collection_name=alias_name)
+        self.client.update_collection_aliases(change_aliases_operations=[CreateAliasOperation(
+            create_alias=CreateAlias(collection_name=new_collection, alias_name=alias_name)
+        )])
+        print(f"舊版實體集合 '{alias_name}' 已改為指向 '{new_collection}' 的別名")
+        return new_collection
+    
+    def _get_stored_hashes(self, collection_name: str,
+                           page_size: int = 1000) -> Dict[int, Optional[str]]:
+        """
+        以 scroll 取得集合中所有資料點的內容雜湊 (不取向量)
+        
+        Args:
+            collection_name: 集合名稱
+            page_size: 每次 scroll 的筆數
+        
+        Returns:
+            資料點 ID 對內容雜湊的字典
+        """
+        stored = {}
+        offset = None
+        while True:
+            records, offset = self.client.scroll(
+                collection_name=collection_name,
+                limit=page_size,
+                offset=offset,
+                with_payload=["content_hash"],
+                with_vectors=False
+            )
+            for record in records:
+                stored[int(record.id)] = (record.payload or {}).get("content_hash")
+            if offset is None:
+                break
+        return stored
+    
+    @staticmethod
+    def _with_content_hash(embeddings: np.ndarray,
+                           metadata: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        為每筆元資料加上向量與元資料的內容雜湊
+        
+        Args:
+            embeddings: 向量陣列
+            metadata: 元資料列表
+        
+        Returns:
+            含 content_hash 欄位的 payload 列表
+        """
+        payloads = []
+        for vec, meta in zip(embeddings, metadata):
+            payload = {k: v for k, v in meta.items() if k != 'content_hash'}
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(np.ascontiguousarray(vec, dtype=np.float32).tobytes())
+            digest.update(json.dumps(payload, sort_keys=True, default=str).encode("utf-8"))
+            payload['content_hash'] = digest.hexdigest()
+            payloads.append(payload)
+        return payloads
+    
     def search_similar(self, 
                       mal_id: int,
                       collection_name: str = COLLECTION_NAME,
-                      limit: int = DEFAULT_SEARCH_LIMIT) -> List[Dict[str, Any]]:
+                      limit: int = DEFAULT_SEARCH_LIMIT,
+                      search_filter: Optional[SearchFilter] = None) -> List[Dict[str, Any]]:
         """
         搜尋相似動漫
         
@@ -115,7 +634,8 @@ class QdrantManager:
             mal_id: 目標動漫的 MAL_ID
             collection_name: 集合名稱
             limit: 回傳結果數量
-            
+            search_filter: 篩選條件，由 Qdrant 在搜尋時以 payload 索引套用
+        
         Returns:
             相似動漫列表
         """
@@ -126,28 +646,295 @@ class QdrantManager:
         mal_id = int(mal_id)
         
         # 取得目標動漫的向量
-        search_result = self.client.retrieve(
-            collection_name=collection_name,
-            ids=[mal_id],
-            with_payload=True,
-            with_vectors=True
-        )
+        with metrics.span("qdrant.retrieve"):
+            search_result = self.client.retrieve(
+                collection_name=collection_name,
+                ids=[mal_id],
+                with_payload=True,
+                with_vectors=True
+            )
         
         if not search_result:
             raise ValueError(f"MAL_ID {mal_id} 在集合中不存在")
         
         # 使用向量搜尋相似項目
         query_vector = search_result[0].vector
-        similar_results = self.client.search(
-            collection_name=collection_name,
-            query_vector=query_vector,
-            limit=limit,
-            with_payload=True
-        )
+        with metrics.span("qdrant.search"):
+            similar_results = self.client.search(
+                collection_name=collection_name,
+                query_vector=query_vector,
+                query_filter=self._query_filter(search_filter),
+                limit=limit,
+                with_payload=True,
+                search_params=search_params(self.quantization)
+            )
+        
+        with metrics.span("qdrant.format"):
+            return self._format_results(similar_results)
+    
+    def recommend_by_mal_ids(self,
+                             mal_ids: List[int],
+                             collection_name: str = COLLECTION_NAME,
+                             limit: int = DEFAULT_SEARCH_LIMIT,
+                             chunk_size: int = SEARCH_BATCH_SIZE,
+                             exclude_self: bool = False,
+                             search_filter: Optional[SearchFilter] = None) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        批次搜尋多個動漫的相似動漫
+        
+        以一次 retrieve 取得所有查詢向量，再依 chunk_size 分段呼叫
+        Qdrant 的批次搜尋 API，減少網路往返次數。
+        
+        Args:
+            mal_ids: 目標動漫的 MAL_ID 列表
+            collection_name: 集合名稱
+            limit: 每個 MAL_ID 回傳結果數量
+            chunk_size: 每次批次搜尋包含的查詢數量
+            exclude_self: 是否從結果中排除查詢動漫本身
+            search_filter: 篩選條件，由 Qdrant 在搜尋時以 payload 索引套用
+        
+        Returns:
+            以 MAL_ID 為鍵的相似動漫列表字典 (不存在於集合中的 MAL_ID 不會出現)
+        """
+        if self.client is None:
+            self.connect()
+        
+        if chunk_size <= 0:
+            raise ValueError("chunk_size 必須大於 0")
+        
+        # 確保 mal_id 是標準 Python int 類型，並去除重複
+        mal_ids = list(dict.fromkeys(int(mal_id) for mal_id in mal_ids))
+        if not mal_ids:
+            return {}
+        
+        # 一次取得所有目標動漫的向量
+        with metrics.span("qdrant.retrieve"):
+            records = self.client.retrieve(
+                collection_name=collection_name,
+                ids=mal_ids,
+                with_payload=False,
+                with_vectors=True
+            )
+        vectors = {int(record.id): record.vector for record in records}
+        
+        missing = [mal_id for mal_id in mal_ids if mal_id not in vectors]
+        if missing:
+            print(f"以下 MAL_ID 在集合中不存在，已略過: {missing}")
+        
+        found_ids = [mal_id for mal_id in mal_ids if mal_id in vectors]
+        search_limit = limit + 1 if exclude_self else limit
+        query_filter = self._query_filter(search_filter)
+        
+        results = {}
+        for start in range(0, len(found_ids), chunk_size):
+            chunk_ids = found_ids[start:start + chunk_size]
+            requests = [
+                SearchRequest(
+                    vector=vectors[mal_id],
+                    filter=query_filter,
+                    limit=search_limit,
+                    with_payload=True,
+                    params=search_params(self.quantization)
+                )
+                for mal_id in chunk_ids
+            ]
+            with metrics.span("qdrant.search_batch"):
+                batch_results = self.client.search_batch(
+                    collection_name=collection_name,
+                    requests=requests
+                )
+            
+            for mal_id, similar_results in zip(chunk_ids, batch_results):
+                with metrics.span("qdrant.format"):
+                    formatted = self._format_results(similar_results)
+                if exclude_self:
+                    formatted = [r for r in formatted if r['MAL_ID'] != mal_id]
+                results[mal_id] = formatted[:limit]
+        
+        return results
+    
+    def recommend_by_profile(self,
+                             liked_ids: List[int],
+                             disliked_ids: Optional[List[int]] = None,
+                             limit: int = DEFAULT_SEARCH_LIMIT,
+                             collection_name: str = COLLECTION_NAME,
+                             search_filter: Optional[SearchFilter] = None) -> List[Dict[str, Any]]:
+        """
+        以 Qdrant recommend API 搜尋：範例向量由伺服器端取得並平均，只需一次請求，
+        結果自動排除作為範例的動漫
+        
+        Args:
+            liked_ids: 喜歡的動漫 MAL_ID 列表
+            disliked_ids: 不喜歡的動漫 MAL_ID 列表
+            limit: 回傳結果數量
+            collection_name: 集合名稱
+            search_filter: 篩選條件，由 Qdrant 在搜尋時以 payload 索引套用
+        
+        Returns:
+            相似動漫列表
+        """
+        if self.client is None:
+            self.connect()
+        
+        positive, negative = self._profile_examples(liked_ids, disliked_ids)
+        try:
+            with metrics.span("qdrant.recommend"):
+                similar_results = self.client.recommend(
+                    collection_name=collection_name,
+                    positive=positive,
+                    negative=negative,
+                    query_filter=self._query_filter(search_filter),
+                    limit=limit,
+                    with_payload=True,
+                    search_params=search_params(self.quantization)
+                )
+        except UnexpectedResponse as e:
+            # 範例中有不存在的 MAL_ID 時 Qdrant 回傳 404
+            raise ValueError(f"範例動漫在集合中不存在: {e}") from e
+        
+        with metrics.span("qdrant.format"):
+            return self._format_results(similar_results)
+    
+    @staticmethod
+    def _profile_examples(liked_ids: List[int],
+                          disliked_ids: Optional[List[int]]) -> tuple:
+        """
+        整理 recommend API 的範例 (去除重複，同時出現在兩邊的 MAL_ID 視為喜歡)
+        
+        Args:
+            liked_ids: 喜歡的動漫 MAL_ID 列表
+            disliked_ids: 不喜歡的動漫 MAL_ID 列表
+        
+        Returns:
+            (正面範例, 負面範例)
+        """
+        positive = list(dict.fromkeys(int(mal_id) for mal_id in liked_ids))
+        if not positive:
+            raise ValueError("liked_ids 不可為空")
+        negative = [mal_id for mal_id in dict.fromkeys(int(mal_id) for mal_id in disliked_ids or [])
+                    if mal_id not in positive]
+        return positive, negative
+    
+    def get_vectors(self, mal_ids: List[int],
+                    collection_name: str = COLLECTION_NAME) -> np.ndarray:
+        """
+        以一次 retrieve 取得多個動漫的向量
+        
+        Args:
+            mal_ids: MAL_ID 列表
+            collection_name: 集合名稱
+        
+        Returns:
+            與 mal_ids 順序對應的向量矩陣
+        """
+        if self.client is None:
+            self.connect()
+        
+        mal_ids = [int(mal_id) for mal_id in mal_ids]
+        with metrics.span("qdrant.retrieve"):
+            records = self.client.retrieve(
+                collection_name=collection_name,
+                ids=mal_ids,
+                with_payload=False,
+                with_vectors=True
+            )
+        vectors = {int(record.id): record.vector for record in records}
+        
+        missing = [mal_id for mal_id in mal_ids if mal_id not in vectors]
+        if missing:
+            raise ValueError(f"以下 MAL_ID 在集合中不存在: {missing}")
+        return np.array([vectors[mal_id] for mal_id in mal_ids], dtype=np.float32)
+    
+    def search_by_vector(self,
+                         vector: np.ndarray,
+                         limit: int = DEFAULT_SEARCH_LIMIT,
+                         collection_name: str = COLLECTION_NAME,
+                         search_filter: Optional[SearchFilter] = None) -> List[Dict[str, Any]]:
+        """
+        以查詢向量搜尋相似動漫
+        
+        Args:
+            vector: 查詢向量
+            limit: 回傳結果數量
+            collection_name: 集合名稱
+            search_filter: 篩選條件，由 Qdrant 在搜尋時以 payload 索引套用
+        
+        Returns:
+            相似動漫列表
+        """
+        if self.client is None:
+            self.connect()
+        
+        with metrics.span("qdrant.search"):
+            similar_results = self.client.search(
+                collection_name=collection_name,
+                query_vector=np.asarray(vector, dtype=np.float32).tolist(),
+                query_filter=self._query_filter(search_filter),
+                limit=limit,
+                with_payload=True,
+                search_params=search_params(self.quantization)
+            )
         
-        # 格式化結果
+        with metrics.span("qdrant.format"):
+            return self._format_results(similar_results)
+    
+    def _quantization_config(self, vector_size: int):
+        """
+        依設定產生集合的量化設定
+        
+        Args:
+            vector_size: 向量維度
+        
+        Returns:
+            Qdrant 量化設定，未啟用量化時回傳 None
+        """
+        if self.quantization is None:
+            return None
+        if self.quantization == "int8":
+            return ScalarQuantization(
+                scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+            )
+        if self.quantization == "pq":
+            # 壓縮比接近本地 PQ (每個向量壓縮為 PQ_SUBSPACES 個位元組)，
+            # 並取最接近的 Qdrant 支援值 (x4、x8、x16、x32、x64)
+            ratio = vector_size * 4 / PQ_SUBSPACES
+            ratio = 2 ** min(6, max(2, int(round(np.log2(ratio)))))
+            return ProductQuantization(
+                product=ProductQuantizationConfig(
+                    compression=CompressionRatio(f"x{ratio}"), always_ram=True
+                )
+            )
+        
+        raise ValueError(f"Qdrant 不支援的量化方式: {self.quantization}")
+    
+    @staticmethod
+    def _query_filter(search_filter: Optional[SearchFilter]):
+        """
+        將篩選條件轉為 Qdrant Filter
+        
+        Args:
+            search_filter: 篩選條件
+        
+        Returns:
+            Qdrant Filter，未指定條件時回傳 None
+        """
+        if search_filter is None:
+            return None
+        return search_filter.to_qdrant()
+    
+    @staticmethod
+    def _format_results(points) -> List[Dict[str, Any]]:
+        """
+        格式化搜尋結果
+        
+        Args:
+            points: Qdrant 回傳的 ScoredPoint 列表
+        
+        Returns:
+            包含 MAL_ID、Name、Score 的字典列表
+        """
         results = []
-        for r in similar_results:
+        for r in points:
             results.append({
                 'MAL_ID': r.payload["MAL_ID"],
                 'Name': r.payload.get("Name", ""),
@@ -188,7 +975,7 @@ class QdrantManager:
         
         Args:
             collection_name: 集合名稱
-            
+        
         Returns:
             集合資訊
         """
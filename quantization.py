@@ -0,0 +1,347 @@
+"""
+向量量化模組 - 提供 float16、int8 純量量化與乘積量化 (PQ)，用於壓縮向量並快速估算相似度
+"""
+
+import numpy as np
+from typing import Optional
+from config import PQ_SUBSPACES, PQ_TRAIN_SIZE, KMEANS_ITERATIONS
+
+# 估算分數時每次展開的向量列數，避免一次配置 (查詢數 × 全部向量) 的浮點暫存
+_SCORE_BLOCK_ROWS = 16384
+# 純量量化計分時每次解碼的列數：解碼緩衝區 (約 1 MB) 留在 CPU 快取中，不展開整個碼矩陣
+_DECODE_BLOCK_ROWS = 256
+# 編碼時每次讀取的列數，訓練與編碼不需配置與整個向量矩陣同大小的暫存
+_ENCODE_BLOCK_ROWS = 1024
+# float16 位元左移 13 位並清除第 28~30 位即為 float32 位元，數值為原值的 2^-112 倍 (指數偏移 127 - 15)
+_FLOAT16_BITS_MASK = np.int32(-0x70000001)  # 0x8FFFFFFF
+_FLOAT16_EXPONENT_SCALE = np.float32(2.0 ** 112)
+
+
+def kmeans(data: np.ndarray, k: int,
+           n_iter: int = KMEANS_ITERATIONS,
+           seed: int = 0) -> np.ndarray:
+    """
+    以 Lloyd 演算法計算 k-means 中心點
+    
+    Args:
+        data: 資料矩陣，形狀為 (筆數, 維度)
+        k: 中心點數量
+        n_iter: 迭代次數
+        seed: 隨機種子
+    
+    Returns:
+        中心點矩陣，形狀為 (k, 維度)
+    """
+    data = np.asarray(data, dtype=np.float32)
+    if len(data) < k:
+        raise ValueError(f"資料筆數 ({len(data)}) 少於中心點數量 ({k})")
+    
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), k, replace=False)].copy()
+    
+    for _ in range(n_iter):
+        assignments = assign_clusters(data, centroids)
+        counts = np.bincount(assignments, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, data)
+        
+        # 空的群集以隨機資料點重新初始化
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        if empty.any():
+            centroids[empty] = data[rng.choice(len(data), int(empty.sum()), replace=False)]
+    
+    return centroids
+
+
+def assign_clusters(data: np.ndarray, centroids: np.ndarray,
+                    block_rows: int = _SCORE_BLOCK_ROWS) -> np.ndarray:
+    """
+    將每筆資料指派給最近的中心點 (歐氏距離)
+    
+    Args:
+        data: 資料矩陣
+        centroids: 中心點矩陣
+        block_rows: 每次計算的資料列數
+    
+    Returns:
+        每筆資料所屬中心點的索引
+    """
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    assignments = np.empty(len(data), dtype=np.int64)
+    for start in range(0, len(data), block_rows):
+        block = np.asarray(data[start:start + block_rows], dtype=np.float32)
+        # ||x - c||^2 = ||x||^2 - 2 x·c + ||c||^2，||x||^2 對 argmin 無影響
+        distances = centroid_norms[None, :] - 2.0 * (block @ centroids.T)
+        assignments[start:start + len(block)] = distances.argmin(axis=1)
+    return assignments
+
+
+def normalized_blocks(vectors: np.ndarray, norms: Optional[np.ndarray] = None,
+                      block_rows: int = _ENCODE_BLOCK_ROWS):
+    """
+    逐區塊取出 float32 向量 (記憶體映射時每次只讀入一個區塊)
+    
+    Args:
+        vectors: 向量矩陣
+        norms: 每列的範數，指定時將向量除以範數；None 表示向量已正規化
+        block_rows: 每個區塊的列數
+    
+    Yields:
+        (起始列, float32 向量區塊)
+    """
+    for start in range(0, len(vectors), block_rows):
+        block = np.asarray(vectors[start:start + block_rows], dtype=np.float32)
+        if norms is not None:
+            block = block / norms[start:start + len(block), None]
+        yield start, block
+
+
+def sample_rows(vectors: np.ndarray, size: int, norms: Optional[np.ndarray] = None,
+                seed: int = 0) -> np.ndarray:
+    """
+    隨機抽樣列並正規化
+    
+    Args:
+        vectors: 向量矩陣
+        size: 抽樣數量上限
+        norms: 每列的範數，None 表示向量已正規化
+        seed: 隨機種子
+    
+    Returns:
+        float32 樣本矩陣
+    """
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(len(vectors), min(len(vectors), size), replace=False))
+    sample = np.asarray(vectors[rows], dtype=np.float32)
+    if norms is not None:
+        sample /= norms[rows, None]
+    return sample
+
+
+class Float16Quantizer:
+    """
+    以 float16 儲存向量，記憶體減半
+    
+    NumPy 的 float16 轉型與矩陣乘法都沒有向量化，計分時改以整數位元運算逐區塊
+    解碼為 float32 (結果與 astype 完全相同)，並把 2^112 的指數補償乘在查詢上。
+    """
+    
+    def fit(self, vectors: np.ndarray, norms: Optional[np.ndarray] = None) -> None:
+        """
+        壓縮向量
+        
+        Args:
+            vectors: 向量矩陣 (可為記憶體映射)
+            norms: 每列的範數，None 表示向量已正規化
+        """
+        self.codes = np.empty(vectors.shape, dtype=np.float16)
+        for start, block in normalized_blocks(vectors, norms):
+            self.codes[start:start + len(block)] = block
+    
+    def scores(self, queries: np.ndarray) -> np.ndarray:
+        """
+        估算查詢與所有向量的內積
+        
+        Args:
+            queries: 查詢矩陣 (float32)
+        
+        Returns:
+            分數矩陣，形狀為 (查詢數量, 向量數量)
+        """
+        queries = np.asarray(queries, dtype=np.float32) * _FLOAT16_EXPONENT_SCALE
+        bits = self.codes.view(np.int16)
+        out = np.empty((len(queries), len(bits)), dtype=np.float32)
+        buffer = np.empty((min(_DECODE_BLOCK_ROWS, len(bits)), bits.shape[1]), dtype=np.int32)
+        for start in range(0, len(bits), _DECODE_BLOCK_ROWS):
+            block = bits[start:start + _DECODE_BLOCK_ROWS]
+            decoded = buffer[:len(block)]
+            # int16 符號延伸為 int32 後，符號位在第 31 位、指數與尾數在第 13~27 位
+            np.copyto(decoded, block)
+            np.left_shift(decoded, 13, out=decoded)
+            np.bitwise_and(decoded, _FLOAT16_BITS_MASK, out=decoded)
+            np.matmul(queries, decoded.view(np.float32).T, out=out[:, start:start + len(block)])
+        return out
+    
+    @property
+    def nbytes(self) -> int:
+        """壓縮後的位元組數"""
+        return int(self.codes.nbytes)
+
+
+class Int8Quantizer:
+    """逐維度對稱純量量化為 int8，記憶體為 float32 的 1/4"""
+    
+    def __init__(self, quantile: float = 0.999,
+                 train_size: int = PQ_TRAIN_SIZE):
+        """
+        Args:
+            quantile: 決定每維縮放比例的絕對值分位數，截斷極端值以保留解析度
+            train_size: 估計分位數時抽樣的向量數量上限
+        """
+        self.quantile = quantile
+        self.train_size = train_size
+    
+    def fit(self, vectors: np.ndarray, norms: Optional[np.ndarray] = None) -> None:
+        """
+        計算每維縮放比例並量化向量
+        
+        Args:
+            vectors: 向量矩陣 (可為記憶體映射)
+            norms: 每列的範數，None 表示向量已正規化
+        """
+        sample = np.abs(sample_rows(vectors, self.train_size, norms))
+        scale = np.quantile(sample, self.quantile, axis=0, overwrite_input=True) / 127.0
+        del sample
+        self.scale = np.where(scale > 0, scale, 1.0).astype(np.float32)
+        
+        self.codes = np.empty(vectors.shape, dtype=np.int8)
+        for start, block in normalized_blocks(vectors, norms):
+            block = block / self.scale
+            np.rint(block, out=block)
+            np.clip(block, -127, 127, out=block)
+            self.codes[start:start + len(block)] = block
+    
+    def scores(self, queries: np.ndarray) -> np.ndarray:
+        """
+        估算查詢與所有向量的內積
+        
+        Args:
+            queries: 查詢矩陣 (float32)
+        
+        Returns:
+            分數矩陣，形狀為 (查詢數量, 向量數量)
+        """
+        # 每維縮放比例乘在查詢上，碼只需轉為浮點數即可與查詢相乘
+        scaled_queries = np.asarray(queries, dtype=np.float32) * self.scale
+        out = np.empty((len(queries), len(self.codes)), dtype=np.float32)
+        buffer = np.empty((min(_DECODE_BLOCK_ROWS, len(self.codes)), self.codes.shape[1]), dtype=np.float32)
+        for start in range(0, len(self.codes), _DECODE_BLOCK_ROWS):
+            block = self.codes[start:start + _DECODE_BLOCK_ROWS]
+            decoded = buffer[:len(block)]
+            np.copyto(decoded, block)
+            np.matmul(scaled_queries, decoded.T, out=out[:, start:start + len(block)])
+        return out
+    
+    @property
+    def nbytes(self) -> int:
+        """壓縮後的位元組數"""
+        return int(self.codes.nbytes + self.scale.nbytes)
+
+
+def pq_subspaces(dimension: int, preferred: int = PQ_SUBSPACES) -> int:
+    """
+    取得不超過指定數量、且能整除向量維度的最大子空間數量
+    
+    Args:
+        dimension: 向量維度
+        preferred: 希望的子空間數量
+    
+    Returns:
+        子空間數量
+    """
+    for subspaces in range(min(preferred, dimension), 0, -1):
+        if dimension % subspaces == 0:
+            return subspaces
+    raise ValueError(f"無效的向量維度: {dimension}")
+
+
+class ProductQuantizer:
+    """
+    乘積量化：將向量切成 m 個子空間，每個子空間以 256 個中心點編碼為 1 位元組
+    
+    768 維、m=96 時每個向量只需 96 位元組 (float32 的 1/32)。
+    """
+    
+    def __init__(self, subspaces: int = PQ_SUBSPACES,
+                 train_size: int = PQ_TRAIN_SIZE,
+                 n_iter: int = KMEANS_ITERATIONS):
+        """
+        Args:
+            subspaces: 子空間數量 (無法整除向量維度時改用不超過此值的最大因數)
+            train_size: 訓練中心點時抽樣的向量數量上限
+            n_iter: k-means 迭代次數
+        """
+        self.subspaces = subspaces
+        self.train_size = train_size
+        self.n_iter = n_iter
+    
+    def fit(self, vectors: np.ndarray, norms: Optional[np.ndarray] = None) -> None:
+        """
+        訓練各子空間的中心點並編碼向量
+        
+        Args:
+            vectors: 向量矩陣 (可為記憶體映射)
+            norms: 每列的範數，None 表示向量已正規化
+        """
+        count, dimension = vectors.shape
+        subspaces = pq_subspaces(dimension, self.subspaces)
+        if subspaces != self.subspaces:
+            print(f"向量維度 ({dimension}) 無法被子空間數量 ({self.subspaces}) 整除，改用 {subspaces} 個子空間")
+            self.subspaces = subspaces
+        
+        sub_dim = dimension // self.subspaces
+        n_centroids = min(256, count)
+        sample = sample_rows(vectors, self.train_size, norms)
+        
+        self.centroids = np.empty((self.subspaces, n_centroids, sub_dim), dtype=np.float32)
+        for m in range(self.subspaces):
+            columns = slice(m * sub_dim, (m + 1) * sub_dim)
+            self.centroids[m] = kmeans(sample[:, columns], n_centroids, n_iter=self.n_iter, seed=m)
+        del sample
+        
+        self.codes = np.empty((count, self.subspaces), dtype=np.uint8)
+        for start, block in normalized_blocks(vectors, norms):
+            for m in range(self.subspaces):
+                columns = slice(m * sub_dim, (m + 1) * sub_dim)
+                self.codes[start:start + len(block), m] = assign_clusters(block[:, columns], self.centroids[m])
+    
+    def scores(self, queries: np.ndarray) -> np.ndarray:
+        """
+        以查表 (ADC) 估算查詢與所有向量的內積
+        
+        Args:
+            queries: 查詢矩陣 (float32)
+        
+        Returns:
+            分數矩陣，形狀為 (查詢數量, 向量數量)
+        """
+        sub_dim = self.centroids.shape[2]
+        sub_queries = queries.reshape(len(queries), self.subspaces, sub_dim)
+        # 每個查詢在每個子空間與 256 個中心點的內積表，形狀為 (查詢數, m, 256)
+        tables = np.einsum("qmd,mkd->qmk", sub_queries, self.centroids)
+        
+        subspace_index = np.arange(self.subspaces)
+        out = np.empty((len(queries), len(self.codes)), dtype=np.float32)
+        for start in range(0, len(self.codes), _SCORE_BLOCK_ROWS):
+            block = self.codes[start:start + _SCORE_BLOCK_ROWS]
+            for q, table in enumerate(tables):
+                out[q, start:start + len(block)] = table[subspace_index, block].sum(axis=1)
+        return out
+    
+    @property
+    def nbytes(self) -> int:
+        """壓縮後的位元組數"""
+        return int(self.codes.nbytes + self.centroids.nbytes)
+
+
+def create_quantizer(quantization: Optional[str]):
+    """
+    依名稱建立量化器
+    
+    Args:
+        quantization: "float16"、"int8"、"pq" 或 None
+    
+    Returns:
+        量化器實例，None 表示不量化
+    """
+    if quantization is None:
+        return None
+    if quantization == "float16":
+        return Float16Quantizer()
+    if quantization == "int8":
+        return Int8Quantizer()
+    if quantization == "pq":
+        return ProductQuantizer()
+    
+    raise ValueError(f"不支援的量化方式: {quantization}")
@@ -0,0 +1,129 @@
+"""
+查詢向量化模組 - 將自由文字查詢轉為向量，並提供快取與微批次處理
+"""
+
+import threading
+import time
+import numpy as np
+from concurrent.futures import Future
+from typing import Dict
+from cache import LRUCache
+from config import (
+    QUERY_CACHE_SIZE, QUERY_CACHE_TTL, QUERY_BATCH_WINDOW, QUERY_MAX_BATCH_SIZE
+)
+
+
+class QueryEncoder:
+    """
+    查詢向量化器
+    
+    相同的查詢 (正規化後) 會命中 LRU/TTL 快取；同時到達的多個未命中查詢
+    會在 batch_window 秒內合併為一次 encode 呼叫。每個請求最多執行一個批次，
+    持續的查詢流量不會讓單一請求無限期地替其他請求編碼。
+    """
+    
+    def __init__(self, embedding_generator,
+                 cache_size: int = QUERY_CACHE_SIZE,
+                 cache_ttl: float = QUERY_CACHE_TTL,
+                 batch_window: float = QUERY_BATCH_WINDOW,
+                 max_batch_size: int = QUERY_MAX_BATCH_SIZE):
+        """
+        初始化查詢向量化器
+        
+        Args:
+            embedding_generator: 向量生成器 (共用同一個模型)
+            cache_size: 快取的查詢數量上限
+            cache_ttl: 快取項目存活秒數
+            batch_window: 收集同時到達查詢的等待秒數
+            max_batch_size: 單次 encode 的查詢數量上限
+        """
+        self.embedding_generator = embedding_generator
+        self.cache = LRUCache(cache_size, ttl=cache_ttl)
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self._condition = threading.Condition()
+        self._pending: Dict[str, Future] = {}
+        self._leader_active = False
+    
+    @staticmethod
+    def normalize(query: str) -> str:
+        """
+        正規化查詢文字 (合併空白並轉小寫；all-mpnet-base-v2 的 tokenizer 本身不分大小寫)
+        
+        Args:
+            query: 查詢文字
+        
+        Returns:
+            正規化後的查詢文字
+        """
+        return " ".join(str(query).split()).lower()
+    
+    def encode(self, query: str) -> np.ndarray:
+        """
+        取得查詢向量
+        
+        Args:
+            query: 查詢文字
+        
+        Returns:
+            唯讀的查詢向量
+        """
+        key = self.normalize(query)
+        if not key:
+            raise ValueError("查詢文字不可為空")
+        
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        
+        with self._condition:
+            future = self._pending.get(key)
+            if future is None:
+                future = Future()
+                self._pending[key] = future
+        
+        # 沒有其他請求正在編碼時由目前的請求擔任 leader，只編碼一個批次 (包含自己的查詢) 後
+        # 交出 leader，等待中的請求再由其中一個接手，任何請求最多只負責一次 encode
+        while True:
+            with self._condition:
+                if future.done():
+                    break
+                if self._leader_active:
+                    self._condition.wait()
+                    continue
+                self._leader_active = True
+            self._encode_batch(key)
+        return future.result()
+    
+    def _encode_batch(self, key: str) -> None:
+        """
+        收集等待中的查詢並編碼一個批次，完成後交出 leader
+        
+        Args:
+            key: leader 自己的查詢 (一定包含在批次中)
+        """
+        try:
+            with self._condition:
+                waiting = len(self._pending)
+            if self.batch_window > 0 and waiting < self.max_batch_size:
+                time.sleep(self.batch_window)
+            
+            with self._condition:
+                keys = [key] + [other for other in self._pending if other != key][:self.max_batch_size - 1]
+                futures = [self._pending.pop(other) for other in keys]
+            
+            try:
+                vectors = self.embedding_generator.encode_queries(keys)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                return
+            
+            for other, future, vector in zip(keys, futures, vectors):
+                vector.setflags(write=False)
+                self.cache.put(other, vector)
+                future.set_result(vector)
+        finally:
+            with self._condition:
+                self._leader_active = False
+                self._condition.notify_all()
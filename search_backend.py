@@ -0,0 +1,143 @@
+"""
+搜尋後端介面模組 - 定義所有向量搜尋後端共用的介面
+"""
+
+from abc import ABC, abstractmethod
+from typing import List, Dict, Any, Optional
+import numpy as np
+from config import DEFAULT_SEARCH_LIMIT, SEARCH_BATCH_SIZE, SEARCH_BACKEND
+from search_filter import SearchFilter
+
+
+class SearchBackend(ABC):
+    """向量搜尋後端抽象介面"""
+    
+    @abstractmethod
+    def build_index(self,
+                    embeddings: np.ndarray,
+                    metadata: List[Dict[str, Any]],
+                    force_rebuild: bool = False) -> None:
+        """
+        以向量與元資料建立 (或載入既有的) 搜尋索引
+        
+        Args:
+            embeddings: 向量陣列
+            metadata: 元資料列表，需包含 MAL_ID 與 Name (篩選欄位 Genres、Score、Type、Episodes 可選)
+            force_rebuild: 是否強制重建索引
+        """
+    
+    @abstractmethod
+    def search_similar(self,
+                       mal_id: int,
+                       limit: int = DEFAULT_SEARCH_LIMIT,
+                       search_filter: Optional[SearchFilter] = None) -> List[Dict[str, Any]]:
+        """
+        搜尋相似動漫
+        
+        Args:
+            mal_id: 目標動漫的 MAL_ID
+            limit: 回傳結果數量
+            search_filter: 篩選條件，於搜尋時套用
+        
+        Returns:
+            相似動漫列表
+        """
+    
+    @abstractmethod
+    def recommend_by_mal_ids(self,
+                             mal_ids: List[int],
+                             limit: int = DEFAULT_SEARCH_LIMIT,
+                             chunk_size: int = SEARCH_BATCH_SIZE,
+                             exclude_self: bool = False,
+                             search_filter: Optional[SearchFilter] = None) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        批次搜尋多個動漫的相似動漫
+        
+        Args:
+            mal_ids: 目標動漫的 MAL_ID 列表
+            limit: 每個 MAL_ID 回傳結果數量
+            chunk_size: 每次批次搜尋包含的查詢數量
+            exclude_self: 是否從結果中排除查詢動漫本身
+            search_filter: 篩選條件，於搜尋時套用
+        
+        Returns:
+            以 MAL_ID 為鍵的相似動漫列表字典
+        """
+    
+    @abstractmethod
+    def search_by_vector(self,
+                         vector: np.ndarray,
+                         limit: int = DEFAULT_SEARCH_LIMIT,
+                         search_filter: Optional[SearchFilter] = None) -> List[Dict[str, Any]]:
+        """
+        以查詢向量搜尋相似動漫
+        
+        Args:
+            vector: 查詢向量
+            limit: 回傳結果數量
+            search_filter: 篩選條件，於搜尋時套用
+        
+        Returns:
+            相似動漫列表
+        """
+    
+    @abstractmethod
+    def recommend_by_profile(self,
+                             liked_ids: List[int],
+                             disliked_ids: Optional[List[int]] = None,
+                             limit: int = DEFAULT_SEARCH_LIMIT,
+                             search_filter: Optional[SearchFilter] = None) -> List[Dict[str, Any]]:
+        """
+        以多個喜歡 (與不喜歡) 的動漫作為範例，一次搜尋取得推薦
+        
+        查詢向量為喜歡的動漫向量平均值 p 與不喜歡的平均值 n 組成的 p + (p - n)
+        (沒有不喜歡的動漫時即為 p)，與 Qdrant recommend API 的 average_vector 策略相同。
+        
+        Args:
+            liked_ids: 喜歡的動漫 MAL_ID 列表
+            disliked_ids: 不喜歡的動漫 MAL_ID 列表
+            limit: 回傳結果數量
+            search_filter: 篩選條件，於搜尋時套用
+        
+        Returns:
+            相似動漫列表 (不包含作為範例的動漫)
+        """
+    
+    @abstractmethod
+    def get_vectors(self, mal_ids: List[int]) -> np.ndarray:
+        """
+        取得多個動漫的向量
+        
+        Args:
+            mal_ids: MAL_ID 列表
+        
+        Returns:
+            與 mal_ids 順序對應的向量矩陣
+        
+        Raises:
+            ValueError: 有 MAL_ID 不存在
+        """
+
+
+def create_search_backend(backend: str = SEARCH_BACKEND) -> SearchBackend:
+    """
+    依名稱建立搜尋後端
+    
+    Args:
+        backend: 後端名稱 ("qdrant"、"local" 或 "ivf")
+    
+    Returns:
+        搜尋後端實例
+    """
+    # 延遲匯入，使用本地後端時不需要安裝 qdrant-client
+    if backend == "qdrant":
+        from qdrant_manager import QdrantManager
+        return QdrantManager()
+    if backend == "local":
+        from local_search import LocalSearchBackend
+        return LocalSearchBackend()
+    if backend == "ivf":
+        from ivf_index import IVFSearchBackend
+        return IVFSearchBackend()
+    
+    raise ValueError(f"不支援的搜尋後端: {backend}")
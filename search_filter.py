@@ -0,0 +1,206 @@
+"""
+搜尋篩選模組 - 以類型、評分、播出形式與集數篩選搜尋結果
+"""
+
+import numpy as np
+from typing import Any, Dict, List, Optional, Sequence
+
+
+class SearchFilter:
+    """
+    搜尋篩選條件
+
+    篩選在向量搜尋內部執行 (Qdrant 使用 payload 索引，本地後端使用布林遮罩)，
+    因此結果數量不會因事後過濾而少於 limit。
+
+    範例:
+        SearchFilter(genres=["Sci-Fi"], min_score=8.0)
+    """
+    
+    def __init__(self,
+                 genres: Optional[Sequence[str]] = None,
+                 any_genres: Optional[Sequence[str]] = None,
+                 exclude_genres: Optional[Sequence[str]] = None,
+                 min_score: Optional[float] = None,
+                 max_score: Optional[float] = None,
+                 types: Optional[Sequence[str]] = None,
+                 min_episodes: Optional[int] = None,
+                 max_episodes: Optional[int] = None):
+        """
+        初始化篩選條件 (所有條件須同時成立)
+        
+        Args:
+            genres: 必須包含的全部類型
+            any_genres: 至少包含其中一個類型
+            exclude_genres: 不可包含的類型
+            min_score: 最低評分
+            max_score: 最高評分
+            types: 允許的播出形式 (例如 TV、Movie、OVA)
+            min_episodes: 最少集數
+            max_episodes: 最多集數
+        """
+        self.genres = list(genres or [])
+        self.any_genres = list(any_genres or [])
+        self.exclude_genres = list(exclude_genres or [])
+        self.min_score = min_score
+        self.max_score = max_score
+        self.types = list(types or [])
+        self.min_episodes = min_episodes
+        self.max_episodes = max_episodes
+    
+    def cache_key(self) -> tuple:
+        """
+        產生可雜湊的鍵，條件相同的篩選會得到相同的鍵
+        
+        Returns:
+            篩選條件組成的 tuple
+        """
+        return (
+            tuple(sorted(self.genres)), tuple(sorted(self.any_genres)),
+            tuple(sorted(self.exclude_genres)), self.min_score, self.max_score,
+            tuple(sorted(self.types)), self.min_episodes, self.max_episodes,
+        )
+    
+    def to_qdrant(self):
+        """
+        轉換為 Qdrant 的 Filter
+        
+        Returns:
+            qdrant_client 的 Filter 物件
+        """
+        from qdrant_client.http.models import (
+            Filter, FieldCondition, MatchValue, MatchAny, Range
+        )
+        
+        must = [FieldCondition(key="Genres", match=MatchValue(value=genre)) for genre in self.genres]
+        if self.any_genres:
+            must.append(FieldCondition(key="Genres", match=MatchAny(any=self.any_genres)))
+        if self.min_score is not None or self.max_score is not None:
+            must.append(FieldCondition(key="Score", range=Range(gte=self.min_score, lte=self.max_score)))
+        if self.types:
+            must.append(FieldCondition(key="Type", match=MatchAny(any=self.types)))
+        if self.min_episodes is not None or self.max_episodes is not None:
+            must.append(FieldCondition(
+                key="Episodes", range=Range(gte=self.min_episodes, lte=self.max_episodes)
+            ))
+        
+        must_not = []
+        if self.exclude_genres:
+            must_not.append(FieldCondition(key="Genres", match=MatchAny(any=self.exclude_genres)))
+        
+        return Filter(must=must or None, must_not=must_not or None)
+    
+    def mask(self, payloads: "PayloadColumns") -> np.ndarray:
+        """
+        計算符合條件的列 (供本地後端使用)
+        
+        Args:
+            payloads: 欄位化的 payload
+            
+        Returns:
+            布林遮罩
+        """
+        mask = np.ones(payloads.count, dtype=bool)
+        for genre in self.genres:
+            mask &= payloads.genre_mask(genre)
+        if self.any_genres:
+            any_mask = np.zeros(payloads.count, dtype=bool)
+            for genre in self.any_genres:
+                any_mask |= payloads.genre_mask(genre)
+            mask &= any_mask
+        for genre in self.exclude_genres:
+            mask &= ~payloads.genre_mask(genre)
+        
+        # NaN 與任何數值比較皆為 False，缺少評分或集數的項目不會通過範圍條件
+        if self.min_score is not None:
+            mask &= payloads.scores >= self.min_score
+        if self.max_score is not None:
+            mask &= payloads.scores <= self.max_score
+        if self.types:
+            mask &= np.isin(payloads.types, self.types)
+        if self.min_episodes is not None:
+            mask &= payloads.episodes >= self.min_episodes
+        if self.max_episodes is not None:
+            mask &= payloads.episodes <= self.max_episodes
+        return mask
+
+
+class PayloadColumns:
+    """將 payload 列表轉為欄位陣列，並為每個類型預先建立布林遮罩"""
+    
+    def __init__(self, metadata: List[Dict[str, Any]]):
+        """
+        Args:
+            metadata: 元資料列表
+        """
+        self.count = len(metadata)
+        self.scores = np.array(
+            [np.nan if meta.get('Score') is None else meta['Score'] for meta in metadata],
+            dtype=np.float32
+        )
+        self.episodes = np.array(
+            [np.nan if meta.get('Episodes') is None else meta['Episodes'] for meta in metadata],
+            dtype=np.float32
+        )
+        self.types = np.array([meta.get('Type') or "" for meta in metadata], dtype=object)
+        
+        self._genre_masks: Dict[str, np.ndarray] = {}
+        for row, meta in enumerate(metadata):
+            for genre in meta.get('Genres') or []:
+                if genre not in self._genre_masks:
+                    self._genre_masks[genre] = np.zeros(self.count, dtype=bool)
+                self._genre_masks[genre][row] = True
+    
+    def genre_mask(self, genre: str) -> np.ndarray:
+        """
+        取得包含指定類型的列
+        
+        Args:
+            genre: 類型名稱
+            
+        Returns:
+            布林遮罩
+        """
+        mask = self._genre_masks.get(genre)
+        return mask if mask is not None else np.zeros(self.count, dtype=bool)
+    
+    def update(self, rows: Sequence[int], metadata: List[Dict[str, Any]]) -> None:
+        """
+        以新的 payload 取代既有列
+        
+        Args:
+            rows: 列索引
+            metadata: 與 rows 對應的元資料列表
+        """
+        replaced = PayloadColumns(metadata)
+        rows = np.asarray(rows, dtype=np.int64)
+        self.scores[rows] = replaced.scores
+        self.episodes[rows] = replaced.episodes
+        self.types[rows] = replaced.types
+        
+        for mask in self._genre_masks.values():
+            mask[rows] = False
+        for genre, mask in replaced._genre_masks.items():
+            if genre not in self._genre_masks:
+                self._genre_masks[genre] = np.zeros(self.count, dtype=bool)
+            self._genre_masks[genre][rows[mask]] = True
+    
+    def extend(self, metadata: List[Dict[str, Any]]) -> None:
+        """
+        追加新的列
+        
+        Args:
+            metadata: 元資料列表
+        """
+        added = PayloadColumns(metadata)
+        old_count = self.count
+        self.count += added.count
+        self.scores = np.concatenate([self.scores, added.scores])
+        self.episodes = np.concatenate([self.episodes, added.episodes])
+        self.types = np.concatenate([self.types, added.types])
+        
+        for genre in set(self._genre_masks) | set(added._genre_masks):
+            self._genre_masks[genre] = np.concatenate([
+                self._genre_masks.get(genre, np.zeros(old_count, dtype=bool)),
+                added._genre_masks.get(genre, np.zeros(added.count, dtype=bool)),
+            ])
@@ -0,0 +1,619 @@
+# server.py
+"""
+HTTP 服務模組 - 啟動時載入一次推薦系統，以 JSON API 提供推薦與搜尋
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs, unquote
+from async_recommender import AsyncAnimeRecommender
+from search_filter import SearchFilter
+from instrumentation import metrics, PrometheusExporter
+from config import (
+    DEFAULT_SEARCH_LIMIT, SEARCH_BACKEND, ASYNC_MAX_CONCURRENCY,
+    SERVER_HOST, SERVER_PORT, SERVER_MAX_BODY_SIZE, REQUEST_COUNTS_SAVE_INTERVAL
+)
+
+
+class HTTPError(Exception):
+    """帶有 HTTP 狀態碼的錯誤"""
+    
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class RecommendationServer:
+    """
+    推薦系統 HTTP 服務
+    
+    端點:
+        GET  /recommend/{mal_id}?limit=10&genres=Sci-Fi&min_score=8
+        POST /recommend:batch      {"mal_ids": [1, 5], "limit": 10, "exclude_self": true}
+        POST /recommend:profile    {"liked": [1, 5], "disliked": [20], "limit": 10}
+        GET  /search?q=...&limit=10&mode=vector|keyword|hybrid
+        (以上皆可加 include=Score,Genres 等目錄欄位，結果會附上 'info')
+        (/recommend/{mal_id}、/recommend:profile 與 mode=vector 的 /search 可加 mmr_lambda=0.5 以 MMR 增加多樣性)
+        GET  /health               程序存活即回傳 200
+        GET  /ready                系統載入完成回傳 200，否則 503
+        GET  /metrics              請求與快取、批次統計 (format=prometheus 輸出 Prometheus 文字格式)
+    
+    同時到達的單筆 /recommend 請求由 AsyncAnimeRecommender 合併為批次搜尋。
+    """
+    
+    STATUS_TEXT = {
+        200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+        413: "Payload Too Large", 414: "URI Too Long", 431: "Request Header Fields Too Large",
+        500: "Internal Server Error", 501: "Not Implemented", 503: "Service Unavailable",
+    }
+    # 回應後必須關閉連線的狀態碼 (請求內容未讀取或串流已無法對齊下一個請求)
+    CLOSING_STATUSES = (400, 413, 414, 431, 501)
+    MAX_HEADERS = 100
+    
+    def __init__(self, service: AsyncAnimeRecommender,
+                 host: str = SERVER_HOST, port: int = SERVER_PORT,
+                 max_body_size: int = SERVER_MAX_BODY_SIZE,
+                 serving_only: bool = True,
+                 request_counts_interval: float = REQUEST_COUNTS_SAVE_INTERVAL):
+        """
+        初始化 HTTP 服務
+        
+        Args:
+            service: 非同步推薦服務
+            host: 監聽位址
+            port: 監聽端口 (0 表示由系統指派)
+            max_body_size: 請求內容大小上限 (位元組)
+            serving_only: 是否優先以服務清單快速啟動，不重新處理資料
+            request_counts_interval: 定期儲存請求次數的間隔秒數 (0 表示只在關閉時儲存)
+        """
+        self.service = service
+        self.host = host
+        self.port = port
+        self.max_body_size = max_body_size
+        self.serving_only = serving_only
+        self.request_counts_interval = request_counts_interval
+        self.request_counts: Dict[str, int] = {}
+        self.error_counts: Dict[int, int] = {}
+        self.setup_error = None
+        self._server = None
+        self._setup_task = None
+        self._persist_task = None
+        self._connections: Dict[asyncio.StreamWriter, asyncio.Task] = {}
+    
+    async def start(self, setup: bool = True) -> None:
+        """
+        開始監聽，並在背景設定推薦系統 (設定完成前 /ready 回傳 503)
+        
+        Args:
+            setup: 是否在背景執行 service.setup()
+        """
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        print(f"HTTP 服務已啟動: http://{self.host}:{self.port}")
+        
+        if setup:
+            self._setup_task = asyncio.ensure_future(self._setup_service())
+    
+    async def serve_forever(self) -> None:
+        """持續提供服務直到被取消"""
+        async with self._server:
+            await self._server.serve_forever()
+    
+    async def close(self) -> None:
+        """停止監聽並關閉推薦服務 (關閉時儲存請求次數)"""
+        if self._setup_task is not None and not self._setup_task.done():
+            self._setup_task.cancel()
+        if self._persist_task is not None:
+            self._persist_task.cancel()
+        if self._server is not None:
+            self._server.close()
+            # 關閉閒置的 keep-alive 連線，否則會一直等待下一個請求
+            handlers = list(self._connections.values())
+            for writer in list(self._connections):
+                writer.close()
+            await asyncio.gather(*handlers, return_exceptions=True)
+            await self._server.wait_closed()
+        await self.service.close()
+    
+    async def _setup_service(self) -> None:
+        """在背景設定推薦系統"""
+        try:
+            await self.service.setup(serving_only=self.serving_only)
+            print("推薦系統載入完成，開始接受請求")
+        except Exception as e:
+            self.setup_error = str(e)
+            print(f"推薦系統載入失敗: {e}")
+            return
+        if self.request_counts_interval > 0:
+            self._persist_task = asyncio.ensure_future(self._persist_request_counts())
+    
+    async def _persist_request_counts(self) -> None:
+        """定期儲存各 MAL_ID 的請求次數，程序異常結束時最多遺失一個間隔的次數"""
+        while True:
+            await asyncio.sleep(self.request_counts_interval)
+            try:
+                await self.service.save_request_counts()
+            except OSError as e:
+                print(f"儲存請求次數失敗: {e}")
+    
+    async def _handle_connection(self, reader: asyncio.StreamReader,
+                                 writer: asyncio.StreamWriter) -> None:
+        """
+        處理一個連線 (支援 HTTP/1.1 keep-alive)
+        
+        Args:
+            reader: 連線讀取串流
+            writer: 連線寫入串流
+        """
+        self._connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                try:
+                    head = await self._read_head(reader)
+                except HTTPError as e:
+                    self.error_counts[e.status] = self.error_counts.get(e.status, 0) + 1
+                    self._write_response(writer, e.status, {'error': e.message}, keep_alive=False)
+                    await writer.drain()
+                    break
+                if head is None:
+                    break
+                
+                parts, headers = head
+                keep_alive = (len(parts) == 3 and parts[2] == "HTTP/1.1"
+                              and headers.get("connection", "").lower() != "close")
+                try:
+                    if len(parts) != 3:
+                        raise HTTPError(400, "無效的請求行")
+                    body = await self._read_body(reader, headers)
+                    start_time = time.perf_counter()
+                    status, payload = await self._dispatch(parts[0], parts[1], body)
+                    metrics.observe("server.request", (time.perf_counter() - start_time) * 1000)
+                except HTTPError as e:
+                    status, payload = e.status, {'error': e.message}
+                    if e.status in self.CLOSING_STATUSES:
+                        keep_alive = False
+                except Exception as e:
+                    status, payload = 500, {'error': str(e)}
+                
+                if status >= 400:
+                    self.error_counts[status] = self.error_counts.get(status, 0) + 1
+                self._write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._connections.pop(writer, None)
+            writer.close()
+    
+    async def _read_head(self, reader: asyncio.StreamReader) -> Optional[Tuple[List[str], Dict[str, str]]]:
+        """
+        讀取請求行與標頭
+        
+        Args:
+            reader: 連線讀取串流
+        
+        Returns:
+            (請求行欄位, 標頭字典 (鍵為小寫))，連線已關閉時回傳 None
+        
+        Raises:
+            HTTPError: 請求行或標頭超過串流的長度上限 (414 / 431)
+        """
+        # 超過 StreamReader 長度上限時 readline 會丟出 ValueError，且已讀取的內容無法再對齊
+        try:
+            request_line = await reader.readline()
+        except (ValueError, asyncio.LimitOverrunError):
+            raise HTTPError(414, "請求行超過長度上限")
+        if not request_line:
+            return None
+        
+        headers = {}
+        while True:
+            try:
+                line = await reader.readline()
+            except (ValueError, asyncio.LimitOverrunError):
+                raise HTTPError(431, "請求標頭超過長度上限")
+            if line in (b"\r\n", b"\n", b""):
+                break
+            if len(headers) >= self.MAX_HEADERS:
+                raise HTTPError(431, f"請求標頭超過 {self.MAX_HEADERS} 個")
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return request_line.decode("latin-1").split(), headers
+    
+    async def _read_body(self, reader: asyncio.StreamReader, headers: Dict[str, str]) -> bytes:
+        """
+        讀取請求內容
+        
+        Args:
+            reader: 連線讀取串流
+            headers: 請求標頭 (鍵為小寫)
+        
+        Returns:
+            請求內容
+        """
+        if "transfer-encoding" in headers:
+            # 不解析 chunked 內容，否則內容會被當成下一個請求
+            raise HTTPError(501, "不支援 Transfer-Encoding，請改用 Content-Length")
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise HTTPError(400, "無效的 Content-Length")
+        if length > self.max_body_size:
+            raise HTTPError(413, f"請求內容超過 {self.max_body_size} 位元組")
+        return await reader.readexactly(length) if length > 0 else b""
+    
+    def _write_response(self, writer: asyncio.StreamWriter, status: int,
+                        payload: Any, keep_alive: bool) -> None:
+        """
+        寫出回應 (字串以純文字輸出，其餘以 JSON 輸出)
+        
+        Args:
+            writer: 連線寫入串流
+            status: HTTP 狀態碼
+            payload: 字串或可序列化為 JSON 的內容
+            keep_alive: 是否保持連線
+        """
+        if isinstance(payload, str):
+            body = payload.encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            content_type = "application/json; charset=utf-8"
+        head = (
+            f"HTTP/1.1 {status} {self.STATUS_TEXT.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+    
+    async def _dispatch(self, method: str, target: str, body: bytes) -> Tuple[int, Any]:
+        """
+        依路徑分派請求
+        
+        Args:
+            method: HTTP 方法
+            target: 請求路徑 (含查詢字串)
+            body: 請求內容
+        
+        Returns:
+            (HTTP 狀態碼, 回應內容)
+        """
+        url = urlsplit(target)
+        path = unquote(url.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        
+        if path == "/health":
+            route = "health"
+        elif path == "/ready":
+            route = "ready"
+        elif path == "/metrics":
+            route = "metrics"
+        elif path == "/search":
+            route = "search"
+        elif path == "/recommend:batch":
+            route = "recommend_batch"
+        elif path == "/recommend:profile":
+            route = "recommend_profile"
+        elif path.startswith("/recommend/"):
+            route = "recommend"
+        else:
+            raise HTTPError(404, f"未知的路徑: {path}")
+        
+        expected_method = "POST" if route in ("recommend_batch", "recommend_profile") else "GET"
+        if method != expected_method:
+            raise HTTPError(405, f"{path} 只接受 {expected_method}")
+        self.request_counts[route] = self.request_counts.get(route, 0) + 1
+        
+        if route == "health":
+            return 200, {'status': "ok"}
+        if route == "ready":
+            status = await self.service.status()
+            if self.setup_error is not None:
+                status['error'] = self.setup_error
+            return (200 if status['ready'] else 503), status
+        if route == "metrics":
+            if query.get("format") == "prometheus":
+                return 200, PrometheusExporter().format(metrics.snapshot())
+            snapshot = metrics.snapshot()
+            return 200, {
+                'requests': self.request_counts,
+                'errors': {str(code): count for code, count in self.error_counts.items()},
+                'service': self.service.stats(),
+                'timings': {
+                    name: {key: value for key, value in summary.items() if key != 'buckets'}
+                    for name, summary in snapshot['histograms'].items()
+                },
+                'counters': snapshot['counters'],
+            }
+        
+        if not self.service.is_setup:
+            raise HTTPError(503, "推薦系統尚未載入完成")
+        
+        if route == "recommend":
+            mal_id = self._parse_int(path[len("/recommend/"):], "mal_id")
+            limit = self._parse_limit(query.get('limit'))
+            mmr_lambda = self._parse_mmr_lambda(query.get('mmr_lambda'))
+            try:
+                results = await self.service.recommend_by_mal_id(
+                    mal_id, limit=limit, search_filter=self._filter_from_query(query),
+                    mmr_lambda=mmr_lambda
+                )
+            except ValueError as e:
+                raise HTTPError(404, str(e))
+            return 200, {'mal_id': mal_id, 'results': self._enrich(results, query.get('include'))}
+        
+        if route == "recommend_batch":
+            request = self._parse_json(body)
+            mal_ids = request.get('mal_ids')
+            if not isinstance(mal_ids, list) or not mal_ids:
+                raise HTTPError(400, "mal_ids 必須是非空的列表")
+            mal_ids = [self._parse_int(mal_id, "mal_ids") for mal_id in mal_ids]
+            results = await self.service.recommend_by_mal_ids(
+                mal_ids,
+                limit=self._parse_limit(request.get('limit')),
+                exclude_self=bool(request.get('exclude_self', False)),
+                search_filter=self._filter_from_dict(request.get('filter'))
+            )
+            include = request.get('include')
+            return 200, {
+                'results': {str(mal_id): self._enrich(recs, include) for mal_id, recs in results.items()},
+                'missing': [mal_id for mal_id in dict.fromkeys(mal_ids) if mal_id not in results],
+            }
+        
+        if route == "recommend_profile":
+            request = self._parse_json(body)
+            liked, disliked = request.get('liked'), request.get('disliked') or []
+            if not isinstance(liked, list) or not liked:
+                raise HTTPError(400, "liked 必須是非空的列表")
+            if not isinstance(disliked, list):
+                raise HTTPError(400, "disliked 必須是列表")
+            liked = [self._parse_int(mal_id, "liked") for mal_id in liked]
+            disliked = [self._parse_int(mal_id, "disliked") for mal_id in disliked]
+            try:
+                results = await self.service.recommend_by_profile(
+                    liked, disliked,
+                    limit=self._parse_limit(request.get('limit')),
+                    search_filter=self._filter_from_dict(request.get('filter')),
+                    mmr_lambda=self._parse_mmr_lambda(request.get('mmr_lambda'))
+                )
+            except ValueError as e:
+                raise HTTPError(404, str(e))
+            known = self.service.recommender.catalog.id_to_row
+            return 200, {
+                'results': self._enrich(results, request.get('include')),
+                'missing': [mal_id for mal_id in dict.fromkeys(liked + disliked) if mal_id not in known],
+            }
+        
+        # route == "search"
+        text = query.get('q', "").strip()
+        if not text:
+            raise HTTPError(400, "缺少查詢參數 q")
+        mode = query.get('mode', "vector")
+        search = {
+            'vector': self.service.recommend_by_text,
+            'keyword': self.service.recommend_by_keywords,
+            'hybrid': self.service.recommend_by_hybrid,
+        }.get(mode)
+        if search is None:
+            raise HTTPError(400, f"mode 必須是 vector、keyword 或 hybrid: {mode!r}")
+        options = {}
+        mmr_lambda = self._parse_mmr_lambda(query.get('mmr_lambda'))
+        if mmr_lambda is not None:
+            if mode != "vector":
+                raise HTTPError(400, "mmr_lambda 只適用於 mode=vector")
+            options['mmr_lambda'] = mmr_lambda
+        limit = self._parse_limit(query.get('limit'))
+        search_filter = self._filter_from_query(query)
+        try:
+            results = await search(text, limit=limit, search_filter=search_filter, **options)
+        except ValueError as e:
+            # 例如關鍵字索引未啟用 (KEYWORD_INDEX_ENABLED)，屬於服務端無法提供的功能
+            raise HTTPError(503, str(e))
+        return 200, {'query': text, 'mode': mode, 'results': self._enrich(results, query.get('include'))}
+    
+    def _enrich(self, results: List[Dict[str, Any]], include: Optional[Any]) -> List[Dict[str, Any]]:
+        """
+        依 include 參數為結果加上目錄欄位
+        
+        Args:
+            results: 推薦動漫列表
+            include: 欄位列表，或以逗號分隔的欄位字串 (例如 "Score,Genres")；None 表示不加入
+        
+        Returns:
+            推薦動漫列表
+        """
+        if not include:
+            return results
+        if isinstance(include, str):
+            include = [name.strip() for name in include.split(",") if name.strip()]
+        if not isinstance(include, list):
+            raise HTTPError(400, "include 必須是欄位列表")
+        try:
+            return self.service.recommender.enrich_results(results, include)
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+    
+    @staticmethod
+    def _parse_int(value: Any, name: str) -> int:
+        """
+        將參數轉為整數
+        
+        Args:
+            value: 參數值
+            name: 參數名稱 (用於錯誤訊息)
+        
+        Returns:
+            整數
+        """
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise HTTPError(400, f"{name} 必須是整數: {value!r}")
+    
+    @classmethod
+    def _parse_limit(cls, value: Optional[Any]) -> int:
+        """
+        解析 limit 參數
+        
+        Args:
+            value: 參數值，None 表示使用預設值
+        
+        Returns:
+            推薦數量
+        """
+        if value is None:
+            return DEFAULT_SEARCH_LIMIT
+        limit = cls._parse_int(value, "limit")
+        if not 1 <= limit <= 100:
+            raise HTTPError(400, "limit 必須介於 1 到 100")
+        return limit
+    
+    @staticmethod
+    def _parse_mmr_lambda(value: Optional[Any]) -> Optional[float]:
+        """
+        解析 mmr_lambda 參數
+        
+        Args:
+            value: 參數值，None 表示不重新排序
+        
+        Returns:
+            MMR 相關性權重或 None
+        """
+        if value is None:
+            return None
+        try:
+            mmr_lambda = float(value)
+        except (TypeError, ValueError):
+            raise HTTPError(400, f"mmr_lambda 必須是數字: {value!r}")
+        if not 0.0 <= mmr_lambda <= 1.0:
+            raise HTTPError(400, "mmr_lambda 必須介於 0 到 1")
+        return mmr_lambda
+    
+    @staticmethod
+    def _parse_json(body: bytes) -> Dict[str, Any]:
+        """
+        解析 JSON 請求內容
+        
+        Args:
+            body: 請求內容
+        
+        Returns:
+            JSON 物件
+        """
+        try:
+            request = json.loads(body.decode("utf-8") or "{}")
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise HTTPError(400, f"無效的 JSON: {e}")
+        if not isinstance(request, dict):
+            raise HTTPError(400, "請求內容必須是 JSON 物件")
+        return request
+    
+    @classmethod
+    def _filter_from_query(cls, query: Dict[str, str]) -> Optional[SearchFilter]:
+        """
+        由查詢字串建立篩選條件 (列表參數以逗號分隔，例如 genres=Action,Sci-Fi)
+        
+        Args:
+            query: 查詢參數
+        
+        Returns:
+            篩選條件，未指定任何條件時回傳 None
+        """
+        fields = {}
+        for name in ('genres', 'any_genres', 'exclude_genres', 'types'):
+            if query.get(name):
+                fields[name] = [value.strip() for value in query[name].split(",") if value.strip()]
+        for name in ('min_score', 'max_score', 'min_episodes', 'max_episodes'):
+            if query.get(name):
+                fields[name] = query[name]
+        return cls._filter_from_dict(fields)
+    
+    @staticmethod
+    def _filter_from_dict(fields: Optional[Dict[str, Any]]) -> Optional[SearchFilter]:
+        """
+        由字典建立篩選條件
+        
+        Args:
+            fields: 篩選欄位，鍵與 SearchFilter 參數相同
+        
+        Returns:
+            篩選條件，未指定任何條件時回傳 None
+        """
+        if not fields:
+            return None
+        if not isinstance(fields, dict):
+            raise HTTPError(400, "filter 必須是 JSON 物件")
+        fields = dict(fields)
+        
+        try:
+            for name in ('min_score', 'max_score'):
+                if fields.get(name) is not None:
+                    fields[name] = float(fields[name])
+            for name in ('min_episodes', 'max_episodes'):
+                if fields.get(name) is not None:
+                    fields[name] = int(fields[name])
+            for name in ('genres', 'any_genres', 'exclude_genres', 'types'):
+                if fields.get(name) is not None and not isinstance(fields[name], list):
+                    raise ValueError(f"{name} 必須是列表")
+            return SearchFilter(**fields)
+        except (TypeError, ValueError) as e:
+            raise HTTPError(400, f"無效的篩選條件: {e}")
+
+
+async def serve(backend: str = SEARCH_BACKEND, host: str = SERVER_HOST,
+                port: int = SERVER_PORT,
+                max_concurrency: int = ASYNC_MAX_CONCURRENCY,
+                serving_only: bool = True) -> None:
+    """
+    建立並執行 HTTP 服務
+    
+    Args:
+        backend: 搜尋後端名稱 ("qdrant"、"local" 或 "ivf")
+        host: 監聽位址
+        port: 監聽端口
+        max_concurrency: 同時進行的後端搜尋數量上限
+        serving_only: 是否優先以服務清單快速啟動
+    """
+    service = AsyncAnimeRecommender(search_backend=backend, max_concurrency=max_concurrency)
+    server = RecommendationServer(service, host=host, port=port, serving_only=serving_only)
+    await server.start()
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+
+def main():
+    """命令列進入點"""
+    parser = argparse.ArgumentParser(description="動漫推薦 HTTP 服務")
+    parser.add_argument("--host", default=SERVER_HOST, help="監聽位址")
+    parser.add_argument("--port", type=int, default=SERVER_PORT, help="監聽端口")
+    parser.add_argument("--backend", default=SEARCH_BACKEND, choices=["qdrant", "local", "ivf"],
+                        help="搜尋後端 (local 與 ivf 不需要 Qdrant)")
+    parser.add_argument("--max-concurrency", type=int, default=ASYNC_MAX_CONCURRENCY,
+                        help="同時進行的後端搜尋數量上限")
+    parser.add_argument("--full-setup", action="store_true",
+                        help="重新處理資料並檢查索引，不使用服務清單快速啟動")
+    parser.add_argument("--metrics", action="store_true",
+                        help="記錄各階段耗時與計數器 (於 /metrics 輸出)")
+    args = parser.parse_args()
+    
+    if args.metrics:
+        metrics.enabled = True
+    
+    try:
+        asyncio.run(serve(args.backend, args.host, args.port, args.max_concurrency,
+                          serving_only=not args.full_setup))
+    except KeyboardInterrupt:
+        print("\nHTTP 服務已停止")
+
+
+if __name__ == "__main__":
+    main()
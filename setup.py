@@ -32,10 +32,19 @@ setup(
     ],
     python_requires=">=3.8",
     install_requires=requirements,
+    extras_require={
+        # ONNX Runtime 推論後端 (EMBEDDING_BACKEND = "onnx" 或 "onnx-int8"；匯出時仍需要 torch)
+        "onnx": [
+            "onnxruntime>=1.16.0",
+            "tokenizers>=0.13.0",
+            "onnx>=1.14.0",
+        ],
+    },
     entry_points={
         "console_scripts": [
             "anime-recommend=anime_recommender:main",
             "anime-demo=demo_script:demo_basic_usage",
+            "anime-serve=server:main",
         ],
     },
 )
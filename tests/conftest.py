@@ -0,0 +1,47 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# 測試以專案根目錄的頂層模組匯入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from anime_recommender import AnimeRecommender
+from embedding_generator import EmbeddingGenerator
+from benchmarks.synthetic_data import write_synthetic_workspace
+
+DIMENSION = 16
+
+
+@pytest.fixture
+def workspace(request, tmp_path, monkeypatch):
+    """
+    在暫存目錄建立合成資料並切換至該目錄，以隨機向量代替嵌入模型
+    
+    筆數預設為 300，可用 @pytest.mark.parametrize("workspace", [n], indirect=True) 指定。
+    回傳 (暫存目錄, 實際編碼的文本列表)。
+    """
+    write_synthetic_workspace(str(tmp_path), n=getattr(request, "param", 300), dim=DIMENSION)
+    monkeypatch.chdir(tmp_path)
+    
+    encoded = []
+    
+    def fake_generate(self, texts):
+        encoded.extend(texts)
+        vectors = np.random.default_rng(len(encoded)).normal(size=(len(texts), DIMENSION))
+        return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+    
+    monkeypatch.setattr(EmbeddingGenerator, "generate_embeddings", fake_generate)
+    return tmp_path, encoded
+
+
+@pytest.fixture
+def setup_recommender(workspace):
+    """回傳在 workspace 中以本地後端設定推薦系統的函式"""
+    def setup(warm_top_n=0):
+        recommender = AnimeRecommender(search_backend="local")
+        recommender.setup_system(warm_top_n=warm_top_n)
+        return recommender
+    
+    return setup
@@ -0,0 +1,51 @@
+import asyncio
+import gc
+import pytest
+from qdrant_client.http.exceptions import UnexpectedResponse
+from async_qdrant_manager import AsyncQdrantManager
+from async_recommender import SearchBatcher
+
+
+class FailingClient:
+    """count 一律丟出指定錯誤"""
+    
+    def __init__(self, error):
+        self.error = error
+    
+    async def count(self, **kwargs):
+        raise self.error
+
+
+def count_with(error):
+    manager = AsyncQdrantManager(quantization=None)
+    manager.client = FailingClient(error)
+    return asyncio.run(manager.count_points("test"))
+
+
+def test_count_points_returns_none_for_missing_collection_or_connection_error():
+    assert count_with(UnexpectedResponse(404, "", b"", {})) is None
+    assert count_with(ConnectionError("refused")) is None
+
+
+def test_count_points_raises_other_errors():
+    with pytest.raises(UnexpectedResponse):
+        count_with(UnexpectedResponse(500, "", b"", {}))
+    with pytest.raises(TypeError):
+        count_with(TypeError("bug"))
+
+
+def test_batcher_keeps_running_batches_until_done():
+    async def search_many(mal_ids, limit):
+        await asyncio.sleep(0.05)
+        gc.collect()
+        return {mal_id: [{'MAL_ID': mal_id}] for mal_id in mal_ids}
+    
+    async def scenario():
+        batcher = SearchBatcher(search_many, batch_window=0.01, max_batch_size=2)
+        results = await asyncio.gather(*(batcher.submit(mal_id, 5) for mal_id in (1, 2, 3)))
+        assert [result[0]['MAL_ID'] for result in results] == [1, 2, 3]
+        await asyncio.sleep(0)
+        assert not batcher._tasks
+        assert batcher.stats()['batches'] == 2
+    
+    asyncio.run(scenario())
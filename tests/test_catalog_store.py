@@ -0,0 +1,45 @@
+import os
+import pandas as pd
+import pytest
+import catalog_store
+from catalog_store import CatalogStore
+
+
+def catalog(names, scores):
+    return pd.DataFrame({
+        'MAL_ID': range(1, len(names) + 1),
+        'Name': names,
+        'Score': scores,
+    })
+
+
+def test_interrupted_overwrite_keeps_previous_snapshot(tmp_path, monkeypatch):
+    path = str(tmp_path / "catalog")
+    CatalogStore(path).save(catalog(["a", "b"], [1.0, 2.0]))
+    
+    # 寫到第二個欄位時中斷
+    real_write = catalog_store.atomic_write
+    
+    def interrupted_write(file_path, write_fn):
+        if os.path.basename(file_path).startswith("001"):
+            raise KeyboardInterrupt
+        real_write(file_path, write_fn)
+    
+    monkeypatch.setattr(catalog_store, "atomic_write", interrupted_write)
+    with pytest.raises(KeyboardInterrupt):
+        CatalogStore(path).save(catalog(["x", "y", "z"], [7.0, 8.0, 9.0]))
+    monkeypatch.setattr(catalog_store, "atomic_write", real_write)
+    
+    store = CatalogStore(path).load()
+    assert store.to_dataframe().Name.tolist() == ["a", "b"]
+
+
+def test_overwrite_replaces_all_column_files(tmp_path):
+    path = str(tmp_path / "catalog")
+    CatalogStore(path).save(catalog(["a", None], [1.0, 2.0]))
+    CatalogStore(path).save(pd.DataFrame({'MAL_ID': [5], 'Name': ["e"]}))
+    
+    store = CatalogStore(path).load()
+    assert store.to_dataframe().to_dict("records") == [{'MAL_ID': 5, 'Name': "e"}]
+    assert sorted(os.listdir(path)) == ["000.npy", "001.data.npy", "001.offsets.npy", "header.json"]
+    assert sorted(os.listdir(tmp_path)) == ["catalog"]
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from anime_recommender import AnimeRecommender
+from embedding_store import EmbeddingStore
+from benchmarks.synthetic_data import write_synthetic_workspace
+from config import EMBEDDINGS_PATH, EMBEDDING_MODEL
+
+FRANCHISE_SIZE = 8
+
+
+@pytest.fixture(scope="module")
+def recommender(tmp_path_factory):
+    workspace = tmp_path_factory.mktemp("workspace")
+    write_synthetic_workspace(str(workspace), n=600, dim=32)
+    
+    # 讓前 FRANCHISE_SIZE 部作品成為向量幾乎相同的系列 (續作、劇場版)
+    store = EmbeddingStore(str(workspace / EMBEDDINGS_PATH))
+    vectors, ids = store.load(mmap_mode=None)
+    rng = np.random.default_rng(0)
+    vectors[:FRANCHISE_SIZE] = vectors[0] + 0.02 * rng.standard_normal((FRANCHISE_SIZE, vectors.shape[1]))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    store.save(vectors.astype(np.float32), ids, EMBEDDING_MODEL, text_hashes=store.load_text_hashes())
+    
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(workspace)
+        recommender = AnimeRecommender(search_backend="local")
+        recommender.setup_system(warm_top_n=0)
+        yield recommender, ids[:FRANCHISE_SIZE].tolist()
+
+
+def test_mmr_excludes_seed_and_keeps_relevance_order_at_lambda_one(recommender):
+    recommender, franchise = recommender
+    seed = franchise[0]
+    plain = [r['MAL_ID'] for r in recommender.recommend_by_mal_id(seed, limit=11) if r['MAL_ID'] != seed]
+    reranked = [r['MAL_ID'] for r in recommender.recommend_by_mal_id(seed, limit=10, mmr_lambda=1.0)]
+    
+    assert seed not in reranked
+    assert reranked == plain[:10]
+
+
+@pytest.mark.parametrize("mmr_lambda", [0.5, 0.3])
+def test_mmr_diversifies_catalog_seed(recommender, mmr_lambda):
+    recommender, franchise = recommender
+    seed = franchise[0]
+    top = [r['MAL_ID'] for r in recommender.recommend_by_mal_id(seed, limit=2) if r['MAL_ID'] != seed][0]
+    reranked = [r['MAL_ID'] for r in recommender.recommend_by_mal_id(seed, limit=10, mmr_lambda=mmr_lambda)]
+    
+    # 目標動漫不會被選出，第一個結果為最相關的候選 (同系列作品)，之後不再被同系列佔滿
+    assert seed not in reranked
+    assert reranked[0] == top
+    assert top in franchise
+    assert sum(mal_id in franchise for mal_id in reranked) <= 2
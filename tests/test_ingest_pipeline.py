@@ -0,0 +1,71 @@
+import os
+import numpy as np
+import pytest
+import embedding_store
+from embedding_store import EmbeddingStore
+from ingest_pipeline import StreamingIngestPipeline
+from config import EMBEDDINGS_PATH, COLLECTION_NAME
+
+
+class FakeQdrantManager:
+    """只記錄呼叫的 Qdrant 管理器，第一次切換別名時模擬程式中斷"""
+    
+    def __init__(self):
+        self.aliases = {}
+        self.fail_switch = True
+    
+    def create_versioned_collection(self, alias_name, vector_size):
+        return f"{alias_name}_v1"
+    
+    def batch_upsert(self, vectors, metadata, collection_name, add_content_hash):
+        pass
+    
+    def switch_alias(self, new_collection, alias_name):
+        if self.fail_switch:
+            self.fail_switch = False
+            raise KeyboardInterrupt
+        self.aliases[alias_name] = new_collection
+
+
+@pytest.fixture
+def empty_store(workspace):
+    """只有 CSV、尚未建立向量儲存的工作目錄"""
+    os.remove(EMBEDDINGS_PATH)
+    return workspace
+
+
+def pipeline(qdrant_manager=None):
+    return StreamingIngestPipeline(qdrant_manager=qdrant_manager, chunk_size=100)
+
+
+def test_resume_completes_interrupted_finalize(empty_store, monkeypatch):
+    # 只替換完向量區塊就中斷，MAL_ID 與雜湊仍是暫存檔
+    real_replace = os.replace
+    
+    def interrupted_replace(src, dst):
+        if str(src).endswith(".ids.npy.partial"):
+            raise KeyboardInterrupt
+        real_replace(src, dst)
+    
+    monkeypatch.setattr(embedding_store.os, "replace", interrupted_replace)
+    with pytest.raises(KeyboardInterrupt):
+        pipeline().run()
+    monkeypatch.setattr(embedding_store.os, "replace", real_replace)
+    
+    stats = pipeline().run()
+    embeddings, ids = EmbeddingStore(EMBEDDINGS_PATH).load(verify=True)
+    assert stats['rows'] == len(ids) == len(embeddings) > 0
+    assert len(np.unique(ids)) == len(ids)
+    assert not os.path.exists(pipeline().checkpoint_path)
+
+
+def test_resume_after_finalize_only_switches_alias(empty_store):
+    manager = FakeQdrantManager()
+    with pytest.raises(KeyboardInterrupt):
+        pipeline(manager).run()
+    mtime = os.stat(EMBEDDINGS_PATH).st_mtime_ns
+    
+    stats = pipeline(manager).run()
+    assert manager.aliases == {COLLECTION_NAME: stats['collection']}
+    assert os.stat(EMBEDDINGS_PATH).st_mtime_ns == mtime
+    assert not os.path.exists(pipeline().checkpoint_path)
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from ivf_index import IVFSearchBackend
+from benchmarks.bench_quantization import clustered_vectors
+
+
+def metadata_for(ids):
+    return [{'MAL_ID': int(mal_id), 'Name': f"Anime {mal_id}"} for mal_id in ids]
+
+
+@pytest.fixture
+def trained(monkeypatch):
+    calls = []
+    original = IVFSearchBackend.train
+    
+    def counting_train(self):
+        calls.append(self)
+        original(self)
+    
+    monkeypatch.setattr(IVFSearchBackend, "train", counting_train)
+    return calls
+
+
+def build(path, vectors, ids, **kwargs):
+    backend = IVFSearchBackend(nlist=kwargs.pop('nlist', 16), n_iter=3, index_path=str(path), **kwargs)
+    backend.build_index(vectors, metadata_for(ids))
+    return backend
+
+
+def test_reuses_index_only_for_identical_vectors_and_params(tmp_path, trained):
+    path = tmp_path / "ivf.npz"
+    vectors = clustered_vectors(1000, 32)
+    ids = np.arange(1, 1001)
+    
+    build(path, vectors, ids)
+    build(path, vectors, ids)
+    assert len(trained) == 1
+    
+    # MAL_ID 不變但向量內容變更 (例如簡介或模型更新) 時重新訓練
+    changed = vectors.copy()
+    changed[:10] = clustered_vectors(10, 32, seed=5)
+    build(path, changed, ids)
+    assert len(trained) == 2
+    
+    # 訓練參數變更時重新訓練
+    build(path, changed, ids, nlist=8)
+    assert len(trained) == 3
+
+
+def test_add_items_is_persisted(tmp_path, trained):
+    path = tmp_path / "ivf.npz"
+    vectors = clustered_vectors(1200, 32)
+    ids = np.arange(1, 1201)
+    
+    backend = build(path, vectors[:1000], ids[:1000])
+    backend.add_items(vectors[1000:], metadata_for(ids[1000:]))
+    expected = backend.search_similar(1100, limit=10)
+    
+    # 重新啟動時向量儲存已包含新增的項目：直接載入增量後的索引
+    restarted = build(path, vectors, ids)
+    assert len(trained) == 1
+    assert restarted.search_similar(1100, limit=10) == expected
+
+
+@pytest.mark.parametrize("selectivity", [0.02, 0.3])
+def test_filtered_search_keeps_recall(tmp_path, selectivity):
+    vectors = clustered_vectors(4000, 32)
+    backend = build(tmp_path / "ivf.npz", vectors, np.arange(1, 4001), nlist=64, nprobe=4)
+    queries = backend.vectors[:50]
+    mask = np.random.default_rng(1).random(len(vectors)) < selectivity
+    
+    rows, _ = backend._search_top_k(queries, 10, mask)
+    exact = np.argsort(-(queries @ backend.vectors[mask].T), axis=1)[:, :10]
+    exact_rows = np.flatnonzero(mask)[exact]
+    recall = np.mean([len(set(found) & set(expected)) / 10 for found, expected in zip(rows, exact_rows)])
+    assert all(mask[found].all() for found in rows)
+    assert recall >= 0.95
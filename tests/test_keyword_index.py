@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from keyword_index import KeywordIndex
+from search_filter import SearchFilter, PayloadColumns
+from data_processor import AnimeDataProcessor
+from benchmarks.synthetic_data import synthetic_catalog
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    return synthetic_catalog(2000)
+
+
+@pytest.fixture(scope="module")
+def index(catalog):
+    index = KeywordIndex(file_path=None)
+    index.build(catalog.MAL_ID.tolist(), catalog.Name.tolist(), catalog.sypnopsis.tolist())
+    return index
+
+
+@pytest.mark.parametrize("query", [
+    "pilot",        # 單一詞
+    " ".join(str(i) for i in range(1, 200)),  # 短 posting：只在出現查詢詞的列上累加
+    "pilot war",    # 長 posting：整個目錄大小的累加陣列
+])
+def test_search_applies_mask(catalog, index, query):
+    search_filter = SearchFilter(genres=["Mecha"], min_score=8.0)
+    mask = search_filter.mask(PayloadColumns(AnimeDataProcessor.build_metadata(catalog)))
+    allowed = set(catalog.MAL_ID.to_numpy()[mask].tolist())
+    
+    unfiltered = index.search(query, 10)
+    filtered = index.search(query, 10, mask=mask)
+    
+    assert unfiltered
+    assert filtered
+    assert {mal_id for mal_id, _ in filtered} <= allowed
+    # 篩選後的分數順序與未篩選時一致
+    scores = [score for _, score in filtered]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_search_mask_excluding_everything_returns_empty(catalog, index):
+    assert index.search("pilot war", 10, mask=np.zeros(len(catalog), dtype=bool)) == []
@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+import qdrant_manager
+from qdrant_client import QdrantClient
+from qdrant_client.http.exceptions import UnexpectedResponse
+from qdrant_manager import QdrantManager
+
+DIMENSION = 8
+
+
+class FlakyClient:
+    """前幾次 upload_collection 丟出指定錯誤，之後交給真正的 client"""
+    
+    def __init__(self, client, errors):
+        self.client = client
+        self.errors = list(errors)
+        self.calls = 0
+    
+    def upload_collection(self, **kwargs):
+        self.calls += 1
+        assert isinstance(kwargs['vectors'], np.ndarray)
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.client.upload_collection(**kwargs)
+    
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+def http_error(status):
+    return UnexpectedResponse(status, "", b"", {})
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    monkeypatch.setattr(qdrant_manager, "UPSERT_RETRY_BACKOFF", 0.0)
+    manager = QdrantManager(quantization=None)
+    manager.client = QdrantClient(":memory:")
+    manager.create_collection("test", vector_size=DIMENSION)
+    return manager
+
+
+def data(n):
+    vectors = np.random.default_rng(0).normal(size=(n, DIMENSION)).astype(np.float32)
+    return vectors, [{'MAL_ID': i + 1} for i in range(n)]
+
+
+def test_batch_upsert_uploads_every_point(manager):
+    vectors, metadata = data(250)
+    manager.batch_upsert(vectors, metadata, collection_name="test", batch_size=20, parallel=3)
+    
+    assert manager.client.count("test").count == 250
+    point = manager.client.retrieve("test", [7], with_vectors=True)[0]
+    expected = vectors[6] / np.linalg.norm(vectors[6])
+    np.testing.assert_allclose(point.vector, expected, rtol=1e-5)
+
+
+def test_transient_errors_are_retried(manager):
+    vectors, metadata = data(30)
+    manager.client = FlakyClient(manager.client, [http_error(503), ConnectionError("reset")])
+    manager.batch_upsert(vectors, metadata, collection_name="test", batch_size=100, parallel=1)
+    
+    assert manager.client.calls == 3
+    assert manager.client.count("test").count == 30
+
+
+def test_client_errors_are_not_retried(manager):
+    vectors, metadata = data(30)
+    manager.client = FlakyClient(manager.client, [http_error(400)])
+    with pytest.raises(UnexpectedResponse):
+        manager.batch_upsert(vectors, metadata, collection_name="test", batch_size=100, parallel=1)
+    assert manager.client.calls == 1
+
+
+def test_rebuild_refuses_to_replace_legacy_collection(manager):
+    vectors, metadata = data(30)
+    manager.batch_upsert(vectors, metadata, collection_name="test", parallel=1)
+    
+    with pytest.raises(ValueError, match="migrate_to_alias"):
+        manager.rebuild_collection(vectors, metadata, alias_name="test")
+    assert manager.get_collections() == ["test"]
+    assert manager.client.count("test").count == 30
+
+
+def test_migrate_to_alias_copies_points_before_swapping(manager):
+    vectors, metadata = data(30)
+    manager.batch_upsert(vectors, metadata, collection_name="test", parallel=1, add_content_hash=True)
+    
+    new_collection = manager.migrate_to_alias("test", page_size=7)
+    assert manager.get_alias_target("test") == new_collection
+    assert manager.get_collections() == [new_collection]
+    assert manager.client.count("test").count == 30
+    assert manager.migrate_to_alias("test") is None
+    
+    # 遷移後的重建走一般的別名切換，並刪除遷移產生的集合
+    rebuilt = manager.rebuild_collection(vectors, metadata, alias_name="test")
+    assert manager.get_collections() == [rebuilt]
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from embedding_store import EmbeddingStore
+from local_search import LocalSearchBackend
+from quantization import Float16Quantizer, Int8Quantizer
+from benchmarks.bench_quantization import clustered_vectors
+
+
+@pytest.fixture(scope="module")
+def vectors():
+    vectors = clustered_vectors(3000, 64)
+    # 極小值與零向量 (float16 次正規數與 0 的解碼)
+    vectors[0, :3] = [3e-7, -1e-6, 0.0]
+    vectors[1] = 0.0
+    return vectors
+
+
+@pytest.mark.parametrize("quantizer_class", [Float16Quantizer, Int8Quantizer])
+def test_scores_match_decoded_codes(vectors, quantizer_class):
+    quantizer = quantizer_class()
+    quantizer.fit(vectors)
+    queries = vectors[2:9]
+    decoded = quantizer.codes.astype(np.float32) * getattr(quantizer, "scale", 1.0)
+    np.testing.assert_allclose(quantizer.scores(queries), queries @ decoded.T, rtol=1e-5, atol=1e-6)
+
+
+@pytest.mark.parametrize("quantization", ["float16", "int8"])
+def test_quantized_backend_rescores_from_memory_mapped_store(tmp_path, vectors, quantization):
+    # 儲存未正規化的向量：後端只保存範數，不建立正規化副本
+    raw = vectors * np.linspace(0.5, 3.0, len(vectors), dtype=np.float32)[:, None]
+    store = EmbeddingStore(str(tmp_path / "vectors.npy"))
+    store.save(raw, np.arange(len(raw)), "test-model")
+    mapped, ids = store.load(mmap_mode="r")
+    metadata = [{'MAL_ID': int(mal_id), 'Name': ""} for mal_id in ids]
+    
+    exact = LocalSearchBackend(quantization=None)
+    exact.build_index(np.asarray(raw), metadata)
+    backend = LocalSearchBackend(quantization=quantization)
+    backend.build_index(mapped, metadata)
+    
+    assert isinstance(backend.vectors, np.memmap)
+    for mal_id in range(2, 50, 7):
+        expected = exact.search_similar(mal_id, limit=10)
+        found = backend.search_similar(mal_id, limit=10)
+        assert [r['MAL_ID'] for r in found] == [r['MAL_ID'] for r in expected]
+        np.testing.assert_allclose([r['Score'] for r in found], [r['Score'] for r in expected], atol=1e-5)
+    np.testing.assert_allclose(np.linalg.norm(backend.get_vectors([5, 6]), axis=1), 1.0, atol=1e-5)
+
+
+@pytest.mark.parametrize("dimension", [256, 100])
+def test_product_quantizer_uses_a_divisor_of_the_dimension(dimension):
+    from quantization import ProductQuantizer
+    
+    vectors = clustered_vectors(600, dimension)
+    quantizer = ProductQuantizer(subspaces=96, n_iter=2)
+    quantizer.fit(vectors)
+    assert dimension % quantizer.subspaces == 0
+    assert quantizer.scores(vectors[:3]).shape == (3, 600)
+
+
+@pytest.mark.parametrize("dimension", [128, 256, 384, 512, 768, 1536])
+def test_qdrant_pq_compression_ratio_is_supported(dimension):
+    qdrant_manager = pytest.importorskip("qdrant_manager")
+    manager = qdrant_manager.QdrantManager.__new__(qdrant_manager.QdrantManager)
+    manager.quantization = "pq"
+    ratio = manager._quantization_config(dimension).product.compression.value
+    assert ratio in {"x4", "x8", "x16", "x32", "x64"}
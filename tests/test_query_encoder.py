@@ -0,0 +1,54 @@
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from query_encoder import QueryEncoder
+
+
+class SlowGenerator:
+    """記錄每次 encode 的執行緒與查詢"""
+    
+    def __init__(self, delay=0.005):
+        self.delay = delay
+        self.calls = []
+    
+    def encode_queries(self, texts):
+        self.calls.append((threading.get_ident(), list(texts)))
+        time.sleep(self.delay)
+        return np.stack([np.full(4, len(text), dtype=np.float32) for text in texts])
+
+
+def test_each_request_encodes_at_most_one_batch_under_sustained_traffic():
+    generator = SlowGenerator()
+    encoder = QueryEncoder(generator, batch_window=0.001, max_batch_size=4)
+    
+    def request(i):
+        vector = encoder.encode(f"query {i}")
+        return threading.get_ident(), vector
+    
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(request, range(400)))
+    
+    # 每個請求都拿到自己查詢的向量
+    assert all(vector[0] == len(f"query {i}") for i, (_, vector) in enumerate(results))
+    encoded = [text for _, texts in generator.calls for text in texts]
+    assert sorted(encoded) == sorted(f"query {i}" for i in range(400))
+    # 每個執行緒的 encode 次數不超過它處理的請求數 (leader 只編碼一個批次就交出)
+    requests_per_thread = Counter(thread for thread, _ in results)
+    batches_per_thread = Counter(thread for thread, _ in generator.calls)
+    assert all(batches_per_thread[thread] <= count for thread, count in requests_per_thread.items())
+
+
+def test_encode_failure_releases_leader():
+    class FailingGenerator:
+        def encode_queries(self, texts):
+            raise RuntimeError("model error")
+    
+    encoder = QueryEncoder(FailingGenerator(), batch_window=0)
+    for _ in range(2):
+        try:
+            encoder.encode("anything")
+        except RuntimeError:
+            pass
+    assert not encoder._leader_active
@@ -0,0 +1,59 @@
+import asyncio
+import json
+import os
+from anime_recommender import AnimeRecommender
+from async_recommender import AsyncAnimeRecommender
+from server import RecommendationServer
+from config import REQUEST_COUNTS_PATH
+
+
+def test_close_persists_counts_for_next_start(setup_recommender):
+    recommender = setup_recommender()
+    popular, other = recommender.data.MAL_ID.tolist()[:2]
+    for _ in range(3):
+        recommender.recommend_by_mal_id(popular, limit=5)
+    recommender.recommend_by_mal_id(other, limit=5)
+    recommender.close()
+    
+    with open(REQUEST_COUNTS_PATH, "r", encoding="utf-8") as f:
+        assert json.load(f) == {str(popular): 3, str(other): 1}
+    
+    # 下次啟動時載入次數並預熱最常被請求的項目
+    restarted = setup_recommender(warm_top_n=1)
+    assert restarted.result_cache.most_requested(1) == [popular]
+    assert len(restarted.result_cache._cache) == 1
+    
+    # 沒有新請求時關閉不會重寫檔案，累積的次數也不會被覆蓋
+    mtime = os.stat(REQUEST_COUNTS_PATH).st_mtime_ns
+    restarted.close()
+    assert os.stat(REQUEST_COUNTS_PATH).st_mtime_ns == mtime
+
+
+def test_corrupt_counts_file_is_ignored(setup_recommender):
+    os.makedirs(os.path.dirname(REQUEST_COUNTS_PATH), exist_ok=True)
+    with open(REQUEST_COUNTS_PATH, "w", encoding="utf-8") as f:
+        f.write("{not json")
+    
+    recommender = setup_recommender(warm_top_n=5)
+    assert recommender.result_cache.most_requested(5) == []
+
+
+def test_server_saves_counts_periodically_and_on_close(workspace):
+    async def scenario():
+        service = AsyncAnimeRecommender(AnimeRecommender(search_backend="local"))
+        server = RecommendationServer(service, port=0, serving_only=False,
+                                      request_counts_interval=0.05)
+        await server._setup_service()
+        mal_id = service.recommender.data.MAL_ID.tolist()[0]
+        await service.recommend_by_mal_id(mal_id, limit=5)
+        
+        await asyncio.sleep(0.2)
+        with open(REQUEST_COUNTS_PATH, "r", encoding="utf-8") as f:
+            assert json.load(f) == {str(mal_id): 1}
+        
+        await service.recommend_by_mal_id(mal_id, limit=5)
+        await server.close()
+        with open(REQUEST_COUNTS_PATH, "r", encoding="utf-8") as f:
+            assert json.load(f) == {str(mal_id): 2}
+    
+    asyncio.run(scenario())
@@ -0,0 +1,165 @@
+import asyncio
+import json
+import pytest
+from anime_recommender import AnimeRecommender
+from async_recommender import AsyncAnimeRecommender
+from server import RecommendationServer
+
+
+async def read_response(reader):
+    """讀取一個回應，回傳 (狀態碼, 標頭, JSON 內容)"""
+    status_line = await reader.readline()
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers["content-length"]))
+    return int(status_line.split()[1]), headers, json.loads(body)
+
+
+def request(method, target, body=None, headers=()):
+    lines = [f"{method} {target} HTTP/1.1", "Host: test", *headers]
+    payload = b""
+    if body is not None:
+        payload = json.dumps(body).encode("utf-8")
+        lines.append(f"Content-Length: {len(payload)}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + payload
+
+
+@pytest.fixture
+def run_server(workspace):
+    """回傳以已設定的服務執行測試情境的函式 (情境收到 server 與連線函式)"""
+    def run(scenario, prepare=None):
+        async def main():
+            service = AsyncAnimeRecommender(AnimeRecommender(search_backend="local"),
+                                            batch_window=0.02)
+            server = RecommendationServer(service, host="127.0.0.1", port=0,
+                                          serving_only=False, request_counts_interval=0)
+            await server.start(setup=False)
+            await server._setup_service()
+            if prepare is not None:
+                prepare(service.recommender)
+            
+            async def connect():
+                return await asyncio.open_connection("127.0.0.1", server.port)
+            
+            try:
+                await scenario(server, connect)
+            finally:
+                await server.close()
+        
+        asyncio.run(main())
+    
+    return run
+
+
+def test_routes_and_keep_alive(run_server):
+    async def scenario(server, connect):
+        mal_id = server.service.recommender.data.MAL_ID.tolist()[0]
+        reader, writer = await connect()
+        
+        # 同一個連線依序處理多個請求
+        writer.write(request("GET", "/health") + request("GET", "/ready")
+                     + request("GET", f"/recommend/{mal_id}?limit=3&include=Name"))
+        status, headers, payload = await read_response(reader)
+        assert (status, payload, headers["connection"]) == (200, {'status': "ok"}, "keep-alive")
+        status, _, payload = await read_response(reader)
+        assert status == 200 and payload['ready']
+        status, _, payload = await read_response(reader)
+        assert status == 200 and len(payload['results']) == 3
+        assert all('Name' in result['info'] for result in payload['results'])
+        
+        writer.write(request("POST", "/recommend:batch", {'mal_ids': [mal_id, -1], 'limit': 2}))
+        status, _, payload = await read_response(reader)
+        assert status == 200 and payload['missing'] == [-1]
+        assert len(payload['results'][str(mal_id)]) == 2
+        
+        writer.write(request("GET", "/search?q=story&mode=keyword&limit=5"))
+        status, _, payload = await read_response(reader)
+        assert status == 200 and payload['mode'] == "keyword"
+        
+        writer.write(request("GET", "/health", headers=["Connection: close"]))
+        _, headers, _ = await read_response(reader)
+        assert headers["connection"] == "close"
+        assert await reader.read() == b""
+        writer.close()
+    
+    run_server(scenario)
+
+
+def test_client_errors(run_server):
+    async def scenario(server, connect):
+        for target, method, expected, connection in [
+            ("/unknown", "GET", 404, "keep-alive"),
+            ("/recommend:batch", "GET", 405, "keep-alive"),
+            ("/recommend/999999", "GET", 404, "keep-alive"),
+            ("/recommend/1?limit=500", "GET", 400, "close"),
+            ("/search?q=story&mode=fuzzy", "GET", 400, "close"),
+        ]:
+            reader, writer = await connect()
+            writer.write(request(method, target))
+            status, headers, payload = await read_response(reader)
+            assert (status, headers["connection"]) == (expected, connection), target
+            assert 'error' in payload
+            writer.close()
+        assert server.error_counts == {404: 2, 405: 1, 400: 2}
+    
+    run_server(scenario)
+
+
+@pytest.mark.parametrize("raw, expected", [
+    (request("GET", "/search?q=" + "a" * 70000), 414),
+    (request("GET", "/health", headers=["X-Long: " + "a" * 70000]), 431),
+    (b"POST /recommend:batch HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n"
+     b"5\r\nhello\r\n0\r\n\r\nGET /health HTTP/1.1\r\n\r\n", 501),
+    (request("POST", "/recommend:batch", headers=["Content-Length: 1"]) + b"{", 400),
+])
+def test_unparseable_requests_close_connection(run_server, raw, expected):
+    async def scenario(server, connect):
+        reader, writer = await connect()
+        writer.write(raw)
+        status, headers, _ = await read_response(reader)
+        assert (status, headers["connection"]) == (expected, "close")
+        # 不會把殘留的內容當成下一個請求而多回應一次
+        assert await reader.read() == b""
+        writer.close()
+    
+    run_server(scenario)
+
+
+def test_keyword_search_without_index_is_unavailable(run_server):
+    def disable_keyword_index(recommender):
+        recommender.keyword_index = None
+    
+    async def scenario(server, connect):
+        reader, writer = await connect()
+        for mode in ("keyword", "hybrid"):
+            writer.write(request("GET", f"/search?q=story&mode={mode}"))
+            status, _, _ = await read_response(reader)
+            assert status == 503
+        writer.close()
+    
+    run_server(scenario, prepare=disable_keyword_index)
+
+
+def test_concurrent_recommend_requests_are_batched(run_server):
+    async def scenario(server, connect):
+        mal_ids = server.service.recommender.data.MAL_ID.tolist()[:8]
+        
+        async def fetch(mal_id):
+            reader, writer = await connect()
+            writer.write(request("GET", f"/recommend/{mal_id}?limit=5"))
+            status, _, payload = await read_response(reader)
+            writer.close()
+            return status, payload
+        
+        responses = await asyncio.gather(*(fetch(mal_id) for mal_id in mal_ids))
+        assert all(status == 200 and len(payload['results']) == 5 for status, payload in responses)
+        batching = server.service.stats()['batching']
+        assert batching['batched_requests'] == len(mal_ids)
+        assert batching['batches'] < len(mal_ids)
+    
+    run_server(scenario)
@@ -0,0 +1,80 @@
+import json
+import os
+import pandas as pd
+import pytest
+from embedding_store import EmbeddingStore
+from config import DATA_PATH, EMBEDDINGS_PATH
+
+REWRITTEN = "an entirely rewritten synopsis about a quiet student who learns music " * 5
+
+
+def test_setup_reuses_unchanged_store_without_rewriting(workspace, setup_recommender):
+    _, encoded = workspace
+    mtime = os.stat(EMBEDDINGS_PATH).st_mtime_ns
+    
+    recommender = setup_recommender()
+    
+    assert encoded == []
+    assert recommender.embedding_generator.cache_stats['encoded'] == 0
+    assert os.stat(EMBEDDINGS_PATH).st_mtime_ns == mtime
+
+
+def test_setup_encodes_only_added_and_changed_synopses(workspace, setup_recommender):
+    _, encoded = workspace
+    catalog = pd.read_csv(DATA_PATH)
+    
+    # 新增 5 筆並修改一筆既有簡介 (MAL_ID 不變)
+    added = catalog.iloc[:5].copy()
+    added['MAL_ID'] += catalog.MAL_ID.max()
+    added['sypnopsis'] = [f"a brand new story number {i} about a young pilot " * 10 for i in range(5)]
+    processed_ids = setup_recommender().data.MAL_ID.tolist()
+    changed_id = processed_ids[0]
+    catalog.loc[catalog.MAL_ID == changed_id, 'sypnopsis'] = REWRITTEN
+    pd.concat([catalog, added]).to_csv(DATA_PATH, index=False)
+    
+    recommender = setup_recommender()
+    
+    stats = recommender.embedding_generator.cache_stats
+    assert stats['encoded'] == 6
+    assert len(recommender.data) == len(processed_ids) + 5
+    assert REWRITTEN in encoded
+    # 搜尋後端使用更新後的向量
+    results = recommender.recommend_by_mal_id(int(added.MAL_ID.iloc[0]), limit=1)
+    assert results[0]['MAL_ID'] == int(added.MAL_ID.iloc[0])
+
+
+def test_legacy_store_without_text_hashes_is_upgraded_once(workspace, setup_recommender):
+    _, encoded = workspace
+    processed_ids = setup_recommender().data.MAL_ID.tolist()
+    
+    # 模擬舊版儲存：沒有文本雜湊檔，標頭也未記錄
+    store = EmbeddingStore(EMBEDDINGS_PATH)
+    store.load()
+    header = dict(store.header, has_text_hashes=False)
+    os.remove(store.hashes_path)
+    with open(store.header_path, "w", encoding="utf-8") as f:
+        json.dump(header, f)
+    
+    setup_recommender()
+    assert encoded == []
+    assert os.path.exists(store.hashes_path)
+    
+    # 補寫雜湊後，MAL_ID 不變的簡介變更可以被偵測
+    catalog = pd.read_csv(DATA_PATH)
+    catalog.loc[catalog.MAL_ID == processed_ids[0], 'sypnopsis'] = REWRITTEN
+    catalog.to_csv(DATA_PATH, index=False)
+    
+    recommender = setup_recommender()
+    assert encoded == [REWRITTEN]
+    assert recommender.embedding_generator.cache_stats['encoded'] == 1
+
+
+def test_keyword_pool_is_created_during_setup(setup_recommender):
+    recommender = setup_recommender()
+    assert recommender._keyword_pool is not None
+    
+    recommender.close()
+    
+    assert recommender._keyword_pool is None
+    with pytest.raises(ValueError):
+        recommender.recommend_by_hybrid("music")